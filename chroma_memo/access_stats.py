@@ -0,0 +1,141 @@
+"""
+Buffered per-entry access statistics
+
+search_knowledge / get_knowledge_by_id が返したエントリごとにヒット数と最終
+アクセス時刻を記録する。読み取りのたびに書き込まないよう、プロセス内で集計
+しておき、一定件数・一定時間ごと（およびプロセス終了時）に SQLite へまとめて
+反映する。Chroma のメタデータは書き換えないので、検索が書き込みロックや
+変更シーケンスに影響することはない。
+"""
+import atexit
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entry_access (
+    project TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    last_accessed REAL NOT NULL,
+    PRIMARY KEY (project, entry_id)
+) WITHOUT ROWID;
+"""
+
+# (project, entry_id) -> [hits, last_accessed]
+_Pending = Dict[Tuple[str, str], List[float]]
+
+
+class AccessTracker:
+    """Counts hits per entry in memory and flushes them to SQLite in batches"""
+
+    def __init__(self, path: Path, flush_interval: float = 30.0, max_pending: int = 1000):
+        self.path = Path(path)
+        self.flush_interval = max(0.0, flush_interval)
+        self.max_pending = max(1, max_pending)
+        self._lock = threading.Lock()
+        self._pending: _Pending = {}
+        self._last_flush = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        # CLI のような短命なプロセスでも終了時に反映する
+        atexit.register(self.flush)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # スレッド・プロセスごとに接続を開く（sqlite3の接続は共有しない）
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def record(self, project: str, entry_ids: Iterable[str]) -> None:
+        """Count one access of each entry; flushes when the buffer is full or old enough"""
+        now = time.time()
+        with self._lock:
+            for entry_id in entry_ids:
+                item = self._pending.get((project, entry_id))
+                if item is None:
+                    self._pending[(project, entry_id)] = [1, now]
+                else:
+                    item[0] += 1
+                    item[1] = now
+            due = (len(self._pending) >= self.max_pending
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write buffered counts in one transaction; returns the number of entries written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        rows = [(project, entry_id, int(hits), last) for (project, entry_id), (hits, last) in pending.items()]
+        try:
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(
+                        "INSERT INTO entry_access (project, entry_id, hits, last_accessed) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (project, entry_id) DO UPDATE SET "
+                        "hits = hits + excluded.hits, last_accessed = MAX(last_accessed, excluded.last_accessed)",
+                        rows,
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            # 統計のせいで本来の処理を失敗させない（次回の反映で再試行する）
+            print(f"⚠️  Failed to write access stats: {e}", file=sys.stderr)
+            with self._lock:
+                for key, (hits, last) in pending.items():
+                    item = self._pending.setdefault(key, [0, last])
+                    item[0] += hits
+                    item[1] = max(item[1], last)
+            return 0
+        return len(rows)
+
+    def close(self) -> None:
+        """Flush and drop the exit hook (before the stats file is removed, e.g. by bench)"""
+        atexit.unregister(self.flush)
+        self.flush()
+
+    def get(self, project: str) -> Dict[str, Tuple[int, float]]:
+        """Entry ID -> (hits, last accessed unix time) for every tracked entry of a project"""
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT entry_id, hits, last_accessed FROM entry_access WHERE project = ?", (project,)
+            ).fetchall()
+        return {entry_id: (hits, last_accessed) for entry_id, hits, last_accessed in rows}
+
+    def forget(self, project: str, entry_ids: Optional[List[str]] = None) -> None:
+        """Drop the stats of deleted entries (all entries of the project if ``entry_ids`` is None)"""
+        wanted = None if entry_ids is None else set(entry_ids)
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == project]:
+                if wanted is None or key[1] in wanted:
+                    del self._pending[key]
+        with self._connect() as conn:
+            if entry_ids is None:
+                conn.execute("DELETE FROM entry_access WHERE project = ?", (project,))
+            else:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "DELETE FROM entry_access WHERE project = ? AND entry_id = ?",
+                    [(project, entry_id) for entry_id in entry_ids],
+                )
+                conn.execute("COMMIT")
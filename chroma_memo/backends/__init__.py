@@ -0,0 +1,69 @@
+"""
+Storage backends for Chroma-Memo
+
+- chroma: chromadb.PersistentClient（既定）
+- sqlite: SQLite + memory-mapped NumPy。chromadb を読み込まないので起動が速く、
+          小規模な環境ではメモリも少なくて済む
+
+`storage_backend` 設定（または環境変数 CHROMA_MEMO_BACKEND）で選ぶ。
+"""
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from .base import VectorStore
+
+
+BACKEND_CHROMA = "chroma"
+BACKEND_SQLITE = "sqlite"
+BACKENDS = (BACKEND_CHROMA, BACKEND_SQLITE)
+
+# 移行時に一度にコピーする件数
+_COPY_PAGE_SIZE = 1000
+
+
+def backend_name(configured: str) -> str:
+    """The backend to use: ``CHROMA_MEMO_BACKEND`` overrides the ``storage_backend`` setting"""
+    return (os.getenv("CHROMA_MEMO_BACKEND") or configured or BACKEND_CHROMA).strip().lower()
+
+
+def open_store(backend: str, db_path: Path) -> VectorStore:
+    """Open the store of ``backend`` under ``db_path``"""
+    if backend == BACKEND_CHROMA:
+        from .chroma import ChromaStore
+        return ChromaStore(db_path)
+    if backend == BACKEND_SQLITE:
+        from .sqlite_numpy import SQLiteStore
+        return SQLiteStore(Path(db_path) / "sqlite")
+    raise ValueError(f"Unknown storage backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+
+def copy_store(source: VectorStore, target: VectorStore,
+               progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, int]:
+    """Copy every collection with its stored embeddings; returns collection name -> entries copied
+
+    Records are upserted, so an interrupted copy can simply be run again.
+    """
+    copied: Dict[str, int] = {}
+    for collection in source.list_collections():
+        total = collection.count()
+        destination = target.get_or_create_collection(collection.name, metadata=collection.metadata or None)
+        # 既にあったコレクションでも設定（埋め込みモデル・シャード一覧など）は移行元に合わせる
+        settable = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+        if settable:
+            destination.modify(metadata=settable)
+        step = min(_COPY_PAGE_SIZE, target.get_max_batch_size())
+        done = 0
+        while done < total:
+            page: Dict[str, Any] = collection.get(include=["documents", "metadatas", "embeddings"],
+                                                  limit=step, offset=done)
+            ids = page["ids"] or []
+            if not ids:
+                break
+            destination.upsert(ids=ids, embeddings=page["embeddings"], documents=page["documents"],
+                               metadatas=page["metadatas"])
+            done += len(ids)
+            if progress is not None:
+                progress(collection.name, done, total)
+        copied[collection.name] = done
+    return copied
@@ -0,0 +1,163 @@
+"""
+Storage backend interface
+
+ChromaMemoDatabase が使うのは Chroma のクライアント／コレクション API の
+一部だけなので、その部分をインターフェースとして切り出している。結果の形
+(get は {"ids", "documents", "metadatas", "embeddings"}、query は各キーが
+クエリごとのリスト) も Chroma に合わせてあり、呼び出し側はどのバックエンドでも
+同じコードで動く。
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class VectorCollection(ABC):
+    """A named set of (id, document, metadata, embedding) records
+
+    ``name`` and ``metadata`` are attributes, as on a Chroma collection.
+    ``where`` filters use Chroma's syntax (see :func:`matches_where`).
+    """
+
+    name: str
+    metadata: Optional[Dict[str, Any]]
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def add(self, ids: Sequence[str], embeddings: Any, documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """Insert records; IDs that already exist are left untouched"""
+
+    @abstractmethod
+    def upsert(self, ids: Sequence[str], embeddings: Any, documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """Insert records, replacing those whose IDs already exist"""
+
+    @abstractmethod
+    def update(self, ids: Sequence[str], embeddings: Any = None, documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """Change the given fields of existing records; metadata keys are merged, unknown IDs ignored"""
+
+    @abstractmethod
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            where_document: Optional[Dict[str, Any]] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """Records by ID and/or filter, in insertion order; ``limit``/``offset`` page through them"""
+
+    @abstractmethod
+    def query(self, query_embeddings: Any, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              where_document: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """Nearest ``n_results`` records per query embedding, closest first"""
+
+    @abstractmethod
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        ...
+
+    @abstractmethod
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Rename the collection and/or replace its metadata (``hnsw:*`` keys cannot be changed)"""
+
+
+class VectorStore(ABC):
+    """A persistent set of collections under one directory"""
+
+    #: Backend name as used in the ``storage_backend`` setting
+    name: str = ""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        """Open a collection; raises if it does not exist"""
+
+    @abstractmethod
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> VectorCollection:
+        """Create a collection; raises if it already exists"""
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> VectorCollection:
+        ...
+
+    @abstractmethod
+    def delete_collection(self, name: str) -> None:
+        """Drop a collection; raises if it does not exist"""
+
+    @abstractmethod
+    def list_collections(self) -> List[VectorCollection]:
+        ...
+
+    @abstractmethod
+    def get_max_batch_size(self) -> int:
+        """Largest number of records one add/upsert call accepts"""
+
+    def close(self) -> None:
+        """Release cached state so that the next open sees other processes' writes"""
+
+
+_COMPARATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def matches_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma ``where`` filter against one record's metadata
+
+    Supports ``{"key": value}``, ``{"key": {"$eq"|"$ne"|"$gt"|"$gte"|"$lt"|
+    "$lte"|"$in"|"$nin": operand}}`` and ``{"$and"|"$or": [filter, ...]}``.
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            for operator, operand in condition.items():
+                comparator = _COMPARATORS.get(operator)
+                if comparator is None:
+                    raise ValueError(f"Unsupported where operator '{operator}'")
+                try:
+                    if not comparator(metadata.get(key), operand):
+                        return False
+                except TypeError:
+                    # 型の違う値同士の大小比較は一致しない扱い
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def matches_document(document: Optional[str], where_document: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma ``where_document`` filter (``$contains``/``$not_contains``/``$and``/``$or``)"""
+    if not where_document:
+        return True
+    document = document or ""
+    for key, operand in where_document.items():
+        if key == "$contains":
+            if operand not in document:
+                return False
+        elif key == "$not_contains":
+            if operand in document:
+                return False
+        elif key == "$and":
+            if not all(matches_document(document, clause) for clause in operand):
+                return False
+        elif key == "$or":
+            if not any(matches_document(document, clause) for clause in operand):
+                return False
+        else:
+            raise ValueError(f"Unsupported where_document operator '{key}'")
+    return True
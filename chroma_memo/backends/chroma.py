@@ -0,0 +1,57 @@
+"""
+Chroma backend (chromadb.PersistentClient)
+
+Chroma のコレクションはそのまま VectorCollection のインターフェースを満たす
+ので、クライアントの生成と後始末だけを受け持つ。
+"""
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .base import VectorStore
+
+
+class ChromaStore(VectorStore):
+    """Collections stored by ``chromadb.PersistentClient`` under ``path``"""
+
+    name = "chroma"
+
+    def __init__(self, path: Path):
+        # テレメトリを確実に無効化
+        os.environ["ANONYMIZED_TELEMETRY"] = "False"
+        import chromadb
+
+        self.path = Path(path)
+        try:
+            self._client = chromadb.PersistentClient(path=str(self.path))
+        except Exception as e:
+            # メモリ上のクライアントに切り替えると、書き込みが黙って失われるのでエラーにする
+            raise RuntimeError(
+                f"Failed to open the Chroma database at '{self.path}': {e}. "
+                "Check that the directory is writable and not used by an incompatible chromadb version, "
+                "or set storage_backend: sqlite."
+            ) from e
+
+    def get_collection(self, name: str):
+        return self._client.get_collection(name)
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        return self._client.create_collection(name=name, metadata=metadata)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        return self._client.get_or_create_collection(name=name, metadata=metadata)
+
+    def delete_collection(self, name: str) -> None:
+        self._client.delete_collection(name)
+
+    def list_collections(self) -> List[Any]:
+        return [*self._client.list_collections()]
+
+    def get_max_batch_size(self) -> int:
+        return self._client.get_max_batch_size()
+
+    def close(self) -> None:
+        # Chromaはパスごとにシステムをキャッシュしているので、破棄してから開き直す
+        clear_cache = getattr(self._client, "clear_system_cache", None)
+        if clear_cache is not None:
+            clear_cache()
@@ -0,0 +1,626 @@
+"""
+Embedded backend: SQLite for records, memory-mapped NumPy files for vectors
+
+chromadb を読み込まない軽量なバックエンド。起動は SQLite を開くだけで、
+検索はベクトルファイルを memory-map して行列積で全件を比較する（常に厳密）。
+
+Layout under ``<root>/``:
+  - store.sqlite3: collections（名前・メタデータ・次元・行数）と entries
+    （ID・本文・メタデータ・ベクトルファイルの行番号・追加順の連番）
+  - vectors/<collection id>.<generation>.f32: row-major float32 行列
+
+ベクトルファイルは追記のみで、更新・削除で使われなくなった行は穴として残し、
+穴が多くなったら新しい世代のファイルに詰め直す。行の追記は SQLite の書き込み
+トランザクションの中で行い、コミットされた行数より後ろは無視するので、
+途中で落ちても壊れない。
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .base import VectorCollection, VectorStore, matches_document, matches_where
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    metadata TEXT,
+    space TEXT NOT NULL DEFAULT 'l2',
+    dim INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0,
+    generation INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS entries (
+    collection_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    document TEXT,
+    metadata TEXT,
+    seq INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (collection_id, id)
+) WITHOUT ROWID;
+"""
+# seq 列がなかったころのストアにも作れるよう、索引はテーブルの移行後に作る
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS entries_row ON entries (collection_id, row);
+CREATE INDEX IF NOT EXISTS entries_seq ON entries (collection_id, seq);
+"""
+
+SPACES = ("l2", "cosine", "ip")
+MAX_BATCH_SIZE = 5000
+
+# SQLite の変数の上限に収まるよう IN (...) を分割する
+_SQL_CHUNK = 500
+# 検索時に一度に行列積をとる行数
+_SCAN_ROWS = 8192
+# 一度に距離を計算するクエリ数（一時メモリは 行数 * これ * 4 バイト）
+_QUERY_CHUNK = 64
+# 穴がこの数と生きている行数の両方を超えたら詰め直す
+_COMPACT_MIN_HOLES = 1024
+
+
+class _State:
+    """One row of the collections table"""
+
+    __slots__ = ("id", "name", "metadata", "space", "dim", "rows", "generation", "version")
+
+    def __init__(self, row: Tuple[Any, ...]):
+        self.id, self.name, metadata, self.space, self.dim, self.rows, self.generation, self.version = row
+        self.metadata = json.loads(metadata) if metadata else None
+
+
+class _View:
+    """Row -> ID mapping and norms of one collection version, cached between queries"""
+
+    __slots__ = ("version", "ids", "valid", "matrix", "norms")
+
+    def __init__(self, version: int, ids: List[Optional[str]], valid: np.ndarray, matrix: np.ndarray):
+        self.version = version
+        self.ids = ids
+        self.valid = valid
+        self.matrix = matrix
+        self.norms: Optional[np.ndarray] = None
+
+
+def _loads(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    return json.loads(value) if value else None
+
+
+def _dumps(value: Optional[Dict[str, Any]]) -> Optional[str]:
+    return json.dumps(value, ensure_ascii=False) if value else None
+
+
+class SQLiteStore(VectorStore):
+    """Collections stored in ``<root>/store.sqlite3`` and ``<root>/vectors``"""
+
+    name = "sqlite"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.vectors_dir = self.root / "vectors"
+        self.vectors_dir.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        # 同じプロセス内の書き込みを直列化する（プロセス間は SQLite のロック）
+        self._write_lock = threading.RLock()
+        self._views: Dict[str, _View] = {}
+        try:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+            conn.executescript(_INDEXES)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"Failed to open the SQLite store at '{self.root}': {e}") from e
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Add the insertion sequence to stores created before it existed"""
+        if any(column[1] == "seq" for column in conn.execute("PRAGMA table_info(entries)")):
+            return
+        with self._writing() as conn:
+            if any(column[1] == "seq" for column in conn.execute("PRAGMA table_info(entries)")):
+                return
+            conn.execute("ALTER TABLE entries ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            # それまでは行番号順に返していたので、その順番を引き継ぐ
+            conn.execute("UPDATE entries SET seq = row")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッド間で共有しない
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.root / "store.sqlite3"), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        """A read transaction, so that several SELECTs see one snapshot"""
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    @contextmanager
+    def _writing(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _state(self, conn: sqlite3.Connection, collection_id: str) -> _State:
+        row = conn.execute(
+            "SELECT id, name, metadata, space, dim, rows, generation, version FROM collections WHERE id = ?",
+            (collection_id,),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Collection {collection_id} does not exist.")
+        return _State(row)
+
+    def _vector_path(self, collection_id: str, generation: int) -> Path:
+        return self.vectors_dir / f"{collection_id}.{generation}.f32"
+
+    def _matrix(self, state: _State) -> np.ndarray:
+        """Memory-mapped (rows, dim) matrix of a collection's current vector file"""
+        if state.rows == 0 or state.dim == 0:
+            return np.empty((0, state.dim), dtype=np.float32)
+        # ファイルの末尾にコミットされなかった行があっても rows までしか見ない
+        return np.memmap(self._vector_path(state.id, state.generation), dtype=np.float32, mode="r",
+                         shape=(state.rows, state.dim))
+
+    def _view(self, conn: sqlite3.Connection, state: _State) -> _View:
+        view = self._views.get(state.id)
+        if view is not None and view.version == state.version:
+            return view
+        ids: List[Optional[str]] = [None] * state.rows
+        valid = np.zeros(state.rows, dtype=bool)
+        for entry_id, row in conn.execute("SELECT id, row FROM entries WHERE collection_id = ?", (state.id,)):
+            ids[row] = entry_id
+            valid[row] = True
+        view = _View(state.version, ids, valid, self._matrix(state))
+        self._views[state.id] = view
+        return view
+
+    def _collection(self, state: _State) -> "SQLiteCollection":
+        return SQLiteCollection(self, state.id, state.name, state.metadata, state.space)
+
+    def _find(self, conn: sqlite3.Connection, name: str) -> Optional[_State]:
+        row = conn.execute(
+            "SELECT id, name, metadata, space, dim, rows, generation, version FROM collections WHERE name = ?",
+            (name,),
+        ).fetchone()
+        return _State(row) if row else None
+
+    def get_collection(self, name: str) -> "SQLiteCollection":
+        with self._reading() as conn:
+            state = self._find(conn, name)
+        if state is None:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self._collection(state)
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> "SQLiteCollection":
+        space = (metadata or {}).get("hnsw:space", "l2")
+        if space not in SPACES:
+            raise ValueError(f"Unknown distance space '{space}'. Choose from: {', '.join(SPACES)}")
+        collection_id = uuid.uuid4().hex
+        try:
+            with self._writing() as conn:
+                conn.execute(
+                    "INSERT INTO collections (id, name, metadata, space) VALUES (?, ?, ?, ?)",
+                    (collection_id, name, _dumps(metadata), space),
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Collection {name} already exists")
+        return SQLiteCollection(self, collection_id, name, metadata or None, space)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> "SQLiteCollection":
+        try:
+            return self.get_collection(name)
+        except ValueError:
+            pass
+        try:
+            return self.create_collection(name, metadata)
+        except ValueError:
+            # 他のプロセスが先に作った
+            return self.get_collection(name)
+
+    def delete_collection(self, name: str) -> None:
+        with self._writing() as conn:
+            state = self._find(conn, name)
+            if state is None:
+                raise ValueError(f"Collection {name} does not exist.")
+            conn.execute("DELETE FROM entries WHERE collection_id = ?", (state.id,))
+            conn.execute("DELETE FROM collections WHERE id = ?", (state.id,))
+        self._views.pop(state.id, None)
+        self._remove_files(state.id)
+
+    def _remove_files(self, collection_id: str, keep: Optional[int] = None) -> None:
+        for path in self.vectors_dir.glob(f"{collection_id}.*.f32"):
+            if keep is not None and path.name == f"{collection_id}.{keep}.f32":
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                # Windows では memory-map 中のファイルは消せない（次回の詰め直しで消す）
+                pass
+
+    def list_collections(self) -> List["SQLiteCollection"]:
+        with self._reading() as conn:
+            rows = conn.execute(
+                "SELECT id, name, metadata, space, dim, rows, generation, version FROM collections ORDER BY name"
+            ).fetchall()
+        return [self._collection(_State(row)) for row in rows]
+
+    def get_max_batch_size(self) -> int:
+        return MAX_BATCH_SIZE
+
+    def close(self) -> None:
+        self._views.clear()
+
+    def compact(self, collection_id: str) -> None:
+        """Rewrite a collection's vectors without the holes left by updates and deletes"""
+        with self._writing() as conn:
+            state = self._state(conn, collection_id)
+            entries = conn.execute(
+                "SELECT id, row FROM entries WHERE collection_id = ? ORDER BY row", (collection_id,)
+            ).fetchall()
+            if len(entries) == state.rows:
+                return
+            source = self._matrix(state)
+            generation = state.generation + 1
+            rows = np.fromiter((row for _, row in entries), dtype=np.int64, count=len(entries))
+            with open(self._vector_path(collection_id, generation), "wb") as f:
+                for start in range(0, len(rows), _SCAN_ROWS):
+                    f.write(np.ascontiguousarray(source[rows[start:start + _SCAN_ROWS]]).tobytes())
+            conn.executemany(
+                "UPDATE entries SET row = ? WHERE collection_id = ? AND id = ?",
+                [(index, collection_id, entry_id) for index, (entry_id, _) in enumerate(entries)],
+            )
+            conn.execute(
+                "UPDATE collections SET rows = ?, generation = ?, version = version + 1 WHERE id = ?",
+                (len(entries), generation, collection_id),
+            )
+        self._views.pop(collection_id, None)
+        self._remove_files(collection_id, keep=generation)
+
+
+class SQLiteCollection(VectorCollection):
+    """A collection of :class:`SQLiteStore`"""
+
+    def __init__(self, store: SQLiteStore, collection_id: str, name: str,
+                 metadata: Optional[Dict[str, Any]], space: str):
+        self._store = store
+        self.id = collection_id
+        self.name = name
+        self.metadata = metadata
+        self.space = space
+
+    def count(self) -> int:
+        with self._store._reading() as conn:
+            return conn.execute("SELECT COUNT(*) FROM entries WHERE collection_id = ?", (self.id,)).fetchone()[0]
+
+    def add(self, ids: Sequence[str], embeddings: Any, documents: Optional[Sequence[str]] = None,
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids: Sequence[str], embeddings: Any, documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def _write(self, ids: Sequence[str], embeddings: Any, documents: Optional[Sequence[str]],
+               metadatas: Optional[Sequence[Dict[str, Any]]], replace: bool) -> None:
+        ids = [*ids]
+        if embeddings is None:
+            raise ValueError("The sqlite backend needs embeddings for every record")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] != len(ids):
+            raise ValueError(f"Expected {len(ids)} embeddings, got an array of shape {vectors.shape}")
+        documents = [*documents] if documents is not None else [None] * len(ids)
+        metadatas = [*metadatas] if metadatas is not None else [None] * len(ids)
+        if len(documents) != len(ids) or len(metadatas) != len(ids):
+            raise ValueError("ids, documents and metadatas must have the same length")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate IDs in one write")
+        if not ids:
+            return
+
+        store = self._store
+        with store._writing() as conn:
+            state = store._state(conn, self.id)
+            existing = {record[0]: record for record in self._select(conn, ids, ", document, metadata")}
+            keep = [i for i, entry_id in enumerate(ids) if replace or entry_id not in existing]
+            if not keep:
+                return
+            if len(keep) != len(ids):
+                vectors = vectors[keep]
+
+            start = self._append(conn, state, vectors)
+            # 追加順は seq で持つ（行番号は更新のたびに変わる）。既存の ID は元の順番のまま
+            next_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM entries WHERE collection_id = ?", (self.id,)
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO entries (collection_id, id, row, document, metadata, seq) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (collection_id, id) DO UPDATE SET "
+                "row = excluded.row, document = excluded.document, metadata = excluded.metadata",
+                [
+                    (self.id, ids[i], start + offset, *self._merged(existing.get(ids[i]), documents[i], metadatas[i]),
+                     next_seq + offset)
+                    for offset, i in enumerate(keep)
+                ],
+            )
+        if existing and replace:
+            self._maybe_compact()
+
+    def _append(self, conn: sqlite3.Connection, state: _State, vectors: np.ndarray) -> int:
+        """Write rows after the committed ones and record them; returns the first new row (in a write transaction)"""
+        if state.dim and vectors.shape[1] != state.dim:
+            raise ValueError(f"Collection expecting embedding with dimension of {state.dim}, got {vectors.shape[1]}")
+        # 更新も新しい行に書き、古い行は穴にする（コミット前に落ちても元の行が残る）
+        path = self._store._vector_path(self.id, state.generation)
+        fd = os.open(str(path), os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            os.lseek(fd, state.rows * vectors.shape[1] * 4, os.SEEK_SET)
+            os.write(fd, np.ascontiguousarray(vectors).tobytes())
+        finally:
+            os.close(fd)
+        conn.execute(
+            "UPDATE collections SET dim = ?, rows = ?, version = version + 1 WHERE id = ?",
+            (vectors.shape[1], state.rows + len(vectors), self.id),
+        )
+        return state.rows
+
+    def update(self, ids: Sequence[str], embeddings: Any = None, documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        ids = [*ids]
+        store = self._store
+        with store._writing() as conn:
+            state = store._state(conn, self.id)
+            records = {record[0]: record for record in self._select(conn, ids, ", document, metadata")}
+            present = [i for i, entry_id in enumerate(ids) if entry_id in records]
+            if not present:
+                return
+            rows = {ids[i]: records[ids[i]][1] for i in present}
+            if embeddings is not None:
+                vectors = np.asarray(embeddings, dtype=np.float32)[present]
+                start = self._append(conn, state, vectors)
+                rows = {ids[i]: start + offset for offset, i in enumerate(present)}
+
+            updates = []
+            for i in present:
+                document, metadata = self._merged(records[ids[i]], None if documents is None else documents[i],
+                                                  None if metadatas is None else metadatas[i])
+                updates.append((rows[ids[i]], document, metadata, self.id, ids[i]))
+            conn.executemany(
+                "UPDATE entries SET row = ?, document = ?, metadata = ? WHERE collection_id = ? AND id = ?", updates
+            )
+            conn.execute("UPDATE collections SET version = version + 1 WHERE id = ?", (self.id,))
+        if embeddings is not None:
+            self._maybe_compact()
+
+    @staticmethod
+    def _merged(record: Optional[Tuple[Any, ...]], document: Optional[str],
+                metadata: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+        """(document, metadata JSON) to store over an existing ``record`` (id, row, document, metadata, seq)
+
+        Chroma と同じく、update / upsert で渡されなかった本文・メタデータは元のまま、
+        メタデータは既存のキーに上書きする（None のキーは消す）。
+        """
+        if record is None:
+            return document, _dumps(metadata)
+        _, _, old_document, old_metadata, _ = record
+        if metadata is not None:
+            merged = {**(_loads(old_metadata) or {}), **metadata}
+            old_metadata = _dumps({k: v for k, v in merged.items() if v is not None})
+        return (old_document if document is None else document), old_metadata
+
+    def _maybe_compact(self) -> None:
+        store = self._store
+        with store._reading() as conn:
+            rows = store._state(conn, self.id).rows
+            live = conn.execute("SELECT COUNT(*) FROM entries WHERE collection_id = ?", (self.id,)).fetchone()[0]
+        holes = rows - live
+        if holes > _COMPACT_MIN_HOLES and holes > live:
+            store.compact(self.id)
+
+    def _select(self, conn: sqlite3.Connection, ids: Optional[Sequence[str]], columns: str) -> List[Tuple[Any, ...]]:
+        """Entry rows (id, row, *columns, seq) in insertion order: those of ``ids``, or all of them"""
+        if ids is None:
+            return conn.execute(
+                f"SELECT id, row{columns}, seq FROM entries WHERE collection_id = ? ORDER BY seq", (self.id,)
+            ).fetchall()
+        wanted = [*dict.fromkeys(ids)]
+        found: List[Tuple[Any, ...]] = []
+        for start in range(0, len(wanted), _SQL_CHUNK):
+            chunk = wanted[start:start + _SQL_CHUNK]
+            found.extend(conn.execute(
+                f"SELECT id, row{columns}, seq FROM entries WHERE collection_id = ? "
+                f"AND id IN ({','.join('?' * len(chunk))})",
+                (self.id, *chunk),
+            ))
+        # Chroma と同じく、ID を指定しても追加順に返す
+        found.sort(key=lambda record: record[-1])
+        return found
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            where_document: Optional[Dict[str, Any]] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        include = [*include]
+        filtered = bool(where or where_document)
+        # 使わない列は読まない（ID の一覧だけなら本文もメタデータも開かない）
+        need_text = filtered or "documents" in include or "metadatas" in include
+        columns = ", document, metadata" if need_text else ""
+
+        store = self._store
+        with store._reading() as conn:
+            state = store._state(conn, self.id)
+            if ids is None and not filtered:
+                records = conn.execute(
+                    f"SELECT id, row{columns} FROM entries WHERE collection_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                    (self.id, -1 if limit is None else limit, offset or 0),
+                ).fetchall()
+            else:
+                records = self._select(conn, ids, columns)
+                if filtered:
+                    records = [
+                        record for record in records
+                        if matches_where(_loads(record[3]), where) and matches_document(record[2], where_document)
+                    ]
+                start = offset or 0
+                records = records[start:None if limit is None else start + limit]
+
+        result: Dict[str, Any] = {"ids": [record[0] for record in records], "documents": None,
+                                  "metadatas": None, "embeddings": None, "included": include}
+        if "documents" in include:
+            result["documents"] = [record[2] for record in records]
+        if "metadatas" in include:
+            result["metadatas"] = [_loads(record[3]) for record in records]
+        if "embeddings" in include:
+            if records:
+                rows = np.fromiter((record[1] for record in records), dtype=np.int64, count=len(records))
+                result["embeddings"] = np.asarray(store._matrix(state)[rows])
+            else:
+                result["embeddings"] = np.empty((0, state.dim), dtype=np.float32)
+        return result
+
+    def query(self, query_embeddings: Any, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              where_document: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        include = [*include]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+
+        store = self._store
+        with store._reading() as conn:
+            state = store._state(conn, self.id)
+            if state.rows and queries.shape[1] != state.dim:
+                raise ValueError(f"Collection expecting embedding with dimension of {state.dim}, got {queries.shape[1]}")
+            view = store._view(conn, state)
+            valid = view.valid
+            if where or where_document:
+                valid = np.zeros(state.rows, dtype=bool)
+                for row, document, metadata in conn.execute(
+                    "SELECT row, document, metadata FROM entries WHERE collection_id = ?", (self.id,)
+                ):
+                    valid[row] = matches_where(_loads(metadata), where) and matches_document(document, where_document)
+
+        top = self._nearest(view, valid, queries, n_results)
+        hit_ids = [[view.ids[row] for row in rows] for rows, _ in top]
+        result: Dict[str, Any] = {"ids": hit_ids, "documents": None, "metadatas": None, "embeddings": None,
+                                  "distances": None, "included": include}
+        if "distances" in include:
+            result["distances"] = [distances.tolist() for _, distances in top]
+        if "embeddings" in include:
+            result["embeddings"] = [np.asarray(view.matrix[rows]) for rows, _ in top]
+        if "documents" in include or "metadatas" in include:
+            # 全クエリのヒットをまとめて1回で読む
+            wanted = sorted({entry_id for row_ids in hit_ids for entry_id in row_ids})
+            with store._reading() as conn:
+                fetched = {record[0]: record for record in self._select(conn, wanted, ", document, metadata")}
+            if "documents" in include:
+                result["documents"] = [[fetched[entry_id][2] for entry_id in row_ids] for row_ids in hit_ids]
+            if "metadatas" in include:
+                result["metadatas"] = [[_loads(fetched[entry_id][3]) for entry_id in row_ids] for row_ids in hit_ids]
+        return result
+
+    def _nearest(self, view: _View, valid: np.ndarray, queries: np.ndarray,
+                 n_results: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, distances) of the closest valid rows per query, with Chroma's distance for the space"""
+        available = int(valid.sum())
+        k = min(n_results, available)
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        matrix = view.matrix
+        if self.space != "ip" and view.norms is None:
+            view.norms = np.concatenate([
+                np.einsum("ij,ij->i", block, block)
+                for block in (np.asarray(matrix[start:start + _SCAN_ROWS]) for start in range(0, len(valid), _SCAN_ROWS))
+            ])
+        query_norms = np.einsum("ij,ij->i", queries, queries)
+
+        results: List[Tuple[np.ndarray, np.ndarray]] = []
+        for q_start in range(0, len(queries), _QUERY_CHUNK):
+            chunk = queries[q_start:q_start + _QUERY_CHUNK]
+            chunk_norms = query_norms[q_start:q_start + _QUERY_CHUNK]
+            distances = np.empty((len(valid), len(chunk)), dtype=np.float32)
+            for start in range(0, len(valid), _SCAN_ROWS):
+                block = np.asarray(matrix[start:start + _SCAN_ROWS])
+                dots = block @ chunk.T
+                if self.space == "l2":
+                    # Chroma の l2 は二乗距離
+                    block_distances = view.norms[start:start + len(block), None] - 2.0 * dots + chunk_norms[None, :]
+                elif self.space == "cosine":
+                    scale = np.sqrt(view.norms[start:start + len(block), None] * chunk_norms[None, :])
+                    scale[scale == 0] = 1.0
+                    block_distances = 1.0 - dots / scale
+                else:
+                    block_distances = 1.0 - dots
+                distances[start:start + len(block)] = block_distances
+            distances[~valid] = np.inf
+
+            for column in range(len(chunk)):
+                scores = distances[:, column]
+                rows = np.argpartition(scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+                rows = rows[np.argsort(scores[rows], kind="stable")][:k]
+                found = scores[rows]
+                # 丸め誤差で負にならないようにする（ip の距離はもともと負になりうる）
+                results.append((rows, found if self.space == "ip" else np.maximum(found, 0.0)))
+        return results
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        store = self._store
+        with store._writing() as conn:
+            if where:
+                records = self._select(conn, ids, ", document, metadata")
+                targets = [record[0] for record in records if matches_where(_loads(record[3]), where)]
+            elif ids is not None:
+                targets = [*ids]
+            else:
+                raise ValueError("delete needs ids or a where filter")
+            for start in range(0, len(targets), _SQL_CHUNK):
+                chunk = targets[start:start + _SQL_CHUNK]
+                conn.execute(
+                    f"DELETE FROM entries WHERE collection_id = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (self.id, *chunk),
+                )
+            conn.execute("UPDATE collections SET version = version + 1 WHERE id = ?", (self.id,))
+        self._maybe_compact()
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> None:
+        store = self._store
+        try:
+            with store._writing() as conn:
+                store._state(conn, self.id)
+                if metadata is not None:
+                    # Chroma と同じくメタデータは置き換える。距離の種類は space 列に残るので変わらない
+                    metadata = {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}
+                    conn.execute("UPDATE collections SET metadata = ? WHERE id = ?", (_dumps(metadata), self.id))
+                if name is not None:
+                    conn.execute("UPDATE collections SET name = ? WHERE id = ?", (name, self.id))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Collection {name} already exists")
+        if metadata is not None:
+            self.metadata = metadata or None
+        if name is not None:
+            self.name = name
@@ -0,0 +1,75 @@
+"""
+Batch query mode for `chroma-memo search --queries-file`
+
+評価セットやスクリプトから数千件のクエリを流すときに、1件ごとにプロセス起動と
+埋め込みリクエストを払わずに済むよう、クエリをまとめて埋め込み・検索する。
+結果はクエリ番号付きの JSON Lines で流し、正解ファイルがあれば recall@k を求める。
+
+クエリファイル: 1行1クエリ（空行は無視）。番号 (index) は空行を除いた0始まりの連番。
+
+正解ファイル (JSON Lines): 1行1クエリ。`relevant` に正解のエントリID（先頭の
+数文字でもよい）のリストを書き、`index` またはクエリ文字列 `query` で対応付ける。
+
+    {"index": 0, "relevant": ["3f2a9c1e", "b71d0e44"]}
+    {"query": "線形回帰とは", "relevant": ["9c0d..."]}
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TextIO
+
+
+def read_queries(stream: TextIO) -> List[str]:
+    """Non-empty lines of ``stream``, stripped"""
+    return [line.strip() for line in stream if line.strip()]
+
+
+def read_answers(stream: TextIO, queries: Sequence[str]) -> Dict[int, List[str]]:
+    """Parse an answer file into query index -> relevant entry IDs (or ID prefixes)"""
+    by_query: Dict[str, List[int]] = {}
+    for index, query in enumerate(queries):
+        by_query.setdefault(query, []).append(index)
+
+    answers: Dict[int, List[str]] = {}
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Answer file line {number}: invalid JSON ({e})") from None
+        relevant = record.get("relevant") if isinstance(record, dict) else None
+        if not isinstance(relevant, list) or not all(isinstance(item, str) and item for item in relevant):
+            raise ValueError(f"Answer file line {number}: 'relevant' must be a list of entry IDs")
+        if "index" in record:
+            index = record["index"]
+            if not isinstance(index, int) or not 0 <= index < len(queries):
+                raise ValueError(f"Answer file line {number}: index {index!r} is out of range")
+            indices = [index]
+        elif "query" in record:
+            indices = by_query.get(str(record["query"]).strip(), [])
+            if not indices:
+                raise ValueError(f"Answer file line {number}: query {record['query']!r} is not in the queries file")
+        else:
+            raise ValueError(f"Answer file line {number}: needs 'index' or 'query'")
+        for index in indices:
+            answers[index] = relevant
+    return answers
+
+
+def recall_at_k(hit_ids: Sequence[str], relevant: Sequence[str]) -> float:
+    """Share of ``relevant`` IDs (full IDs or prefixes) found among ``hit_ids``"""
+    if not relevant:
+        return 1.0
+    found = sum(1 for wanted in relevant if any(hit_id.startswith(wanted) for hit_id in hit_ids))
+    return found / len(relevant)
+
+
+def summarize_recall(recalls: Iterable[Optional[float]]) -> Dict[str, Any]:
+    """{"queries": labeled queries, "recall": mean recall@k, "hit_rate": share with any relevant hit}"""
+    scored = [recall for recall in recalls if recall is not None]
+    if not scored:
+        return {"queries": 0, "recall": 0.0, "hit_rate": 0.0}
+    return {
+        "queries": len(scored),
+        "recall": sum(scored) / len(scored),
+        "hit_rate": sum(1 for recall in scored if recall > 0) / len(scored),
+    }
@@ -0,0 +1,356 @@
+"""
+Reproducible benchmark suite for Chroma-Memo
+
+一時ディレクトリに独立したデータベースを作り、決定的な多言語の合成コーパスと
+オフラインのハッシュ埋め込み (USE_API=HASH) で、追加スループット、検索
+レイテンシ、一覧・情報取得・部分ID検索の時間、メモリ使用量、ディスク使用量を
+計測する。結果は JSON で書き出し、別の実行と比較できる。
+"""
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import __version__
+from .metrics import metrics, percentile
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+RESULT_SCHEMA = 1
+
+# 言語ごとの語彙と区切り文字（日本語・中国語は空白なし）
+_VOCABULARY: Dict[str, Tuple[str, List[str]]] = {
+    "en": (" ", ["database", "index", "query", "latency", "cache", "vector", "embedding", "deploy",
+                 "config", "server", "client", "timeout", "retry", "memory", "thread", "lock",
+                 "migration", "schema", "token", "batch", "error", "release", "test", "build"]),
+    "ja": ("", ["データベース", "検索", "設定", "エラー", "キャッシュ", "非同期", "認証", "接続",
+                "移行", "本番環境", "ログ", "監視", "性能", "並列", "更新", "削除", "追加", "障害",
+                "手順", "確認", "対応", "修正", "原因", "影響"]),
+    "zh": ("", ["数据库", "索引", "查询", "缓存", "延迟", "配置", "服务器", "错误", "部署", "测试",
+                "内存", "线程", "批量", "向量", "迁移", "日志"]),
+    "es": (" ", ["base", "datos", "consulta", "índice", "servidor", "caché", "error", "memoria",
+                 "prueba", "despliegue", "configuración", "latencia", "lote", "vector"]),
+    "de": (" ", ["Datenbank", "Abfrage", "Zwischenspeicher", "Fehler", "Speicher", "Server",
+                 "Bereitstellung", "Konfiguration", "Prüfung", "Latenz", "Index", "Vektor"]),
+}
+_LANGUAGES = ("en", "ja", "zh", "es", "de")
+# 英語と日本語のメモが多い実際の使われ方に寄せる
+_LANGUAGE_WEIGHTS = (4, 4, 1, 1, 1)
+_TAGS = ["bug", "design", "ops", "perf", "security", "howto", "decision", "todo"]
+
+
+def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    language = rng.choices(_LANGUAGES, weights=_LANGUAGE_WEIGHTS)[0]
+    separator, words = _VOCABULARY[language]
+    return separator.join(rng.choice(words) for _ in range(rng.randint(min_words, max_words)))
+
+
+def generate_corpus(size: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield ``size`` synthetic multilingual entries; identical for the same seed"""
+    rng = random.Random(f"corpus-{seed}")
+    for i in range(size):
+        sentences = [_sentence(rng, 6, 20) for _ in range(rng.randint(1, 3))]
+        yield {
+            "content": f"#{i} " + " / ".join(sentences),
+            "tags": rng.sample(_TAGS, rng.randint(0, 3)),
+        }
+
+
+def generate_queries(count: int, seed: int = 0) -> List[str]:
+    """Short multilingual search queries drawn from the corpus vocabulary"""
+    rng = random.Random(f"queries-{seed}")
+    return [_sentence(rng, 2, 5) for _ in range(count)]
+
+
+def summarize(seconds: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    values = sorted(seconds)
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean": round(sum(values) / len(values) * 1000.0, 3),
+        "p50": round(percentile(values, 0.5) * 1000.0, 3),
+        "p95": round(percentile(values, 0.95) * 1000.0, 3),
+        "p99": round(percentile(values, 0.99) * 1000.0, 3),
+        "max": round(values[-1] * 1000.0, 3),
+    }
+
+
+def _timed(func: Callable[[], Any], repeat: int) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process (Linux only)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS はバイト
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def disk_usage(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def environment_info() -> Dict[str, Any]:
+    info: Dict[str, Any] = {
+        "chroma_memo": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    for module in ("chromadb", "numpy"):
+        try:
+            info[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            info[module] = None
+    return info
+
+
+def _open_database(db_path: Path):
+    """A database that only ever touches ``db_path``, using offline hash embeddings"""
+    from . import config as config_module
+    from . import database as database_module
+    from . import embeddings as embeddings_module
+
+    os.environ["USE_API"] = "HASH"
+    manager = config_module.ConfigManager(str(db_path.parent / "config.yaml"))
+    config = manager.load_config()
+    config.db_path = str(db_path)
+    config.async_ingest = False
+    config.use_daemon = False
+    config.metrics_log = False
+    # ベンチマークの検索をアクセス統計に数えない（反映の書き込みが計測に混ざる）
+    config.access_tracking = False
+
+    # 利用者の設定・データベースに触れないよう、グローバルを差し替える
+    config_module._config_manager_instance = manager
+    embeddings_module._embedding_service_instance = None
+    database_module._database_instance = None
+    metrics.configure(None)
+    return database_module.ChromaMemoDatabase()
+
+
+def bench_size(db, db_path: Path, size: int, queries: List[str], batch_size: int = 256,
+               search_batch: int = 10, engine: Optional[str] = None, seed: int = 0,
+               progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Load ``size`` entries into a fresh project and time each operation"""
+    say = progress or (lambda message: None)
+    project = f"bench-{size}"
+    db.create_project(project, engine=engine)
+
+    say(f"{size} 件を追加中...")
+    batch_durations = []
+    pending: List[Dict[str, Any]] = []
+    errors = 0
+
+    def flush() -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        results = db.add_knowledge_batch(project, pending)
+        batch_durations.append(time.perf_counter() - started)
+        errors += sum(1 for result in results if result.get("error"))
+        pending.clear()
+
+    for item in generate_corpus(size, seed):
+        pending.append(item)
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+    add_seconds = sum(batch_durations)
+
+    say("検索を計測中...")
+    cold = _timed(lambda: db.search_knowledge(project, queries[0]), 1)[0]
+    search = [
+        duration
+        for query in queries
+        for duration in _timed(lambda q=query: db.search_knowledge(project, q), 1)
+    ]
+    batches = [queries[i:i + search_batch] for i in range(0, len(queries), search_batch)]
+    search_batched = [
+        duration
+        for chunk in batches
+        for duration in _timed(lambda c=chunk: db.search_knowledge_batch(project, c), 1)
+    ]
+
+    say("一覧・情報取得・部分ID検索を計測中...")
+    repeat = 3 if size >= 50000 else 5
+    list_durations = _timed(lambda: db.list_knowledge(project).sorted_by_created(), repeat)
+    info_durations = _timed(lambda: db.get_project_info(project), repeat)
+    projects_durations = _timed(db.list_projects, repeat)
+
+    rows = db.list_knowledge(project)
+    rng = random.Random(f"ids-{seed}")
+    sample = [rows[rng.randrange(len(rows))].id for _ in range(min(20, len(rows)))]
+    partial_id = [
+        duration
+        for entry_id in sample
+        for duration in _timed(lambda e=entry_id: db.get_knowledge_by_id(project, e[:8]), 1)
+    ]
+
+    # 単発追加は最後に（コーパスの件数にほとんど影響しない）
+    single_add = [
+        duration
+        for i in range(min(20, len(queries)))
+        for duration in _timed(lambda i=i: db.add_knowledge(project, f"single {i} {queries[i]}"), 1)
+    ]
+
+    setting, resolved = db.get_search_engine(project)
+    return {
+        "size": size,
+        "engine": resolved,
+        "engine_setting": setting,
+        "add": {
+            "entries": size,
+            "errors": errors,
+            "seconds": round(add_seconds, 3),
+            "entries_per_sec": round(size / add_seconds, 1) if add_seconds else None,
+            "batch_size": batch_size,
+            "batch_ms": summarize(batch_durations),
+        },
+        "add_single_ms": summarize(single_add),
+        "search_cold_ms": round(cold * 1000.0, 3),
+        "search_ms": summarize(search),
+        "search_batch_ms": {**summarize(search_batched), "queries_per_batch": search_batch},
+        "list_ms": summarize(list_durations),
+        "info_ms": summarize(info_durations),
+        "projects_ms": summarize(projects_durations),
+        "get_partial_id_ms": summarize(partial_id),
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+        "disk_bytes": disk_usage(db_path),
+    }
+
+
+def run_benchmark(sizes: List[int], query_count: int = 100, batch_size: int = 256,
+                  search_batch: int = 10, engine: Optional[str] = None, seed: int = 0,
+                  workdir: Optional[Path] = None, keep: bool = False,
+                  progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Run the suite for each corpus size, each in its own database directory
+
+    RSS is per process, so ``peak_rss_mb`` of a later size includes earlier
+    ones; run one size per invocation for an isolated memory figure.
+    """
+    from .embeddings import HASH_EMBEDDING_DIM
+
+    say = progress or (lambda message: None)
+    root = Path(workdir) if workdir else Path(tempfile.mkdtemp(prefix="chroma-memo-bench-"))
+    root.mkdir(parents=True, exist_ok=True)
+    queries = generate_queries(max(1, query_count), seed)
+
+    report: Dict[str, Any] = {
+        "schema": RESULT_SCHEMA,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment_info(),
+        "settings": {
+            "sizes": sizes,
+            "queries": len(queries),
+            "batch_size": batch_size,
+            "search_batch": search_batch,
+            "engine": engine or "default",
+            "seed": seed,
+            "embedding": {"backend": "hash", "dimension": HASH_EMBEDDING_DIM},
+        },
+        "results": [],
+    }
+    try:
+        for size in sorted(sizes):
+            db_path = root / f"size-{size}" / "db"
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            say(f"📏 {size} 件のベンチマーク ({db_path})")
+            db = _open_database(db_path)
+            report["results"].append(
+                bench_size(db, db_path, size, queries, batch_size=batch_size, search_batch=search_batch,
+                           engine=engine, seed=seed, progress=say)
+            )
+            # 次のサイズに前のサイズのメモリマップを持ち越さない
+            db.exact_index.clear_cache()
+            # 一時ディレクトリを消した後に終了時の反映が走らないよう、ここで閉じる
+            if db._access_tracker is not None:
+                db._access_tracker.close()
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    if keep:
+        report["workdir"] = str(root)
+    return report
+
+
+# (指標のパス, 大きいほど良いか)
+COMPARED_METRICS: List[Tuple[str, bool]] = [
+    ("add.entries_per_sec", True),
+    ("add_single_ms.p50", False),
+    ("search_ms.p50", False),
+    ("search_ms.p95", False),
+    ("search_batch_ms.p50", False),
+    ("list_ms.p50", False),
+    ("info_ms.p50", False),
+    ("projects_ms.p50", False),
+    ("get_partial_id_ms.p50", False),
+    ("peak_rss_mb", False),
+    ("disk_bytes", False),
+]
+
+
+def _lookup(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per size and metric: old value, new value and change (positive = better)"""
+    previous = {result["size"]: result for result in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        old_result = previous.get(result["size"])
+        if old_result is None:
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            old, new = _lookup(old_result, path), _lookup(result, path)
+            if old is None or new is None:
+                continue
+            change = None
+            if old:
+                change = (new - old) / old * 100.0
+                if not higher_is_better:
+                    change = -change
+            rows.append({"size": result["size"], "metric": path, "old": old, "new": new, "improvement_pct": change})
+    return rows
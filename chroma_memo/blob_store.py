@@ -0,0 +1,168 @@
+"""
+Compressed, content-addressed store for large entry bodies
+
+`blob_threshold_chars` を超える本文は、圧縮して `<db_path>/blobs/ab/<sha256>.<codec>`
+に保存し、コレクションのドキュメントには先頭部分（プレビュー）だけを置く。
+メタデータには本文の SHA-256 と文字数を記録し、全文が必要になったとき
+（get や検索結果の表示など）にだけ読み込む。埋め込みは常に全文から計算する。
+
+同じ内容の本文は1つのファイルを共有するので、エントリを消してもファイルは
+すぐには消さない。`chroma-memo blobs --gc` でどのエントリからも参照されて
+いないファイルを削除する。
+
+zstandard がインストールされていれば zstd、なければ標準ライブラリの zlib で圧縮する。
+"""
+import hashlib
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+
+# エントリのメタデータのキー
+BLOB_DIGEST_KEY = "blob_sha256"
+BLOB_CHARS_KEY = "blob_chars"
+
+CODEC_AUTO = "auto"
+CODEC_ZSTD = "zstd"
+CODEC_ZLIB = "zlib"
+CODECS = (CODEC_AUTO, CODEC_ZSTD, CODEC_ZLIB)
+
+# 拡張子 -> コーデック（読み込み時はどちらの形式も扱う）
+_SUFFIXES = {".zst": CODEC_ZSTD, ".zz": CODEC_ZLIB}
+_ZSTD_LEVEL = 10
+_ZLIB_LEVEL = 6
+# 読み込んだ本文をプロセス内に保持する件数
+_CACHE_SIZE = 64
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def blob_root(db_path: Path) -> Path:
+    return Path(db_path) / "blobs"
+
+
+def make_preview(text: str, chars: int) -> str:
+    """Leading part of a body stored in place of the full text"""
+    return text[:max(0, chars)]
+
+
+def is_blob(metadata: Optional[Dict[str, object]]) -> bool:
+    return bool(metadata and metadata.get(BLOB_DIGEST_KEY))
+
+
+class BlobStore:
+    """Bodies keyed by the SHA-256 of their UTF-8 text, one compressed file each"""
+
+    def __init__(self, root: Path, codec: str = CODEC_AUTO):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown blob compression '{codec}'. Choose from: {', '.join(CODECS)}")
+        if codec == CODEC_ZSTD and _zstd() is None:
+            raise RuntimeError("blob_compression: zstd needs the 'zstandard' package (pip install zstandard)")
+        if codec == CODEC_AUTO:
+            codec = CODEC_ZSTD if _zstd() is not None else CODEC_ZLIB
+        self.root = Path(root)
+        self.codec = codec
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, codec: str) -> Path:
+        suffix = next(suffix for suffix, name in _SUFFIXES.items() if name == codec)
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def _find(self, digest: str) -> Optional[Path]:
+        for codec in (self.codec, *(name for name in _SUFFIXES.values() if name != self.codec)):
+            path = self._path(digest, codec)
+            if path.exists():
+                return path
+        return None
+
+    def put(self, text: str) -> str:
+        """Store ``text`` (no-op if the same body is already stored); returns its digest"""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        if self._find(digest) is not None:
+            return digest
+
+        if self.codec == CODEC_ZSTD:
+            compressed = _zstd().ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+        else:
+            compressed = zlib.compress(data, _ZLIB_LEVEL)
+        path = self._path(digest, self.codec)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 書きかけのファイルを残さないよう、一時ファイルから置き換える
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """The body stored under ``digest``, or None if the file is missing"""
+        with self._lock:
+            text = self._cache.get(digest)
+            if text is not None:
+                self._cache.move_to_end(digest)
+                return text
+
+        path = self._find(digest)
+        if path is None:
+            print(f"⚠️  Blob {digest[:12]} is missing; showing the stored preview", file=sys.stderr)
+            return None
+        with open(path, "rb") as f:
+            compressed = f.read()
+        if _SUFFIXES[path.suffix] == CODEC_ZSTD:
+            zstandard = _zstd()
+            if zstandard is None:
+                raise RuntimeError(f"Blob {path.name} is zstd-compressed; install the 'zstandard' package to read it")
+            data = zstandard.ZstdDecompressor().decompress(compressed)
+        else:
+            data = zlib.decompress(compressed)
+        text = data.decode("utf-8")
+
+        with self._lock:
+            self._cache[digest] = text
+            while len(self._cache) > _CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return text
+
+    def _files(self) -> Iterator[Tuple[str, Path]]:
+        if not self.root.is_dir():
+            return
+        for path in self.root.glob("??/*"):
+            if path.suffix in _SUFFIXES:
+                yield path.stem, path
+
+    def stats(self) -> Dict[str, int]:
+        """{"blobs": files, "bytes": compressed size on disk}"""
+        blobs = 0
+        size = 0
+        for _, path in self._files():
+            blobs += 1
+            size += path.stat().st_size
+        return {"blobs": blobs, "bytes": size}
+
+    def collect_garbage(self, referenced: Iterable[str], dry_run: bool = False) -> Dict[str, int]:
+        """Delete blobs no entry refers to (call under the database write lock)"""
+        keep: Set[str] = set(referenced)
+        removed = 0
+        freed = 0
+        for digest, path in [*self._files()]:
+            if digest in keep:
+                continue
+            removed += 1
+            freed += path.stat().st_size
+            if not dry_run:
+                path.unlink()
+                with self._lock:
+                    self._cache.pop(digest, None)
+        return {"removed": removed, "bytes": freed}
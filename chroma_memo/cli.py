@@ -16,12 +16,80 @@ try:
 except ImportError:
     import importlib_resources as resources
 
-from .database import database
-from .models import SearchResult, ProjectInfo, KnowledgeEntry
 from .config import config_manager
+from .metrics import metrics
+from .streaming import FORMATS, FORMAT_TABLE, FORMAT_JSONL
 from . import __version__
 
 console = Console()
+# --format jsonl/tsv/json では標準出力をデータ専用にし、メッセージはこちらに出す
+err_console = Console(stderr=True)
+
+
+def _get_local_database():
+    from .database import get_database
+    return get_database()
+
+
+class _LazyDatabase:
+    """database モジュール（chromadb / openai）を最初に使うコマンドまで読み込まない
+    
+    デーモンが有効な場合は常駐プロセスに転送し、使えなければプロセス内で実行する。
+    """
+    def __init__(self):
+        self._backend = None
+    
+    def _get_backend(self):
+        if self._backend is None:
+            from .daemon import daemon_enabled, ensure_daemon, RemoteDatabase
+            client = ensure_daemon() if daemon_enabled() else None
+            if client is not None:
+                self._backend = RemoteDatabase(client, _get_local_database)
+            else:
+                self._backend = _get_local_database()
+        return self._backend
+    
+    def __getattr__(self, name):
+        return getattr(self._get_backend(), name)
+
+database = _LazyDatabase()
+
+
+def _parse_date_option(value: str, end: bool = False) -> str:
+    """ISO date/time option -> ISO timestamp; a bare date as ``end`` covers that whole day"""
+    from datetime import datetime, timedelta
+    
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise click.BadParameter(f"日付は YYYY-MM-DD または YYYY-MM-DDTHH:MM 形式で指定してください: {value}")
+    if end and len(value) <= 10:
+        parsed += timedelta(days=1)
+    return parsed.isoformat()
+
+
+def _format_options(command):
+    """--format / --limit / --fields shared by list, search and projects"""
+    command = click.option('--fields', default=None,
+                           help='--format jsonl/tsv/json で出力する項目 (カンマ区切り)')(command)
+    command = click.option('--format', 'output_format', type=click.Choice(FORMATS), default=FORMAT_TABLE,
+                           help='table: 表形式 / jsonl・tsv・json: 装飾なしで1件ずつ標準出力へ')(command)
+    return command
+
+
+def _stream_rows(output_format: str, fields: str, extractors, default_fields, pages) -> int:
+    """Write ``pages`` (iterables of rows) to stdout as they come; returns the number of rows"""
+    from .streaming import RowWriter, parse_fields
+    
+    writer = RowWriter(sys.stdout, output_format, parse_fields(fields, extractors, default_fields), extractors)
+    try:
+        with writer:
+            for page in pages:
+                writer.write_page(page)
+    except BrokenPipeError:
+        # head などで読み手が先に終了した場合は、残りを捨てて静かに終わる
+        sys.stdout = open(os.devnull, "w")
+    return writer.count
 
 
 def _copy_claude_commands_template(project_name: str):
@@ -143,18 +211,37 @@ chroma-memo del {project_name} "$ARGUMENTS" --confirm
 
 @click.group()
 @click.version_option(version=__version__, prog_name="chroma-memo")
-def main():
+@click.option('--profile', is_flag=True, help='コマンドを cProfile で計測し .pstats/.collapsed を書き出す (serve ではツール呼び出しごと)')
+@click.option('--profile-dir', type=click.Path(file_okay=False), default=None,
+              help='プロファイルの出力先 (既定: ~/.chroma-memo/profiles)')
+@click.option('--profile-every', type=int, default=1, help='serve でN回に1回だけ計測する')
+@click.option('--profile-memory', is_flag=True, help='tracemalloc でメモリ確保の差分も記録する')
+@click.pass_context
+def main(ctx: click.Context, profile: bool, profile_dir: str, profile_every: int, profile_memory: bool):
     """Chroma-Memo: Project-specific knowledge base using ChromaDB and OpenAI embeddings"""
-    pass
+    if not (profile or profile_dir or profile_memory):
+        # 未指定なら CHROMA_MEMO_PROFILE などの環境変数に従う
+        return
+    
+    from .profiling import default_profile_dir, profiler
+    profiler.configure(profile_dir or default_profile_dir(), every=profile_every, memory=profile_memory)
+    if ctx.invoked_subcommand != 'serve':
+        # サブコマンドの実行全体を計測する（serve はツール呼び出しごとに計測）
+        ctx.with_resource(profiler.profile(f"cli.{ctx.invoked_subcommand}"))
 
 
 @main.command()
 @click.argument('project_name')
 @click.option('--with-claude-command', is_flag=True, help='Claude Code用のcommandsテンプレートをコピー')
-def init(project_name: str, with_claude_command: bool):
+@click.option('--engine', type=click.Choice(['exact', 'hnsw', 'auto']), default=None,
+              help='検索エンジン (未指定時は設定ファイルの search_engine)')
+@click.option('--shard-by', type=click.Choice(['month', 'size']), default=None,
+              help='大規模プロジェクト向けに、作成月ごと (month) または件数ごと (size) のシャードに分けて保存')
+@click.option('--shard-size', type=int, default=None, help='--shard-by size の1シャードあたりの件数 (既定: 50000)')
+def init(project_name: str, with_claude_command: bool, engine: str, shard_by: str, shard_size: int):
     """プロジェクト専用のDBを新規作成"""
     try:
-        if database.create_project(project_name):
+        if database.create_project(project_name, engine=engine, shard_by=shard_by, shard_size=shard_size):
             console.print(f"✅ プロジェクト '{project_name}' を作成しました。", style="green")
         else:
             console.print(f"⚠️  プロジェクト '{project_name}' は既に存在します。", style="yellow")
@@ -172,13 +259,19 @@ def init(project_name: str, with_claude_command: bool):
 @click.argument('project_name')
 @click.argument('message')
 @click.option('--tags', '-t', multiple=True, help='ナレッジにタグを追加')
-def add(project_name: str, message: str, tags: tuple):
+@click.option('--async/--sync', 'async_ingest', default=None,
+              help='キューに登録して即座に戻る (未指定時は設定ファイルの async_ingest)')
+def add(project_name: str, message: str, tags: tuple, async_ingest: bool):
     """ナレッジをDBに追加"""
     try:
-        tags_list = list(tags) if tags else None
-        entry_id = database.add_knowledge(project_name, message, tags_list)
+        # NOTE: このモジュールでは list がコマンド名で上書きされているため list() は使わない
+        tags_list = [*tags] if tags else None
+        entry_id = database.add_knowledge(project_name, message, tags_list, async_ingest=async_ingest)
         
-        console.print(f"✅ ナレッジを追加しました", style="green")
+        if database.config.async_ingest if async_ingest is None else async_ingest:
+            console.print("⏳ ナレッジをキューに登録しました (バックグラウンドでインデックス化されます)", style="green")
+        else:
+            console.print(f"✅ ナレッジを追加しました", style="green")
         console.print(f"ID: {entry_id}")
         if tags_list:
             console.print(f"タグ: {', '.join(tags_list)}")
@@ -187,14 +280,110 @@ def add(project_name: str, message: str, tags: tuple):
         raise click.ClickException(str(e))
 
 
+def _search_batch(project_name: str, queries_file, answers_file, max_results: int, since: str, until: str,
+                  fields: str, batch_size: int) -> None:
+    """search --queries-file: JSON Lines per query on stdout, recall@k summary on stderr"""
+    import json
+    from .batch_search import read_queries, read_answers, recall_at_k, summarize_recall
+    from .streaming import SEARCH_FIELDS, DEFAULT_BATCH_SEARCH_FIELDS, parse_fields, to_record
+    
+    if not 1 <= batch_size <= 2048:
+        # OpenAI の埋め込み API は1リクエスト 2048 件まで
+        raise click.BadParameter("1〜2048 の範囲で指定してください", param_hint="--batch-size")
+    hit_fields = parse_fields(fields, SEARCH_FIELDS, DEFAULT_BATCH_SEARCH_FIELDS)
+    queries = read_queries(queries_file)
+    answers = read_answers(answers_file, queries) if answers_file is not None else None
+    k = max_results or config_manager.load_config().max_results
+    
+    recalls: List[float] = []
+    errors = 0
+    with metrics.span("cli.search.batch", queries=len(queries), batch_size=batch_size):
+        for start in range(0, len(queries), batch_size):
+            # 1バッチにつき埋め込みリクエスト1回、検索1回
+            items = database.search_knowledge_batch(
+                project_name, queries[start:start + batch_size], k,
+                since=_parse_date_option(since) if since else None,
+                until=_parse_date_option(until, end=True) if until else None,
+                # 評価用の実行でアクセス統計（保持ポリシーの判断材料）を汚さない
+                record_access=answers is None
+            )
+            lines = []
+            for index, item in enumerate(items, start):
+                record = {
+                    "index": index,
+                    "query": item["query"],
+                    "results": [to_record(hit, hit_fields, SEARCH_FIELDS) for hit in item["results"]],
+                    "error": item["error"],
+                }
+                errors += item["error"] is not None
+                if answers is not None and index in answers:
+                    record["recall"] = recall_at_k([hit.entry.id for hit in item["results"]], answers[index])
+                    recalls.append(record["recall"])
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            try:
+                sys.stdout.write("".join(lines))
+                sys.stdout.flush()
+            except BrokenPipeError:
+                sys.stdout = open(os.devnull, "w")
+                return
+    
+    err_console.print(f"🔍 {len(queries)}件のクエリを検索しました (エラー: {errors}件)", style="blue")
+    if answers is not None:
+        summary = summarize_recall(recalls)
+        err_console.print(
+            f"📏 recall@{k}: {summary['recall']:.3f} / ヒット率: {summary['hit_rate']:.3f}"
+            f" (正解付きクエリ {summary['queries']}件)",
+            style="bold blue"
+        )
+
+
 @main.command()
 @click.argument('project_name')
-@click.argument('query')
-@click.option('--max-results', '-n', default=None, type=int, help='最大検索結果数')
-def search(project_name: str, query: str, max_results: int):
+@click.argument('query', required=False)
+@click.option('--max-results', '-n', '--limit', default=None, type=int, help='最大検索結果数')
+@click.option('--since', default=None, help='この日時以降に作成されたナレッジだけを検索 (YYYY-MM-DD)')
+@click.option('--until', default=None, help='この日付までに作成されたナレッジだけを検索 (YYYY-MM-DD)')
+@_format_options
+@click.option('--queries-file', type=click.File('r', encoding='utf-8'), default=None,
+              help='1行1クエリのファイル (- で標準入力) をまとめて検索し、JSON Lines で出力')
+@click.option('--answers', 'answers_file', type=click.File('r', encoding='utf-8'), default=None,
+              help='--queries-file の正解ファイル (JSON Lines)。recall@k (k = -n) を求める')
+@click.option('--batch-size', default=256, type=int, help='--queries-file で1回に埋め込み・検索するクエリ数')
+def search(project_name: str, query: str, max_results: int, since: str, until: str, output_format: str,
+           fields: str, queries_file, answers_file, batch_size: int):
     """クエリでDBを検索"""
+    messages = console if output_format == FORMAT_TABLE or queries_file is not None else err_console
     try:
-        results = database.search_knowledge(project_name, query, max_results)
+        if queries_file is not None:
+            if query is not None:
+                raise click.UsageError("QUERY と --queries-file は同時に指定できません")
+            if output_format not in (FORMAT_TABLE, FORMAT_JSONL):
+                raise click.UsageError("--queries-file の出力は JSON Lines のみです")
+            _search_batch(project_name, queries_file, answers_file, max_results, since, until, fields, batch_size)
+            return
+        if query is None:
+            raise click.UsageError("QUERY または --queries-file を指定してください")
+        if answers_file is not None:
+            raise click.UsageError("--answers は --queries-file と一緒に指定してください")
+        
+        if since or until:
+            results = database.search_knowledge(
+                project_name, query, max_results,
+                since=_parse_date_option(since) if since else None,
+                until=_parse_date_option(until, end=True) if until else None
+            )
+        else:
+            results = database.search_knowledge(project_name, query, max_results)
+        
+        pending = database.pending_entries(project_name)
+        if pending:
+            messages.print(f"⏳ インデックス待ちのナレッジが {len(pending)}件 あります (chroma-memo queue status)", style="yellow")
+        
+        if output_format != FORMAT_TABLE:
+            from .streaming import SEARCH_FIELDS, DEFAULT_SEARCH_FIELDS
+            with metrics.span("cli.search.stream", results=len(results)):
+                _stream_rows(output_format, fields, SEARCH_FIELDS, DEFAULT_SEARCH_FIELDS, [results])
+            return
         
         if not results:
             console.print("🔍 該当するナレッジが見つかりませんでした。", style="yellow")
@@ -203,28 +392,31 @@ def search(project_name: str, query: str, max_results: int):
         console.print(f"🔍 検索結果: {len(results)}件", style="blue")
         console.print()
         
-        for result in results:
-            # Create panel for each result
-            content_text = Text(result.entry.content)
-            similarity_text = Text(f"類似度: {result.similarity_score:.3f}", style="dim")
-            id_text = Text(f"ID: {result.entry.id}", style="dim")
-            created_text = Text(f"作成: {result.entry.created_at.strftime('%Y-%m-%d %H:%M')}", style="dim")
-            
-            header = f"#{result.rank}"
-            if result.entry.tags:
-                header += f" [タグ: {', '.join(result.entry.tags)}]"
-            
-            panel_content = f"{content_text}\n\n{similarity_text} | {id_text} | {created_text}"
-            
-            console.print(Panel(
-                panel_content,
-                title=header,
-                title_align="left",
-                border_style="blue" if result.similarity_score >= 0.9 else "green" if result.similarity_score >= 0.8 else "yellow"
-            ))
+        with metrics.span("cli.search.render", results=len(results)):
+            for result in results:
+                # Create panel for each result
+                content_text = Text(result.entry.content)
+                similarity_text = Text(f"類似度: {result.similarity_score:.3f}", style="dim")
+                id_text = Text(f"ID: {result.entry.id}", style="dim")
+                created_text = Text(f"作成: {result.entry.created_at.strftime('%Y-%m-%d %H:%M')}", style="dim")
+                
+                header = f"#{result.rank}"
+                if result.entry.tags:
+                    header += f" [タグ: {', '.join(result.entry.tags)}]"
+                
+                panel_content = f"{content_text}\n\n{similarity_text} | {id_text} | {created_text}"
+                
+                console.print(Panel(
+                    panel_content,
+                    title=header,
+                    title_align="left",
+                    border_style="blue" if result.similarity_score >= 0.9 else "green" if result.similarity_score >= 0.8 else "yellow"
+                ))
             
+    except click.UsageError:
+        raise
     except Exception as e:
-        console.print(f"❌ 検索エラー: {str(e)}", style="red")
+        messages.print(f"❌ 検索エラー: {str(e)}", style="red")
         raise click.ClickException(str(e))
 
 
@@ -294,16 +486,47 @@ def delete(project_name: str, entry_id: str, confirm: bool):
 @main.command()
 @click.argument('project_name')
 @click.option('--full-id', is_flag=True, help='完全なIDを表示')
-def list(project_name: str, full_id: bool):
+@click.option('--since', default=None, help='この日時以降に作成されたナレッジだけを表示 (YYYY-MM-DD)')
+@click.option('--until', default=None, help='この日付までに作成されたナレッジだけを表示 (YYYY-MM-DD)')
+@click.option('--limit', default=None, type=int, help='新しいものから最大この件数だけ表示')
+@_format_options
+def list(project_name: str, full_id: bool, since: str, until: str, limit: int, output_format: str, fields: str):
     """プロジェクトの全ナレッジを一覧表示"""
+    messages = console if output_format == FORMAT_TABLE else err_console
     try:
-        entries = database.list_knowledge(project_name)
+        if output_format != FORMAT_TABLE:
+            from .streaming import ENTRY_FIELDS, DEFAULT_LIST_FIELDS, parse_fields
+            # 本文 (と本文から求める文字数) を出さないなら、メタデータだけを読む
+            wanted = parse_fields(fields, ENTRY_FIELDS, DEFAULT_LIST_FIELDS)
+            pages = database.iter_knowledge(
+                project_name,
+                since=_parse_date_option(since) if since else None,
+                until=_parse_date_option(until, end=True) if until else None,
+                limit=limit,
+                include_content="content" in wanted or "content_length" in wanted
+            )
+            with metrics.span("cli.list.stream") as span:
+                span["results"] = _stream_rows(output_format, fields, ENTRY_FIELDS, DEFAULT_LIST_FIELDS, pages)
+            return
+        
+        if since or until:
+            entries = database.list_knowledge(
+                project_name,
+                since=_parse_date_option(since) if since else None,
+                until=_parse_date_option(until, end=True) if until else None
+            )
+        else:
+            entries = database.list_knowledge(project_name)
+        total = len(entries)
+        if limit is not None:
+            entries = entries[:max(0, limit)]
         
         if not entries:
             console.print(f"📝 プロジェクト '{project_name}' にナレッジがありません。", style="yellow")
             return
         
-        console.print(f"📝 プロジェクト '{project_name}' のナレッジ一覧: {len(entries)}件", style="blue")
+        shown = f" (新しい順に {len(entries)}件を表示)" if len(entries) < total else ""
+        console.print(f"📝 プロジェクト '{project_name}' のナレッジ一覧: {total}件{shown}", style="blue")
         console.print()
         
         table = Table(show_header=True, header_style="bold blue")
@@ -314,33 +537,51 @@ def list(project_name: str, full_id: bool):
         table.add_column("タグ", style="cyan")
         table.add_column("作成日時", style="dim")
         
-        for entry in entries:
-            content_preview = entry.content[:50] + "..." if len(entry.content) > 50 else entry.content
-            tags_str = ", ".join(entry.tags) if entry.tags else "-"
-            created_str = entry.created_at.strftime('%m-%d %H:%M')
-            
-            # Show full ID if requested, otherwise first 8 chars
-            id_display = entry.id if full_id else entry.id[:8]
+        with metrics.span("cli.list.render", results=len(entries)):
+            for entry in entries:
+                # blob に保存された本文を読まないよう、プレビューと文字数だけを使う
+                content_preview = entry.preview[:50] + "..." if entry.content_length > 50 else entry.preview
+                tags_str = ", ".join(entry.tags) if entry.tags else "-"
+                created_str = entry.created_at.strftime('%m-%d %H:%M')
+                
+                # Show full ID if requested, otherwise first 8 chars
+                id_display = entry.id if full_id else entry.id[:8]
+                
+                table.add_row(
+                    id_display,
+                    content_preview,
+                    tags_str,
+                    created_str
+                )
             
-            table.add_row(
-                id_display,
-                content_preview,
-                tags_str,
-                created_str
-            )
-        
-        console.print(table)
+            console.print(table)
         
     except Exception as e:
-        console.print(f"❌ 一覧取得エラー: {str(e)}", style="red")
+        messages.print(f"❌ 一覧取得エラー: {str(e)}", style="red")
         raise click.ClickException(str(e))
 
 
 @main.command()
-def projects():
+@click.option('--limit', default=None, type=int, help='最大この件数だけ表示')
+@_format_options
+def projects(limit: int, output_format: str, fields: str):
     """全プロジェクトの一覧表示"""
+    messages = console if output_format == FORMAT_TABLE else err_console
     try:
+        if output_format != FORMAT_TABLE:
+            from itertools import islice
+            from .streaming import PROJECT_FIELDS, DEFAULT_PROJECT_FIELDS
+            # 作成日順に並べ替えず、1件ずつ取得した順に出力する
+            projects_iter = database.iter_projects()
+            if limit is not None:
+                projects_iter = islice(projects_iter, max(0, limit))
+            _stream_rows(output_format, fields, PROJECT_FIELDS, DEFAULT_PROJECT_FIELDS,
+                         ([project] for project in projects_iter))
+            return
+        
         project_list = database.list_projects()
+        if limit is not None:
+            project_list = project_list[:max(0, limit)]
         
         if not project_list:
             console.print("📁 プロジェクトがありません。", style="yellow")
@@ -370,7 +611,7 @@ def projects():
         console.print(table)
         
     except Exception as e:
-        console.print(f"❌ プロジェクト一覧取得エラー: {str(e)}", style="red")
+        messages.print(f"❌ プロジェクト一覧取得エラー: {str(e)}", style="red")
         raise click.ClickException(str(e))
 
 
@@ -395,14 +636,719 @@ def info(project_name: str):
             info_table.add_row("最終更新", project_info.last_updated.strftime('%Y-%m-%d %H:%M:%S'))
         else:
             info_table.add_row("最終更新", "-")
+        info_table.add_row("埋め込みモデル", project_info.embedding_model or "- (記録なし: 現在の設定を使用)")
+        info_table.add_row("保持ポリシー", _format_policy(database.get_retention_policy(project_name)))
+        if project_info.shard_by:
+            info_table.add_row("シャーディング", f"{project_info.shard_by} ({project_info.shards}シャード)")
         
         console.print(Panel(info_table, title="プロジェクト詳細", border_style="blue"))
         
+        from .embeddings import embedding_service
+        if project_info.embedding_model and project_info.embedding_model != embedding_service.signature:
+            console.print(
+                f"ℹ️  現在の設定のモデルは {embedding_service.signature} です。"
+                f"このプロジェクトは {project_info.embedding_model} で検索・追加されます。"
+                f"移行するには: chroma-memo reembed {project_name}",
+                style="yellow"
+            )
+        
     except Exception as e:
         console.print(f"❌ プロジェクト情報取得エラー: {str(e)}", style="red")
         raise click.ClickException(str(e))
 
 
+@main.command()
+@click.argument('project_name')
+@click.argument('engine_name', required=False, type=click.Choice(['exact', 'hnsw', 'auto']))
+def engine(project_name: str, engine_name: str):
+    """プロジェクトの検索エンジンを表示・変更 (exact / hnsw / auto)"""
+    try:
+        if engine_name:
+            database.set_search_engine(project_name, engine_name)
+            console.print(f"✅ プロジェクト '{project_name}' の検索エンジンを '{engine_name}' に設定しました。", style="green")
+        
+        configured, effective = database.get_search_engine(project_name)
+        console.print(f"🔧 検索エンジン: {configured} (使用中: {effective})", style="blue")
+    except Exception as e:
+        console.print(f"❌ 検索エンジン設定エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.argument('project_name')
+@click.argument('mode', required=False, type=click.Choice(['none', 'int8', 'binary']))
+def quantize(project_name: str, mode: str):
+    """exactエンジンの量子化サイドカーを表示・変更 (none / int8 / binary)"""
+    try:
+        if mode:
+            database.set_quantization(project_name, mode)
+            console.print(f"✅ プロジェクト '{project_name}' の量子化を '{mode}' に設定しました。", style="green")
+        
+        console.print(f"🗜️  量子化: {database.get_quantization(project_name)}", style="blue")
+    except Exception as e:
+        console.print(f"❌ 量子化設定エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+def _format_policy(policy) -> str:
+    parts = []
+    if policy.max_age_days is not None:
+        parts.append(f"{policy.max_age_days:g}日間未使用で削除")
+    if policy.max_entries is not None:
+        parts.append(f"最大{policy.max_entries}件 (使われていない順に削除)")
+    if policy.min_hits is not None:
+        parts.append(f"作成から{policy.grace_days:g}日後にヒット{policy.min_hits}回未満なら削除")
+    return " / ".join(parts) if parts else "なし"
+
+
+@main.command()
+@click.argument('project_name')
+@click.option('--max-age-days', type=float, default=None, help='この日数のあいだ更新・参照されていないエントリを削除 (0: 解除)')
+@click.option('--max-entries', type=int, default=None, help='エントリ数の上限。超えた分を最終利用が古い順に削除 (0: 解除)')
+@click.option('--min-hits', type=int, default=None, help='検索・取得のヒット数がこれ未満のエントリを削除 (0: 解除)')
+@click.option('--grace-days', type=float, default=None, help='--min-hits を適用するまでの作成後の日数 (既定: 7)')
+@click.option('--clear', is_flag=True, help='保持ポリシーを削除')
+def retention(project_name: str, max_age_days: float, max_entries: int, min_hits: int, grace_days: float, clear: bool):
+    """プロジェクトの保持ポリシーを表示・変更 (prune で適用)"""
+    try:
+        from .models import RetentionPolicy
+        
+        changes = {
+            "max_age_days": max_age_days,
+            "max_entries": max_entries,
+            "min_hits": min_hits,
+        }
+        if clear or grace_days is not None or any(value is not None for value in changes.values()):
+            if clear:
+                policy = RetentionPolicy()
+            else:
+                policy = database.get_retention_policy(project_name)
+                for field, value in changes.items():
+                    if value is not None:
+                        # 0 はその制限の解除
+                        setattr(policy, field, value if value > 0 else None)
+                if grace_days is not None:
+                    policy.grace_days = grace_days
+            database.set_retention_policy(project_name, policy)
+            console.print(f"✅ プロジェクト '{project_name}' の保持ポリシーを更新しました。", style="green")
+        
+        policy = database.get_retention_policy(project_name)
+        console.print(f"🗄️  保持ポリシー: {_format_policy(policy)}", style="blue")
+    except Exception as e:
+        console.print(f"❌ 保持ポリシー設定エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.argument('project_name', required=False)
+@click.option('--dry-run', is_flag=True, help='削除対象を表示するだけで削除しない')
+@click.option('--yes', '-y', is_flag=True, help='確認を省略')
+@click.option('--limit', default=20, type=int, help='表示する削除対象の上限（プロジェクトごと）')
+def prune(project_name: str, dry_run: bool, yes: bool, limit: int):
+    """保持ポリシーに従って古い・使われていないナレッジを削除 (省略時: ポリシーのある全プロジェクト)"""
+    reasons = {"max_age": "期限切れ", "min_hits": "ヒット不足", "max_entries": "件数超過"}
+    try:
+        def plan():
+            if project_name:
+                return [database.prune_project(project_name, dry_run=True)]
+            return database.prune_projects(dry_run=True)
+        
+        results = plan()
+        if not results:
+            console.print("🗄️  保持ポリシーが設定されたプロジェクトがありません (chroma-memo retention <project> で設定)", style="yellow")
+            return
+        
+        total = 0
+        for result in results:
+            removed = result["removed"]
+            total += len(removed)
+            policy_text = _format_policy(database.get_retention_policy(result["project"]))
+            console.print(f"🗄️  {result['project']}: 削除対象 {len(removed)}件 / 残り {result['remaining']}件 (ポリシー: {policy_text})", style="blue")
+            if not removed:
+                continue
+            table = Table(show_header=True, header_style="bold blue")
+            table.add_column("ID", style="dim", width=8)
+            table.add_column("内容", min_width=30)
+            table.add_column("理由", style="yellow")
+            table.add_column("ヒット", justify="right")
+            table.add_column("最終利用", style="dim")
+            for item in removed[:limit]:
+                table.add_row(
+                    item["id"][:8],
+                    item["preview"][:50] + "..." if len(item["preview"]) > 50 else item["preview"],
+                    reasons.get(item["reason"], item["reason"]),
+                    str(item["hits"]),
+                    item["last_active"][:16].replace("T", " "),
+                )
+            console.print(table)
+            if len(removed) > limit:
+                console.print(f"... ほか {len(removed) - limit}件", style="dim")
+        
+        if dry_run or total == 0:
+            return
+        if not yes and not click.confirm(f"{total}件のナレッジを削除しますか？"):
+            console.print("削除をキャンセルしました。", style="yellow")
+            return
+        
+        if project_name:
+            results = [database.prune_project(project_name)]
+        else:
+            results = database.prune_projects()
+        deleted = sum(len(result["removed"]) for result in results)
+        console.print(f"✅ {deleted}件のナレッジを削除しました。", style="green")
+    except Exception as e:
+        console.print(f"❌ 削除エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.argument('project_name')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--glob', 'patterns', multiple=True, help='取り込むファイルのパターン (複数可、既定: *.md)')
+@click.option('--tags', '-t', multiple=True, help='取り込んだナレッジに付けるタグ')
+@click.option('--chunk-chars', default=1500, type=int, help='1エントリあたりの最大文字数')
+@click.option('--workers', default=4, type=int, help='ファイルを並列に読み込むスレッド数')
+@click.option('--batch-size', default=64, type=int, help='1回の埋め込みリクエストにまとめるチャンク数')
+@click.option('--dry-run', is_flag=True, help='変更内容を表示するだけで取り込まない')
+def ingest(project_name: str, directory: str, patterns: tuple, tags: tuple, chunk_chars: int,
+           workers: int, batch_size: int, dry_run: bool):
+    """ディレクトリのファイルを差分だけ取り込む（変更・追加分を埋め込み、削除分を消す）"""
+    from .config import config_manager
+    from .directory_ingest import DEFAULT_PATTERNS, DirectoryIngest
+    
+    try:
+        job = DirectoryIngest(
+            project_name, Path(directory), config_manager.get_db_path(),
+            patterns=[*patterns] or DEFAULT_PATTERNS, chunk_chars=chunk_chars,
+            tags=[*tags], workers=workers, batch_size=batch_size,
+        )
+        plan = job.plan()
+        added = sum(1 for item in plan["changed"] if item["path"] not in job.manifest["files"])
+        console.print(
+            f"📂 {plan['total']}ファイル: 追加 {added} / 変更 {len(plan['changed']) - added} / "
+            f"削除 {len(plan['removed'])} / 変更なし {plan['unchanged'] + len(plan['touched'])}",
+            style="blue"
+        )
+        for rel in plan["unreadable"]:
+            console.print(f"⚠️  読み込めないファイルをスキップしました (UTF-8 以外?): {rel}", style="yellow")
+        
+        if dry_run:
+            for item in plan["changed"]:
+                console.print(f"  + {item['path']} ({len(item['chunks'])}チャンク)")
+            for rel in plan["removed"]:
+                console.print(f"  - {rel}")
+            return
+        
+        if not plan["changed"] and not plan["removed"]:
+            # データベースも埋め込みAPIも使わない
+            if plan["touched"]:
+                job.save()
+            console.print("✅ 変更はありません。", style="green")
+            return
+        
+        summary = job.apply(
+            database, plan,
+            progress=lambda done, total: console.print(f"  埋め込み済み: {done}/{total}ファイル", style="dim"),
+        )
+        console.print(
+            f"✅ 取り込み完了: 追加 {summary['added']} / 更新 {summary['updated']} / 削除 {summary['removed']}ファイル"
+            f" (登録 {summary['chunks']}件, 削除 {summary['deleted_entries']}件)",
+            style="green"
+        )
+        if summary["failed"]:
+            console.print(f"⚠️  取り込めなかったファイル (次回再試行): {', '.join(summary['failed'])}", style="yellow")
+    except Exception as e:
+        console.print(f"❌ 取り込みエラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.argument('project_name')
+@click.option('--threshold', default=0.95, type=float, help='重複とみなすコサイン類似度 (0-1)')
+@click.option('--method', type=click.Choice(['auto', 'exact', 'lsh']), default='auto',
+              help='exact: 全組を行列積で比較 / lsh: 候補を絞って比較 (auto: 大規模なら lsh)')
+@click.option('--merge', is_flag=True, help='各クラスタを最新のエントリに統合する（タグは和集合）')
+@click.option('--yes', '-y', is_flag=True, help='統合の確認を省略')
+@click.option('--limit', default=50, type=int, help='表示するクラスタ数の上限')
+def dedupe(project_name: str, threshold: float, method: str, merge: bool, yes: bool, limit: int):
+    """重複に近いナレッジを検出し、必要なら統合"""
+    try:
+        clusters = database.find_duplicates(project_name, threshold, method)
+        if not clusters:
+            console.print(f"✨ 類似度 {threshold} 以上の重複は見つかりませんでした。", style="green")
+            return
+        
+        console.print(f"🧹 重複クラスタ: {len(clusters)}件 (類似度 >= {threshold})", style="bold blue")
+        for i, cluster in enumerate(clusters[:limit], 1):
+            table = Table(
+                show_header=True, header_style="bold blue",
+                title=f"#{i} {len(cluster['entries'])}件 / 類似度 {cluster['min_similarity']:.3f}-{cluster['max_similarity']:.3f}"
+            )
+            table.add_column("", width=2)
+            table.add_column("ID", style="cyan", width=8)
+            table.add_column("内容", style="white")
+            table.add_column("タグ", style="green")
+            table.add_column("作成日時", style="blue")
+            for j, entry in enumerate(cluster['entries']):
+                content = entry.content.replace("\n", " ")
+                table.add_row(
+                    "★" if j == 0 else "",
+                    entry.id[:8],
+                    content[:60] + "..." if len(content) > 60 else content,
+                    ", ".join(entry.tags) if entry.tags else "-",
+                    entry.created_at.strftime('%m-%d %H:%M'),
+                )
+            console.print(table)
+        if len(clusters) > limit:
+            console.print(f"... ほか {len(clusters) - limit} クラスタ", style="dim")
+        
+        if not merge:
+            console.print("★ は統合時に残るエントリです。統合するには --merge を指定してください。", style="blue")
+            return
+        
+        merged = 0
+        for i, cluster in enumerate(clusters[:limit], 1):
+            if not yes and not click.confirm(f"クラスタ #{i} を統合しますか？"):
+                continue
+            result = database.merge_duplicates(project_name, [entry.id for entry in cluster['entries']])
+            merged += len(result['deleted'])
+        console.print(f"✅ {merged}件のエントリを統合しました。", style="green")
+    except Exception as e:
+        console.print(f"❌ 重複検出エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.argument('project_name')
+@click.option('--provider', type=click.Choice(['openai', 'google', 'hash']), default=None,
+              help='移行先のプロバイダ (未指定時は USE_API)')
+@click.option('--model', default=None, help='移行先のモデル (未指定時は設定ファイルの embedding_model)')
+@click.option('--batch-size', default=64, type=int, help='1回の埋め込みリクエストの件数')
+@click.option('--workers', default=4, type=int, help='並列に実行する埋め込みリクエスト数')
+@click.option('--keep-old', is_flag=True, help='入れ替え前のコレクションを retired_* として残す')
+def reembed(project_name: str, provider: str, model: str, batch_size: int, workers: int, keep_old: bool):
+    """プロジェクトを新しい埋め込みモデルで埋め込み直す（中断しても再実行で再開）"""
+    from rich.progress import BarColumn, Progress, TextColumn, TimeRemainingColumn
+    from .embeddings import EmbeddingService
+    
+    try:
+        target = EmbeddingService(use_api=provider, model=model).signature if (provider or model) else None
+        # 進捗を表示するため、デーモンには転送せずプロセス内で実行する
+        db = _get_local_database()
+        with Progress(
+            TextColumn("[bold blue]{task.description}"), BarColumn(),
+            TextColumn("{task.completed}/{task.total}"), TimeRemainingColumn(),
+            console=console,
+        ) as progress:
+            task = progress.add_task(f"🔄 {project_name}", total=None)
+            summary = db.reembed_project(
+                project_name, target, batch_size=batch_size, workers=workers, keep_old=keep_old,
+                progress=lambda done, total: progress.update(task, completed=done, total=total),
+            )
+        
+        console.print(f"✅ プロジェクト '{project_name}' を {summary['to']} で埋め込み直しました。", style="green")
+        console.print(
+            f"移行元: {summary['from'] or '記録なし'} / 件数: {summary['entries']}"
+            f" (再開時に処理済み: {summary['resumed']}, 移行中の追加: {summary['caught_up']}, 削除: {summary['removed']})"
+            f" / {summary['seconds']}秒"
+        )
+        if summary['retired_collection']:
+            console.print(f"📦 以前のコレクション: {summary['retired_collection']}", style="blue")
+    except Exception as e:
+        console.print(f"❌ 再埋め込みエラー: {str(e)}", style="red")
+        console.print("中断した場合は同じコマンドを再実行すると続きから再開します。", style="blue")
+        raise click.ClickException(str(e))
+
+
+@main.command(name='quantize-report')
+@click.argument('project_name')
+@click.option('-k', 'k', default=10, type=int, help='recall@k の k')
+@click.option('--samples', default=100, type=int, help='クエリとして使うエントリ数')
+@click.option('--mode', 'modes', multiple=True, type=click.Choice(['int8', 'binary']),
+              help='比較する量子化方式 (未指定時は両方)')
+def quantize_report(project_name: str, k: int, samples: int, modes: tuple):
+    """量子化検索と完全精度検索の recall@k を比較"""
+    try:
+        report = database.quantization_report(project_name, [*modes] or ['int8', 'binary'], k=k, samples=samples)
+        
+        if not report:
+            console.print(f"📝 プロジェクト '{project_name}' にナレッジがありません。", style="yellow")
+            return
+        
+        table = Table(show_header=True, header_style="bold blue")
+        table.add_column("方式")
+        table.add_column(f"recall@{report[0]['k']} (第一段)", justify="right")
+        table.add_column(f"recall@{report[0]['k']} (再スコア後)", justify="right")
+        table.add_column("平均レイテンシ", justify="right")
+        table.add_column("インデックスサイズ", justify="right")
+        
+        for row in report:
+            table.add_row(
+                row['mode'],
+                f"{row['first_stage_recall']:.3f}",
+                f"{row['recall']:.3f}",
+                f"{row['mean_latency_ms']:.2f} ms",
+                f"{row['index_bytes'] / 1024:.1f} KiB"
+            )
+        
+        console.print(f"📏 量子化 recall レポート: {project_name} (クエリ {report[0]['queries']}件)", style="bold blue")
+        console.print(table)
+    except Exception as e:
+        console.print(f"❌ 量子化レポートエラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.argument('backend_name', required=False, type=click.Choice(['chroma', 'sqlite']))
+@click.option('--no-copy', is_flag=True, help='データをコピーせずに設定だけ切り替える')
+def backend(backend_name: str, no_copy: bool):
+    """ストレージバックエンドの表示・切り替え（切り替え時は全プロジェクトをコピー）"""
+    from rich.progress import BarColumn, Progress, TextColumn
+    from .backends import backend_name as resolve_backend, copy_store, open_store
+    from .locking import FileLock
+    
+    try:
+        current_config = config_manager.load_config()
+        current = resolve_backend(current_config.storage_backend)
+        if backend_name is None:
+            console.print(f"🗄️  ストレージバックエンド: {current}", style="blue")
+            if os.getenv("CHROMA_MEMO_BACKEND"):
+                console.print(f"(環境変数 CHROMA_MEMO_BACKEND で指定。設定ファイルの値: {current_config.storage_backend})")
+            return
+        if backend_name == current:
+            console.print(f"ℹ️  既に {current} を使用しています。", style="blue")
+            return
+        
+        copied = {}
+        if not no_copy:
+            db_path = config_manager.get_db_path()
+            # コピー中に書き込まれた分を取りこぼさないよう、書き込みロックを保持する
+            with FileLock(db_path / ".write.lock", timeout=current_config.lock_timeout):
+                source = open_store(current, db_path)
+                target = open_store(backend_name, db_path)
+                with Progress(
+                    TextColumn("[bold blue]{task.description}"), BarColumn(),
+                    TextColumn("{task.completed}/{task.total}"), console=console,
+                ) as progress:
+                    task = progress.add_task(f"📦 {current} → {backend_name}", total=None)
+                    copied = copy_store(
+                        source, target,
+                        progress=lambda name, done, total: progress.update(
+                            task, description=f"📦 {name}", completed=done, total=total
+                        ),
+                    )
+        
+        config_manager.update_config(storage_backend=backend_name)
+        console.print(
+            f"✅ ストレージバックエンドを {current} から {backend_name} に切り替えました。"
+            f" (コレクション: {len(copied)} / エントリ: {sum(copied.values())}件)",
+            style="green"
+        )
+        console.print(f"移行元のデータは {current} に残っています。常駐デーモンや MCP サーバーは再起動してください。", style="blue")
+        if os.getenv("CHROMA_MEMO_BACKEND"):
+            console.print("⚠️  環境変数 CHROMA_MEMO_BACKEND が設定されているため、そちらが優先されます。", style="yellow")
+    except Exception as e:
+        console.print(f"❌ バックエンド切り替えエラー: {str(e)}", style="red")
+        console.print("中断した場合は同じコマンドを再実行するとコピーをやり直します。", style="blue")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.option('--pack', 'pack', is_flag=True, help='しきい値を超える既存の本文を blob ストアへ移す')
+@click.option('--project', 'project_name', default=None, help='--pack の対象プロジェクト（省略時は全プロジェクト）')
+@click.option('--gc', 'gc', is_flag=True, help='どのエントリからも参照されていない blob を削除')
+@click.option('--dry-run', is_flag=True, help='--gc で削除せずに対象を表示')
+def blobs(pack: bool, project_name: str, gc: bool, dry_run: bool):
+    """大きな本文の圧縮 blob ストアの状態表示・移行・掃除"""
+    try:
+        # ファイルを直接扱うので、デーモンには転送せずプロセス内で実行する
+        db = _get_local_database()
+        if pack:
+            packed = db.pack_blobs(project_name)
+            console.print(
+                f"✅ {sum(packed.values())}件の本文を blob ストアへ移しました。"
+                f" ({', '.join(f'{name}: {count}' for name, count in packed.items()) or '-'})",
+                style="green"
+            )
+        if gc:
+            removed = db.collect_blob_garbage(dry_run=dry_run)
+            verb = "削除対象" if dry_run else "削除しました"
+            console.print(
+                f"🧹 未参照の blob: {removed['removed']}件 ({removed['bytes'] / 1024:.1f} KiB) {verb}",
+                style="yellow" if dry_run else "green"
+            )
+        
+        info = db.blob_stats()
+        threshold = f"{info['threshold']}文字" if info['threshold'] > 0 else "無効 (blob_threshold_chars: 0)"
+        console.print(
+            f"🗜️  blob ストア: {info['blobs']}件 / {info['bytes'] / 1024:.1f} KiB"
+            f" (圧縮: {info['codec']}, しきい値: {threshold})",
+            style="blue"
+        )
+    except Exception as e:
+        console.print(f"❌ blob ストアエラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.group()
+def shard():
+    """大規模プロジェクトのシャード管理"""
+    pass
+
+
+@shard.command(name='enable')
+@click.argument('project_name')
+@click.option('--by', 'shard_by', type=click.Choice(['month', 'size']), required=True,
+              help='month: 作成月ごと / size: 件数の上限ごと')
+@click.option('--size', 'shard_size', type=int, default=None, help='--by size の1シャードあたりの件数 (既定: 50000)')
+@click.option('--batch-size', default=1000, type=int, help='1回の書き込みで移すエントリ数')
+def shard_enable(project_name: str, shard_by: str, shard_size: int, batch_size: int):
+    """既存のプロジェクトをシャードに分割（埋め込みは再計算しない、中断しても再実行で再開）"""
+    from rich.progress import BarColumn, Progress, TextColumn, TimeRemainingColumn
+    
+    try:
+        # 進捗を表示するため、デーモンには転送せずプロセス内で実行する
+        db = _get_local_database()
+        with Progress(
+            TextColumn("[bold blue]{task.description}"), BarColumn(),
+            TextColumn("{task.completed}/{task.total}"), TimeRemainingColumn(),
+            console=console,
+        ) as progress:
+            task = progress.add_task(f"🧩 {project_name}", total=None)
+            summary = db.shard_project(
+                project_name, shard_by, shard_size=shard_size, batch_size=batch_size,
+                progress=lambda done, total: progress.update(task, completed=done, total=total),
+            )
+        console.print(
+            f"✅ プロジェクト '{project_name}' を {shard_by} でシャーディングしました。"
+            f" (移動: {summary['moved']}件 / シャード: {summary['shards']})",
+            style="green"
+        )
+    except Exception as e:
+        console.print(f"❌ シャーディングエラー: {str(e)}", style="red")
+        console.print("中断した場合は同じコマンドを再実行すると続きから再開します。", style="blue")
+        raise click.ClickException(str(e))
+
+
+@shard.command(name='list')
+@click.argument('project_name')
+def shard_list(project_name: str):
+    """シャードごとの件数・作成日時の範囲・アーカイブ状態を表示"""
+    try:
+        shards = database.list_shards(project_name)
+        if not shards:
+            console.print(f"🧩 プロジェクト '{project_name}' はシャーディングされていません (chroma-memo shard enable)", style="yellow")
+            return
+        
+        table = Table(show_header=True, header_style="bold blue")
+        table.add_column("キー", style="bold")
+        table.add_column("エントリ数", justify="right")
+        table.add_column("作成日時の範囲", style="dim")
+        table.add_column("状態")
+        for item in shards:
+            span = f"{(item['created_from'] or '?')[:10]} - {(item['created_to'] or '?')[:10]}" if item['key'] else "-"
+            state = "アーカイブ" if item['archived'] else "未移行" if item['key'] is None else "有効"
+            table.add_row(item['key'] or "(project)", str(item['entries']), span, state)
+        console.print(table)
+    except Exception as e:
+        console.print(f"❌ シャード一覧取得エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+def _select_shards(project_name: str, keys: tuple, before: str) -> List[str]:
+    if keys:
+        return [*keys]
+    if not before:
+        raise click.UsageError("シャードのキーか --before を指定してください")
+    cutoff = _parse_date_option(before if len(before) > 7 else f"{before}-01")
+    return [item['key'] for item in database.list_shards(project_name)
+            if item['key'] and item['created_to'] and item['created_to'] <= cutoff]
+
+
+@shard.command(name='archive')
+@click.argument('project_name')
+@click.argument('keys', nargs=-1)
+@click.option('--before', default=None, help='この日付 (YYYY-MM または YYYY-MM-DD) より前のシャードをまとめて指定')
+def shard_archive(project_name: str, keys: tuple, before: str):
+    """シャードを検索・一覧・重複検出・保持ポリシーの対象から外す（データは残る）"""
+    try:
+        changed = database.set_shard_archived(project_name, _select_shards(project_name, keys, before), True)
+        console.print(f"✅ {len(changed)}件のシャードをアーカイブしました。{' '.join(changed)}", style="green")
+    except click.UsageError:
+        raise
+    except Exception as e:
+        console.print(f"❌ アーカイブエラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@shard.command(name='unarchive')
+@click.argument('project_name')
+@click.argument('keys', nargs=-1, required=True)
+def shard_unarchive(project_name: str, keys: tuple):
+    """アーカイブしたシャードを再び検索対象に戻す"""
+    try:
+        changed = database.set_shard_archived(project_name, [*keys], False)
+        console.print(f"✅ {len(changed)}件のシャードを戻しました。{' '.join(changed)}", style="green")
+    except Exception as e:
+        console.print(f"❌ アーカイブ解除エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@shard.command(name='compact')
+@click.argument('project_name')
+@click.argument('keys', nargs=-1)
+@click.option('--before', default=None, help='この日付 (YYYY-MM または YYYY-MM-DD) より前のシャードをまとめて指定')
+def shard_compact(project_name: str, keys: tuple, before: str):
+    """シャードを作り直して削除済みエントリの領域とインデックスを詰める"""
+    try:
+        selected = _select_shards(project_name, keys, before)
+        db = _get_local_database()
+        for key in selected:
+            result = db.compact_shard(project_name, key)
+            console.print(f"🗜️  {key}: {result['entries']}件", style="blue")
+        console.print(f"✅ {len(selected)}件のシャードを最適化しました。", style="green")
+    except click.UsageError:
+        raise
+    except Exception as e:
+        console.print(f"❌ 最適化エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.group()
+def queue():
+    """非同期取り込みキューの管理"""
+    pass
+
+
+@queue.command(name='status')
+def queue_status():
+    """キューの状態をプロジェクトごとに表示"""
+    try:
+        summary = database.ingest_queue_status()
+        
+        if not summary:
+            console.print("📭 インデックス待ちのナレッジはありません。", style="green")
+            return
+        
+        table = Table(show_header=True, header_style="bold blue")
+        table.add_column("プロジェクト名", style="bold")
+        table.add_column("待機中", justify="right")
+        table.add_column("処理中", justify="right")
+        table.add_column("失敗", justify="right", style="red")
+        table.add_column("最古のエントリ", style="dim")
+        table.add_column("最後のエラー", style="dim")
+        
+        for item in summary:
+            table.add_row(
+                item['project'],
+                str(item['pending']),
+                str(item['processing']),
+                str(item['failed']),
+                item['oldest'][:16].replace('T', ' '),
+                " ".join((item['last_error'] or "-").split())[:60]
+            )
+        
+        console.print("📬 取り込みキュー", style="blue")
+        console.print(table)
+    except Exception as e:
+        console.print(f"❌ キュー状態取得エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@queue.command(name='drain')
+@click.option('--quiet', '-q', is_flag=True, help='結果を表示しない')
+def queue_drain(quiet: bool):
+    """キューのナレッジを今すぐ埋め込み・インデックス化"""
+    try:
+        indexed = database.drain_ingest_queue()
+        if not quiet:
+            console.print(f"✅ {indexed}件のナレッジをインデックス化しました。", style="green")
+    except Exception as e:
+        if not quiet:
+            console.print(f"❌ キュー処理エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@queue.command(name='retry')
+@click.argument('project_name', required=False)
+def queue_retry(project_name: str):
+    """再試行回数を使い切ったナレッジを再度キューに戻す"""
+    try:
+        count = database.retry_failed_ingest(project_name)
+        console.print(f"🔁 {count}件のナレッジを再試行します。", style="green")
+    except Exception as e:
+        console.print(f"❌ 再試行エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.group()
+def daemon():
+    """CLIを高速化する常駐デーモンの管理"""
+    pass
+
+
+@daemon.command(name='run')
+@click.option('--idle-timeout', type=float, default=None, help='リクエストがない場合に終了するまでの秒数 (0: 終了しない)')
+def daemon_run(idle_timeout: float):
+    """デーモンをフォアグラウンドで起動"""
+    from .daemon import daemon_supported, run_daemon
+    
+    if not daemon_supported():
+        raise click.ClickException("この環境ではUnixドメインソケットが使えないため、デーモンを起動できません")
+    try:
+        run_daemon(idle_timeout)
+    except KeyboardInterrupt:
+        console.print("\n🛑 デーモンを停止しました。", style="yellow")
+    except Exception as e:
+        console.print(f"❌ デーモン起動エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@daemon.command(name='start')
+def daemon_start():
+    """デーモンをバックグラウンドで起動"""
+    from .daemon import daemon_supported, ensure_daemon
+    
+    if not daemon_supported():
+        raise click.ClickException("この環境ではUnixドメインソケットが使えないため、デーモンを起動できません")
+    client = ensure_daemon()
+    if client is None:
+        raise click.ClickException("デーモンを起動できませんでした")
+    console.print(f"🔥 デーモンが起動しています (PID: {client.ping()['pid']})", style="green")
+
+
+@daemon.command(name='stop')
+def daemon_stop():
+    """デーモンを停止"""
+    from .daemon import DaemonUnavailable, ensure_daemon
+    
+    client = ensure_daemon(autostart=False)
+    if client is None:
+        console.print("⚠️  デーモンは起動していません。", style="yellow")
+        return
+    try:
+        client.shutdown()
+    except (DaemonUnavailable, RuntimeError):
+        pass
+    console.print("🛑 デーモンを停止しました。", style="green")
+
+
+@daemon.command(name='status')
+def daemon_status():
+    """デーモンの状態を表示"""
+    from .daemon import daemon_enabled, ensure_daemon, get_socket_path
+    
+    client = ensure_daemon(autostart=False)
+    enabled = "有効" if daemon_enabled() else "無効 (use_daemon: true または CHROMA_MEMO_DAEMON=1 で有効化)"
+    console.print(f"⚙️  CLIからの自動利用: {enabled}")
+    if client is None:
+        console.print("💤 デーモンは起動していません。", style="yellow")
+        return
+    info = client.ping()
+    console.print(f"🔥 デーモン稼働中 (PID: {info['pid']}, 稼働時間: {info['uptime']:.0f}秒, 処理件数: {info['requests']})", style="green")
+    console.print(f"ソケット: {get_socket_path()}", style="dim")
+
+
 @main.command()
 @click.option('--set-api-key', type=click.Choice(['openai', 'google']), help='APIキーを設定')
 @click.option('--show-env-path', is_flag=True, help='.envファイルのパスを表示')
@@ -506,6 +1452,9 @@ def config(set_api_key: str, show_env_path: bool, show_db_path: bool, show_all_p
         config_table.add_row("DB パス", current_config.db_path)
         config_table.add_row("最大検索結果数", str(current_config.max_results))
         config_table.add_row("類似度閾値", str(current_config.similarity_threshold))
+        config_table.add_row("検索エンジン", f"{current_config.search_engine} (exact上限: {current_config.exact_engine_max_entries}件)")
+        config_table.add_row("量子化", current_config.quantization)
+        config_table.add_row("ストレージ", current_config.storage_backend)
         
         console.print(Panel(config_table, title="設定情報", border_style="blue"))
         
@@ -514,10 +1463,169 @@ def config(set_api_key: str, show_env_path: bool, show_db_path: bool, show_all_p
         raise click.ClickException(str(e))
 
 
+@main.command()
+@click.option('--prometheus', is_flag=True, help='Prometheus テキスト形式で出力')
+@click.option('--since', type=float, default=None, help='直近N分の記録だけを集計')
+@click.option('--reset', is_flag=True, help='計測ログを削除')
+def stats(prometheus: bool, since: float, reset: bool):
+    """処理ごとの所要時間 (p50/p95/p99) を計測ログから集計"""
+    import time
+    from .metrics import default_log_path, load_log
+    
+    try:
+        env_path = os.getenv("CHROMA_MEMO_METRICS_LOG")
+        log_path = Path(env_path).expanduser() if env_path else default_log_path()
+        
+        if reset:
+            for path in (log_path, log_path.with_name(log_path.name + ".1")):
+                if path.exists():
+                    path.unlink()
+            console.print(f"🗑️  計測ログを削除しました: {log_path}", style="green")
+            return
+        
+        if not log_path.exists():
+            console.print(f"📊 計測ログがありません: {log_path}", style="yellow")
+            console.print("記録するには config.yaml で metrics_log: true を設定するか、CHROMA_MEMO_METRICS_LOG=<path> を指定してください。", style="blue")
+            return
+        
+        registry = load_log(log_path, since=time.time() - since * 60 if since else None)
+        
+        if prometheus:
+            click.echo(registry.prometheus(), nl=False)
+            return
+        
+        snapshot = registry.snapshot()
+        table = Table(show_header=True, header_style="bold blue", title=f"所要時間 (ms) - {log_path}")
+        table.add_column("操作", style="cyan")
+        table.add_column("回数", justify="right")
+        table.add_column("p50", justify="right")
+        table.add_column("p95", justify="right")
+        table.add_column("p99", justify="right")
+        table.add_column("最大", justify="right")
+        for name, op_stats in sorted(snapshot["operations"].items()):
+            table.add_row(
+                name,
+                str(op_stats["count"]),
+                f"{op_stats['p50'] * 1000:.1f}",
+                f"{op_stats['p95'] * 1000:.1f}",
+                f"{op_stats['p99'] * 1000:.1f}",
+                f"{op_stats['max'] * 1000:.1f}",
+            )
+        console.print(table)
+        
+        if snapshot["counters"]:
+            counters = Table(show_header=True, header_style="bold blue", title="カウンター")
+            counters.add_column("項目", style="cyan")
+            counters.add_column("合計", justify="right")
+            for name, value in sorted(snapshot["counters"].items()):
+                counters.add_row(name, f"{value:g}")
+            console.print(counters)
+        
+    except Exception as e:
+        console.print(f"❌ 集計エラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
+@main.command()
+@click.option('--sizes', default='1000,10000', help='コーパスの件数（カンマ区切り、例: 1000,10000,100000）')
+@click.option('--queries', 'query_count', default=100, type=int, help='検索レイテンシの計測に使うクエリ数')
+@click.option('--batch-size', default=256, type=int, help='追加時の1バッチあたりの件数')
+@click.option('--engine', type=click.Choice(['exact', 'hnsw', 'auto']), default=None, help='検索エンジンを固定する')
+@click.option('--seed', default=0, type=int, help='合成コーパスの乱数シード')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='結果のJSONを書き出すファイル')
+@click.option('--compare', 'baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='比較する以前の結果JSON')
+@click.option('--keep', is_flag=True, help='計測用データベースを削除せずに残す')
+def bench(sizes: str, query_count: int, batch_size: int, engine: str, seed: int, output: str,
+          baseline: str, keep: bool):
+    """合成コーパスで追加・検索・一覧などの性能を計測（利用者のデータベースには触れない）"""
+    import json
+    from .bench import compare_results, run_benchmark
+    
+    try:
+        size_list = [int(size) for size in sizes.split(',') if size.strip()]
+        if not size_list or min(size_list) <= 0:
+            raise ValueError("--sizes には正の整数をカンマ区切りで指定してください")
+        
+        report = run_benchmark(
+            size_list, query_count=query_count, batch_size=batch_size, engine=engine, seed=seed,
+            keep=keep, progress=lambda message: console.print(message, style="blue"),
+        )
+        
+        table = Table(show_header=True, header_style="bold blue", title="ベンチマーク結果 (ms)")
+        table.add_column("件数", justify="right", style="cyan")
+        table.add_column("エンジン")
+        table.add_column("追加 件/秒", justify="right")
+        table.add_column("検索 p50", justify="right")
+        table.add_column("検索 p95", justify="right")
+        table.add_column("バッチ検索 p50", justify="right")
+        table.add_column("一覧 p50", justify="right")
+        table.add_column("情報 p50", justify="right")
+        table.add_column("部分ID p50", justify="right")
+        table.add_column("ピークRSS MB", justify="right")
+        table.add_column("ディスク MB", justify="right")
+        for result in report["results"]:
+            table.add_row(
+                str(result["size"]),
+                result["engine"],
+                f"{result['add']['entries_per_sec'] or 0:.0f}",
+                f"{result['search_ms']['p50']:.1f}",
+                f"{result['search_ms']['p95']:.1f}",
+                f"{result['search_batch_ms']['p50']:.1f}",
+                f"{result['list_ms']['p50']:.1f}",
+                f"{result['info_ms']['p50']:.1f}",
+                f"{result['get_partial_id_ms']['p50']:.1f}",
+                str(result["peak_rss_mb"] if result["peak_rss_mb"] is not None else "-"),
+                f"{result['disk_bytes'] / (1024 * 1024):.1f}",
+            )
+        console.print(table)
+        
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            console.print(f"💾 結果を保存しました: {output}", style="green")
+        if keep:
+            console.print(f"📂 計測用データベース: {report['workdir']}", style="blue")
+        
+        if baseline:
+            with open(baseline, 'r', encoding='utf-8') as f:
+                rows = compare_results(json.load(f), report)
+            if not rows:
+                console.print("⚠️  比較できる件数の結果がありません", style="yellow")
+                return
+            diff = Table(show_header=True, header_style="bold blue", title=f"比較: {baseline}")
+            diff.add_column("件数", justify="right", style="cyan")
+            diff.add_column("指標")
+            diff.add_column("以前", justify="right")
+            diff.add_column("今回", justify="right")
+            diff.add_column("改善率", justify="right")
+            for row in rows:
+                change = row["improvement_pct"]
+                style = "green" if change is not None and change > 10 else "red" if change is not None and change < -10 else None
+                diff.add_row(
+                    str(row["size"]), row["metric"],
+                    *(f"{value:,}" if isinstance(value, int) else f"{value:,.3f}" for value in (row["old"], row["new"])),
+                    f"{change:+.1f}%" if change is not None else "-", style=style,
+                )
+            console.print(diff)
+        
+    except Exception as e:
+        console.print(f"❌ ベンチマークエラー: {str(e)}", style="red")
+        raise click.ClickException(str(e))
+
+
 @main.command()
 @click.argument('project_name', required=False)
 @click.option('--auto-init', is_flag=True, default=True, help='プロジェクトが存在しない場合、自動で初期化する')
-def serve(project_name: str, auto_init: bool):
+@click.option('--transport', type=click.Choice(['stdio', 'http', 'sse']), default='stdio',
+              help='通信方式 (http/sse: 複数クライアントで1つのサーバーを共有)')
+@click.option('--host', default='127.0.0.1', help='http/sse の待ち受けアドレス')
+@click.option('--port', default=8765, type=int, help='http/sse の待ち受けポート')
+@click.option('--max-connections', default=32, type=int, help='http/sse の同時接続数の上限')
+@click.option('--warmup/--no-warmup', default=None,
+              help='起動時にコレクションの読み込みと埋め込みAPIへの接続を済ませる (既定: warmup 設定)')
+def serve(project_name: str, auto_init: bool, transport: str, host: str, port: int, max_connections: int,
+          warmup: bool):
     """MCPサーバーを起動してClaude Code/Cursorからアクセス可能にする"""
     try:
         # Import here to avoid circular imports and handle missing mcp gracefully
@@ -547,7 +1655,8 @@ def serve(project_name: str, auto_init: bool):
             console.print("🚀 MCPサーバーを起動しています (全プロジェクト対応)...", style="blue")
             
         # Start MCP server
-        start_mcp_server(project_name, auto_init)
+        start_mcp_server(project_name, auto_init, transport=transport, host=host, port=port,
+                         max_connections=max_connections, warmup=warmup)
         
     except KeyboardInterrupt:
         console.print("\n🛑 MCPサーバーを停止しました。", style="yellow")
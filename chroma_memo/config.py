@@ -2,12 +2,12 @@
 Configuration management for Chroma-Memo
 """
 import os
-import yaml
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 from dotenv import load_dotenv
 
-from .models import AppConfig
+if TYPE_CHECKING:
+    from .models import AppConfig
 
 
 class ConfigManager:
@@ -29,10 +29,14 @@ class ConfigManager:
         # Also load from current directory .env file if exists
         load_dotenv()
         
-    def load_config(self) -> AppConfig:
+    def load_config(self) -> "AppConfig":
         """Load configuration from file"""
         if self._config is not None:
             return self._config
+        
+        # pydantic / yaml は設定を読むときまで import しない（CLI起動の高速化）
+        import yaml
+        from .models import AppConfig
             
         if self.config_path.exists():
             with open(self.config_path, 'r', encoding='utf-8') as f:
@@ -57,8 +61,10 @@ class ConfigManager:
         self._config = AppConfig(**config_dict)
         return self._config
     
-    def save_config(self, config: Optional[AppConfig] = None) -> None:
+    def save_config(self, config: Optional["AppConfig"] = None) -> None:
         """Save configuration to file"""
+        import yaml
+        
         if config is None:
             config = self.load_config()
             
@@ -72,6 +78,36 @@ class ConfigManager:
             'max_results': config.max_results,
             'similarity_threshold': config.similarity_threshold,
             'export_formats': config.export_formats,
+            'search_engine': config.search_engine,
+            'exact_engine_max_entries': config.exact_engine_max_entries,
+            'quantization': config.quantization,
+            'quantization_rerank_factor': config.quantization_rerank_factor,
+            'async_ingest': config.async_ingest,
+            'ingest_batch_size': config.ingest_batch_size,
+            'ingest_max_retries': config.ingest_max_retries,
+            'lock_timeout': config.lock_timeout,
+            'use_daemon': config.use_daemon,
+            'daemon_idle_timeout': config.daemon_idle_timeout,
+            'mcp_max_workers': config.mcp_max_workers,
+            'mcp_tool_timeout': config.mcp_tool_timeout,
+            'mcp_max_chars': config.mcp_max_chars,
+            'write_coalesce_window': config.write_coalesce_window,
+            'write_coalesce_max_batch': config.write_coalesce_max_batch,
+            'metrics_log': config.metrics_log,
+            'access_tracking': config.access_tracking,
+            'access_flush_interval': config.access_flush_interval,
+            'auto_prune_interval': config.auto_prune_interval,
+            'shard_query_workers': config.shard_query_workers,
+            'storage_backend': config.storage_backend,
+            'blob_threshold_chars': config.blob_threshold_chars,
+            'blob_preview_chars': config.blob_preview_chars,
+            'blob_compression': config.blob_compression,
+            'embedding_timeout': config.embedding_timeout,
+            'embedding_max_retries': config.embedding_max_retries,
+            'embedding_pool_connections': config.embedding_pool_connections,
+            'embedding_keepalive': config.embedding_keepalive,
+            'warmup': config.warmup,
+            'warmup_replay_queries': config.warmup_replay_queries,
         }
         
         with open(self.config_path, 'w', encoding='utf-8') as f:
@@ -155,5 +191,20 @@ class ConfigManager:
         return self.env_path
 
 
-# Global config manager instance
-config_manager = ConfigManager() 
\ No newline at end of file
+# Global config manager instance (遅延初期化)
+_config_manager_instance = None
+
+def get_config_manager() -> ConfigManager:
+    """設定マネージャーを取得（遅延初期化）"""
+    global _config_manager_instance
+    if _config_manager_instance is None:
+        _config_manager_instance = ConfigManager()
+    return _config_manager_instance
+
+# Proxyクラスでconfig_managerオブジェクトをエミュレート
+class ConfigManagerProxy:
+    def __getattr__(self, name):
+        return getattr(get_config_manager(), name)
+
+config_manager = ConfigManagerProxy()
+ 
\ No newline at end of file
@@ -0,0 +1,504 @@
+"""
+Warm background daemon for the Chroma-Memo CLI
+
+ChromaMemoDatabase と EmbeddingService を常駐プロセスで保持し、CLI からの
+リクエストを Unix ドメインソケット経由で処理する。CLI は最初の利用時に
+デーモンを自動起動し、利用できない場合はプロセス内で実行する。
+
+Protocol: one JSON object per line in each direction.
+  request:  {"op": "<method>", "args": [...], "kwargs": {...}}
+  response: {"ok": true, "result": ...} or {"ok": false, "type": "...", "error": "..."}
+
+Generator methods (STREAMED_METHODS) are served page by page through a
+cursor kept in the daemon:
+  {"op": "__open__", "method": "<method>", "args": [...], "kwargs": {...}}
+  {"op": "__next__", "cursor": "<id>"}  -> {"ok": true, "result": {"page": ..., "done": false}}
+  {"op": "__close__", "cursor": "<id>"}
+"""
+import itertools
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .config import config_manager
+
+
+# デーモンに転送する ChromaMemoDatabase のメソッド
+FORWARDED_METHODS = frozenset({
+    "create_project",
+    "project_exists",
+    "add_knowledge",
+    "add_knowledge_batch",
+    "search_knowledge",
+    "search_knowledge_batch",
+    "get_knowledge_by_id",
+    "delete_knowledge",
+    "delete_knowledge_batch",
+    "find_duplicates",
+    "merge_duplicates",
+    "list_knowledge",
+    "get_project_info",
+    "list_projects",
+    "pending_entries",
+    "set_search_engine",
+    "get_search_engine",
+    "set_quantization",
+    "get_quantization",
+    "quantization_report",
+    "set_retention_policy",
+    "get_retention_policy",
+    "prune_project",
+    "prune_projects",
+    "list_shards",
+    "set_shard_archived",
+    "ingest_queue_status",
+    "drain_ingest_queue",
+    "retry_failed_ingest",
+})
+
+# ページ単位のカーソルで転送するジェネレータメソッド
+STREAMED_METHODS = frozenset({
+    "iter_knowledge",
+    "iter_projects",
+})
+
+# iter_projects はプロジェクト1件ずつ返すので、この件数ずつまとめて送る
+_PROJECTS_PER_PAGE = 50
+# 読み切られずに放置されたカーソルの上限（古いものから閉じる）
+_MAX_CURSORS = 16
+
+# 呼び出し側に同じ型で再送出する例外
+_REMOTE_ERRORS = {"ValueError": ValueError, "RuntimeError": RuntimeError, "KeyError": KeyError}
+
+_CONNECT_TIMEOUT = 0.5
+_CALL_TIMEOUT = 600.0
+_STARTUP_TIMEOUT = 15.0
+
+
+class DaemonUnavailable(Exception):
+    """The daemon could not be reached; the caller should run in-process"""
+
+
+def daemon_supported() -> bool:
+    """Unix domain sockets are required"""
+    return hasattr(socket, "AF_UNIX")
+
+
+def get_socket_path() -> Path:
+    """Path of the daemon socket (next to config.yaml)"""
+    return config_manager.config_dir / "daemon.sock"
+
+
+def daemon_enabled() -> bool:
+    """Whether CLI commands should be forwarded to the daemon
+
+    ``CHROMA_MEMO_DAEMON=1/0`` overrides the ``use_daemon`` config setting.
+    """
+    if not daemon_supported():
+        return False
+    env = os.getenv("CHROMA_MEMO_DAEMON")
+    if env is not None:
+        return env.strip().lower() in ("1", "true", "yes", "on")
+    return config_manager.load_config().use_daemon
+
+
+_blob_store = None
+
+
+def _blob_loader():
+    """Reads blob-stored bodies of rows received from the daemon (same db_path, same files)"""
+    global _blob_store
+    if _blob_store is None:
+        from .blob_store import BlobStore, blob_root
+        config = config_manager.load_config()
+        _blob_store = BlobStore(blob_root(config_manager.get_db_path()), config.blob_compression)
+    return _blob_store.get
+
+
+def _encode(value: Any) -> Any:
+    """Convert results into JSON, tagging pydantic models with their class name"""
+    from .models import EntryRow, EntryRows, SearchHit
+
+    if hasattr(value, "model_dump"):
+        return {"__model__": type(value).__name__, "data": value.model_dump(mode="json")}
+    if isinstance(value, EntryRows):
+        # 列形式のまま送る（行ごとのモデル化はしない）
+        return {"__rows__": {
+            "ids": [row.id for row in value],
+            # blob に保存された本文はプレビューのまま送り、全文は受け取った側が読む
+            "documents": [row.preview for row in value],
+            "metadatas": [row._meta for row in value],
+        }}
+    if isinstance(value, EntryRow):
+        return _encode(value.to_entry())
+    if isinstance(value, SearchHit):
+        return {"__hit__": {"entry": _encode(value.entry), "similarity_score": value.similarity_score, "rank": value.rank}}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    """Inverse of ``_encode``"""
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if isinstance(value, dict):
+        if "__model__" in value:
+            from . import models
+            return getattr(models, value["__model__"]).model_validate(value["data"])
+        if "__rows__" in value:
+            from .models import EntryRows
+            columns = value["__rows__"]
+            return EntryRows(columns["ids"], columns["documents"], columns["metadatas"], loader=_blob_loader())
+        if "__hit__" in value:
+            from .models import SearchHit
+            hit = value["__hit__"]
+            return SearchHit(_decode(hit["entry"]), hit["similarity_score"], hit["rank"])
+        return {key: _decode(item) for key, item in value.items()}
+    return value
+
+
+def _send(sock: socket.socket, message: Dict[str, Any]) -> None:
+    sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+def _receive(sock_file) -> Optional[Dict[str, Any]]:
+    line = sock_file.readline()
+    if not line:
+        return None
+    return json.loads(line.decode("utf-8"))
+
+
+class DaemonClient:
+    """Client side of the daemon protocol"""
+
+    def __init__(self, socket_path: Optional[Path] = None):
+        self.socket_path = Path(socket_path or get_socket_path())
+
+    def request(self, message: Dict[str, Any], timeout: float = _CALL_TIMEOUT) -> Dict[str, Any]:
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(_CONNECT_TIMEOUT)
+            sock.connect(str(self.socket_path))
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from None
+
+        # 送信後の失敗ではフォールバックしない（書き込みが二重に実行されうるため）
+        try:
+            sock.settimeout(timeout)
+            _send(sock, message)
+            with sock.makefile("rb") as sock_file:
+                response = _receive(sock_file)
+        except OSError as e:
+            raise RuntimeError(f"Lost connection to chroma-memo daemon: {e}") from None
+        finally:
+            sock.close()
+
+        if response is None:
+            raise RuntimeError("chroma-memo daemon closed the connection")
+        return response
+
+    def call(self, op: str, *args: Any, **kwargs: Any) -> Any:
+        """Run a database method in the daemon and return its result"""
+        if op == "__open__":
+            message = {"op": op, "method": args[0], "args": _encode(args[1:]), "kwargs": _encode(kwargs)}
+        elif op in ("__next__", "__close__"):
+            message = {"op": op, "cursor": args[0]}
+        else:
+            message = {"op": op, "args": _encode(args), "kwargs": _encode(kwargs)}
+        response = self.request(message)
+        if response.get("ok"):
+            return _decode(response.get("result"))
+        error_type = _REMOTE_ERRORS.get(response.get("type"), RuntimeError)
+        raise error_type(response.get("error", "daemon error"))
+
+    def iterate(self, method: str, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        """Run a generator method in the daemon and yield its pages as they are fetched
+
+        Raises DaemonUnavailable before anything is yielded if the daemon
+        cannot be reached.
+        """
+        result = self.call("__open__", method, *args, **kwargs)
+        cursor = result["cursor"]
+        done = False
+        try:
+            while True:
+                result = self.call("__next__", cursor)
+                if result["done"]:
+                    done = True
+                    return
+                yield result["page"]
+        finally:
+            if not done:
+                # 途中で読むのをやめたら、デーモン側のカーソルを閉じる
+                try:
+                    self.call("__close__", cursor)
+                except (DaemonUnavailable, RuntimeError):
+                    pass
+
+    def ping(self) -> Dict[str, Any]:
+        try:
+            return self.request({"op": "__ping__"}, timeout=_CONNECT_TIMEOUT * 4)["result"]
+        except RuntimeError as e:
+            raise DaemonUnavailable(str(e)) from None
+
+    def shutdown(self) -> None:
+        self.request({"op": "__shutdown__"}, timeout=_CONNECT_TIMEOUT * 4)
+
+
+class RemoteDatabase:
+    """Stand-in for ChromaMemoDatabase that forwards calls to the daemon
+
+    Methods the daemon does not serve, and calls made while the daemon is
+    unreachable, run against the in-process database instead.
+    """
+
+    def __init__(self, client: DaemonClient, local_factory: Callable[[], Any]):
+        self._client = client
+        self._local_factory = local_factory
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "config":
+            return config_manager.load_config()
+        if name not in FORWARDED_METHODS:
+            return getattr(self._local_factory(), name)
+
+        def forward(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return self._client.call(name, *args, **kwargs)
+            except DaemonUnavailable:
+                return getattr(self._local_factory(), name)(*args, **kwargs)
+
+        return forward
+
+    def _iterate(self, method: str, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        try:
+            pages = self._client.iterate(method, *args, **kwargs)
+            first = next(pages, None)
+        except DaemonUnavailable:
+            yield from getattr(self._local_factory(), method)(*args, **kwargs)
+            return
+        if first is None:
+            return
+        yield first
+        try:
+            yield from pages
+        except DaemonUnavailable as e:
+            # 出力を始めた後なので、プロセス内でやり直さずにエラーにする
+            raise RuntimeError(f"Lost connection to chroma-memo daemon: {e}") from None
+
+    def iter_knowledge(self, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        """``iter_knowledge`` served by the daemon, one page per round trip"""
+        return self._iterate("iter_knowledge", *args, **kwargs)
+
+    def iter_projects(self) -> Iterator[Any]:
+        """``iter_projects`` served by the daemon, a batch of projects per round trip"""
+        for page in self._iterate("iter_projects"):
+            if isinstance(page, list):
+                yield from page
+            else:
+                # デーモンに届かずプロセス内で実行したときは1件ずつ返る
+                yield page
+
+
+def _spawn_daemon() -> None:
+    """Start ``chroma-memo daemon run`` detached from the current terminal"""
+    if getattr(sys, "frozen", False):
+        command = [sys.executable, "daemon", "run"]
+    else:
+        command = [sys.executable, "-m", "chroma_memo.cli", "daemon", "run"]
+    subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
+
+
+def ensure_daemon(autostart: bool = True) -> Optional[DaemonClient]:
+    """Return a client for a running daemon, starting one if needed
+
+    Returns None if the daemon cannot be reached, in which case the caller
+    should fall back to in-process execution.
+    """
+    client = DaemonClient()
+    try:
+        client.ping()
+        return client
+    except DaemonUnavailable:
+        if not autostart:
+            return None
+
+    try:
+        _spawn_daemon()
+    except OSError:
+        return None
+
+    deadline = time.monotonic() + _STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        try:
+            client.ping()
+            return client
+        except DaemonUnavailable:
+            continue
+    return None
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def run_daemon(idle_timeout: Optional[float] = None) -> None:
+    """Serve database requests until shut down or idle for ``idle_timeout`` seconds"""
+    from .database import get_database
+    from .embeddings import embedding_service
+
+    socket_path = get_socket_path()
+    if socket_path.exists():
+        try:
+            DaemonClient(socket_path).ping()
+            raise RuntimeError(f"Daemon is already running: {socket_path}")
+        except DaemonUnavailable:
+            # 前回異常終了したときのソケットファイルを掃除
+            socket_path.unlink()
+
+    # 起動時に重い初期化を済ませておく
+    db = get_database()
+    if db.config.warmup:
+        db.warm_up()
+    else:
+        db.list_projects()
+        try:
+            embedding_service._ensure_initialized()
+        except ValueError:
+            # APIキー未設定でも一覧・取得などは使えるので起動は続ける
+            pass
+    if db.config.async_ingest:
+        db.start_ingest_worker()
+
+    if idle_timeout is None:
+        idle_timeout = db.config.daemon_idle_timeout
+
+    state = {"last_request": time.monotonic(), "requests": 0, "started": time.time()}
+    # Chromaクライアントの再オープンなどと競合しないよう、リクエストは1件ずつ処理する
+    db_lock = threading.Lock()
+    # カーソルID -> 読みかけのジェネレータ（挿入順 = 古い順）
+    cursors: Dict[str, Iterator[Any]] = {}
+
+    def open_cursor(method: str, args: List[Any], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        pages = getattr(db, method)(*args, **kwargs)
+        if method == "iter_projects":
+            projects = pages
+            pages = iter(lambda: [*itertools.islice(projects, _PROJECTS_PER_PAGE)], [])
+        while len(cursors) >= _MAX_CURSORS:
+            cursors.pop(next(iter(cursors))).close()
+        cursor = uuid.uuid4().hex
+        cursors[cursor] = pages
+        return {"cursor": cursor}
+
+    def next_page(cursor: str) -> Dict[str, Any]:
+        pages = cursors.get(cursor)
+        if pages is None:
+            raise ValueError("Unknown or expired cursor")
+        try:
+            return {"page": next(pages), "done": False}
+        except StopIteration:
+            del cursors[cursor]
+            return {"page": None, "done": True}
+        except Exception:
+            cursors.pop(cursor, None)
+            raise
+
+    def close_cursor(cursor: str) -> None:
+        pages = cursors.pop(cursor, None)
+        if pages is not None:
+            pages.close()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            request = _receive(self.rfile)
+            if request is None:
+                return
+            state["last_request"] = time.monotonic()
+            op = request.get("op")
+
+            if op == "__ping__":
+                response = {"ok": True, "result": {
+                    "pid": os.getpid(),
+                    "uptime": time.time() - state["started"],
+                    "requests": state["requests"],
+                }}
+            elif op == "__shutdown__":
+                response = {"ok": True, "result": None}
+                threading.Thread(target=server.shutdown, daemon=True).start()
+            elif op in ("__open__", "__next__", "__close__"):
+                try:
+                    with db_lock:
+                        if op == "__open__":
+                            method = request.get("method")
+                            if method not in STREAMED_METHODS:
+                                raise ValueError(f"Unknown operation: {method}")
+                            result = open_cursor(method, _decode(request.get("args", [])), _decode(request.get("kwargs", {})))
+                        elif op == "__next__":
+                            result = next_page(request.get("cursor"))
+                        else:
+                            result = close_cursor(request.get("cursor"))
+                    response = {"ok": True, "result": _encode(result)}
+                except Exception as e:
+                    response = {"ok": False, "type": type(e).__name__, "error": str(e)}
+                state["requests"] += 1
+            elif op in FORWARDED_METHODS:
+                try:
+                    with db_lock:
+                        result = getattr(db, op)(*_decode(request.get("args", [])), **_decode(request.get("kwargs", {})))
+                    response = {"ok": True, "result": _encode(result)}
+                except Exception as e:
+                    response = {"ok": False, "type": type(e).__name__, "error": str(e)}
+                state["requests"] += 1
+            else:
+                response = {"ok": False, "type": "ValueError", "error": f"Unknown operation: {op}"}
+
+            _send(self.connection, response)
+
+    # bind した時点で所有者以外が接続できないよう、ソケットは umask 077 で作る
+    previous_umask = os.umask(0o077)
+    try:
+        server = _DaemonServer(str(socket_path), Handler)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(socket_path, 0o600)
+    (socket_path.parent / "daemon.pid").write_text(str(os.getpid()))
+
+    def watch_idle() -> None:
+        while True:
+            time.sleep(min(idle_timeout, 30))
+            if time.monotonic() - state["last_request"] >= idle_timeout:
+                server.shutdown()
+                return
+
+    if idle_timeout > 0:
+        threading.Thread(target=watch_idle, daemon=True).start()
+
+    print(f"🔥 Chroma-Memo daemon listening on {socket_path} (pid {os.getpid()})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        for path in (socket_path, socket_path.parent / "daemon.pid"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,16 +1,32 @@
 """
-ChromaDB database operations for Chroma-Memo
+Database operations for Chroma-Memo (on top of a pluggable storage backend)
 """
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
-from typing import List, Optional, Dict, Any, Tuple
-import chromadb
-from chromadb.config import Settings
+from typing import Callable, Iterator, List, Optional, Dict, Any, Tuple
 
-from .models import KnowledgeEntry, SearchResult, ProjectInfo
-from .embeddings import embedding_service
+from .models import KnowledgeEntry, SearchHit, ProjectInfo, SourceType, EntryRows, RetentionPolicy, RESERVED_METADATA_KEYS
+from .embeddings import EmbeddingService, embedding_service, get_embedding_service_for
 from .config import config_manager
+from .exact_index import ExactIndex, ENGINES, ENGINE_AUTO, ENGINE_EXACT, ENGINE_HNSW
+from .quantization import QUANTIZATIONS, QUANT_NONE
+from .ingest_queue import IngestQueue, IngestWorker, drain_queue, spawn_drain_process
+from .locking import FileLock, ChangeSequence
+from .metrics import metrics
+from .access_stats import AccessTracker
+from .query_log import QueryLog
+from .backends import VectorStore, backend_name, open_store
+from .blob_store import BlobStore, BLOB_DIGEST_KEY, BLOB_CHARS_KEY, blob_root, make_preview
+from .retention import RetentionWorker, policy_from_metadata, policy_to_metadata, select_prunable
+from .sharding import (
+    SHARD_MODES, SHARD_BY_MONTH, SHARD_BY_KEY, SHARD_SIZE_KEY, SHARD_OF_KEY, SHARD_KEY_KEY, ARCHIVED_KEY,
+    CREATED_FROM_KEY, CREATED_TO_KEY, INHERITED_KEYS, COMPACT_PREFIX, DEFAULT_SHARD_SIZE, FILTER_OVERFETCH,
+    shard_collection_name, shard_keys, with_shard_key, month_key, size_key, shard_range, overlaps, in_range,
+    merge_query_results,
+)
 
 
 class ChromaMemoDatabase:
@@ -21,59 +37,313 @@ class ChromaMemoDatabase:
         self.db_path = config_manager.get_db_path()
         self.db_path.mkdir(parents=True, exist_ok=True)
         
-        # Initialize ChromaDB client
-        # テレメトリを確実に無効化
-        import os
-        os.environ["ANONYMIZED_TELEMETRY"] = "False"
+        # Storage backend (Chroma or the embedded SQLite/NumPy store)
+        self.backend = backend_name(self.config.storage_backend)
+        self.client = self._open_client()
         
-        try:
-            # 最小限の設定でクライアントを初期化
-            self.client = chromadb.PersistentClient(path=str(self.db_path))
-        except Exception as e:
-            # エラーをログに出力
-            import sys
-            print(f"⚠️  ChromaDB PersistentClient initialization failed: {e}", file=sys.stderr)
-            print(f"📂 Attempted path: {self.db_path}", file=sys.stderr)
-            # デフォルトのクライアントを使用
-            self.client = chromadb.Client()
+        # Cross-process coordination: single writer + change sequence number
+        self._write_lock = FileLock(self.db_path / ".write.lock", timeout=self.config.lock_timeout)
+        self._change_seq = ChangeSequence(self.db_path / ".change_seq")
+        self._seen_seq = self._change_seq.read()
+        
+        # Exact search engine (memory-mapped embedding matrices)
+        self.exact_index = ExactIndex(self.db_path / "exact", lock=self._write_lock)
+        
+        # Async ingest queue (遅延初期化)
+        self._ingest_queue: Optional[IngestQueue] = None
+        self._ingest_worker: Optional[IngestWorker] = None
+        
+        # Per-entry access stats for retention policies (遅延初期化)
+        self._access_tracker: Optional[AccessTracker] = None
+        self._retention_worker: Optional[RetentionWorker] = None
+        
+        # Recent queries replayed at warm-up (遅延初期化)
+        self._query_log: Optional[QueryLog] = None
+        
+        # Parallel queries over the shards of sharded projects (遅延初期化)
+        self._shard_pool: Optional[ThreadPoolExecutor] = None
+        
+        # Compressed store for large bodies (遅延初期化)
+        self._blob_store: Optional[BlobStore] = None
+    
+    def _open_client(self) -> VectorStore:
+        """Open the configured storage backend for ``db_path``
+        
+        Fails instead of falling back to an in-memory store, which would
+        silently drop every write.
+        """
+        return open_store(self.backend, self.db_path)
+    
+    def _refresh_if_stale(self) -> None:
+        """Reopen the client if another process has written since we last looked
+        
+        Costs a single ``stat`` when nothing changed, so it is safe to call on
+        every operation.
+        """
+        current = self._change_seq.read()
+        if current == self._seen_seq:
+            return
+        
+        self.client.close()
+        self.client = self._open_client()
+        self.exact_index.clear_cache()
+        self._seen_seq = current
+    
+    @contextmanager
+    def _writing(self):
+        """Hold the inter-process write lock and publish the change afterwards"""
+        with self._write_lock:
+            self._refresh_if_stale()
+            try:
+                yield
+            finally:
+                self._seen_seq = self._change_seq.bump()
     
     def _get_collection_name(self, project_name: str) -> str:
         """Get collection name for a project"""
         return f"project_{project_name.lower().replace('-', '_').replace(' ', '_')}"
     
-    def create_project(self, project_name: str) -> bool:
-        """Create a new project (collection)"""
+    @staticmethod
+    def _settable_metadata(collection) -> Dict[str, Any]:
+        # hnsw:* はChroma側で変更不可なので除外して渡す
+        return {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    
+    def _get_blob_store(self) -> BlobStore:
+        if self._blob_store is None:
+            self._blob_store = BlobStore(blob_root(self.db_path), self.config.blob_compression)
+        return self._blob_store
+    
+    def _load_blob(self, digest: str) -> Optional[str]:
+        """Full text of a blob-stored body (None if its file is missing)"""
+        return self._get_blob_store().get(digest)
+    
+    def _full_text(self, document: Optional[str], metadata: Optional[Dict[str, Any]]) -> str:
+        """The whole body of a stored entry, reading the blob store if needed"""
+        digest = (metadata or {}).get(BLOB_DIGEST_KEY)
+        if digest:
+            text = self._load_blob(digest)
+            if text is not None:
+                return text
+        return document or ""
+    
+    def _pack_bodies(self, documents: List[str],
+                     metadatas: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Move bodies over ``blob_threshold_chars`` into the blob store, keeping a preview
+        
+        Call after embedding (embeddings are always computed from the full
+        text) and under the write lock, so that blob GC cannot race the write.
+        """
+        threshold = self.config.blob_threshold_chars
+        if threshold <= 0 or not any(len(document) > threshold for document in documents):
+            return documents, metadatas
+        packed_documents = []
+        packed_metadatas = []
+        for document, metadata in zip(documents, metadatas):
+            if len(document) > threshold and not (metadata or {}).get(BLOB_DIGEST_KEY):
+                metadata = {**(metadata or {}), BLOB_DIGEST_KEY: self._get_blob_store().put(document),
+                            BLOB_CHARS_KEY: len(document)}
+                # プレビューがしきい値より長いと本文を丸ごと残してしまうので、しきい値で抑える
+                document = make_preview(document, min(self.config.blob_preview_chars, threshold))
+            packed_documents.append(document)
+            packed_metadatas.append(metadata)
+        return packed_documents, packed_metadatas
+    
+    def _read_collections(self, collection_name: str, collection, since: Optional[str] = None,
+                          until: Optional[str] = None, include_archived: bool = False) -> List[Tuple[str, Any]]:
+        """(name, collection) pairs that hold a project's entries
+        
+        An unsharded project is its own single collection. For a sharded one,
+        shards that cannot hold entries created in [since, until) and archived
+        shards are skipped; the project collection itself is included only
+        while it still has entries that were not moved into shards.
+        """
+        metadata = collection.metadata or {}
+        mode = metadata.get(SHARD_BY_KEY)
+        if not mode:
+            return [(collection_name, collection)]
+        
+        targets = []
+        if collection.count() > 0:
+            targets.append((collection_name, collection))
+        for key in shard_keys(metadata):
+            name = shard_collection_name(collection_name, key)
+            try:
+                shard = self.client.get_collection(name)
+            except Exception:
+                continue
+            shard_metadata = shard.metadata or {}
+            if shard_metadata.get(ARCHIVED_KEY) and not include_archived:
+                continue
+            if (since or until) and not overlaps(mode, key, shard_metadata, since, until):
+                continue
+            targets.append((name, shard))
+        return targets
+    
+    def _locate(self, collection_name: str, collection, ids: List[str]) -> List[Tuple[str, Any, List[str]]]:
+        """(name, collection, IDs found there) for entries of a project, archived shards included"""
+        located = []
+        remaining = [*dict.fromkeys(ids)]
+        for name, target in self._read_collections(collection_name, collection, include_archived=True):
+            if not remaining:
+                break
+            found = target.get(ids=remaining, include=[])['ids'] or []
+            if found:
+                located.append((name, target, found))
+                found_set = set(found)
+                remaining = [doc_id for doc_id in remaining if doc_id not in found_set]
+        return located
+    
+    def _open_shard(self, collection_name: str, key: str):
+        """Get or create a shard and record it on the project (call under the write lock)"""
+        name = shard_collection_name(collection_name, key)
+        collection = self.client.get_collection(collection_name)
+        metadata = collection.metadata or {}
+        try:
+            shard = self.client.get_collection(name)
+        except Exception:
+            shard_metadata = {k: metadata[k] for k in INHERITED_KEYS if k in metadata}
+            shard_metadata.update({SHARD_OF_KEY: collection_name, SHARD_KEY_KEY: key,
+                                   "created_at": datetime.now().isoformat()})
+            shard = self.client.create_collection(name=name, metadata=shard_metadata)
+        if key not in shard_keys(metadata):
+            collection.modify(metadata=with_shard_key(self._settable_metadata(collection), key))
+        return shard
+    
+    def _seal_shard(self, name: str) -> None:
+        """Record the creation-time range of a full size shard so date filters can skip it"""
+        shard = self.client.get_collection(name)
+        created = [m.get("created_at") for m in shard.get(include=["metadatas"])['metadatas'] or [] if m and m.get("created_at")]
+        if created:
+            metadata = self._settable_metadata(shard)
+            metadata.update({CREATED_FROM_KEY: min(created), CREATED_TO_KEY: max(created)})
+            shard.modify(metadata=metadata)
+    
+    def _route(self, collection_name: str, collection,
+               created: List[str]) -> Tuple[List[Tuple[str, Any, List[int]]], List[str]]:
+        """Split entries (given their ISO creation times) between shards
+        
+        Returns ((name, shard, positions) per shard, names of size shards
+        that are full once these entries are written).
+        """
+        metadata = collection.metadata or {}
+        groups: Dict[str, List[int]] = {}
+        full: List[str] = []
+        if metadata.get(SHARD_BY_KEY) == SHARD_BY_MONTH:
+            for i, created_at in enumerate(created):
+                groups.setdefault(month_key(created_at), []).append(i)
+        else:
+            capacity = max(1, int(metadata.get(SHARD_SIZE_KEY) or DEFAULT_SHARD_SIZE))
+            keys = shard_keys(metadata)
+            key = keys[-1] if keys else size_key(1)
+            used = self._open_shard(collection_name, key).count()
+            for i in range(len(created)):
+                if used >= capacity:
+                    full.append(shard_collection_name(collection_name, key))
+                    key, used = size_key(int(key) + 1), 0
+                groups.setdefault(key, []).append(i)
+                used += 1
+        targets = [
+            (shard_collection_name(collection_name, key), self._open_shard(collection_name, key), positions)
+            for key, positions in groups.items()
+        ]
+        return targets, full
+    
+    def _write_entries(self, collection_name: str, collection, ids: List[str], documents: List[str],
+                       embeddings: List[Any], metadatas: List[Dict[str, Any]], upsert: bool = False) -> None:
+        """Add entries to a project, routed to its shards if it is sharded (call under the write lock)
+        
+        ``embeddings`` must come from the project collection's model; entries
+        routed to a shard on another model (mid-``reembed``) are re-embedded.
+        """
+        full: List[str] = []
+        if not collection.metadata or not collection.metadata.get(SHARD_BY_KEY):
+            targets = [(collection_name, collection, [*range(len(ids))])]
+        else:
+            targets, full = self._route(collection_name, collection, [metadata["created_at"] for metadata in metadatas])
+        
+        for name, target, positions in targets:
+            vectors = [embeddings[i] for i in positions]
+            if target is not collection and self._embedder(target) is not self._embedder(collection):
+                vectors = self._embedder(target).get_embeddings(
+                    [self._full_text(documents[i], metadatas[i]) for i in positions]
+                )
+            stored_documents, stored_metadatas = self._pack_bodies(
+                [documents[i] for i in positions], [metadatas[i] for i in positions]
+            )
+            write = target.upsert if upsert else target.add
+            write(
+                ids=[ids[i] for i in positions],
+                documents=stored_documents,
+                embeddings=vectors,
+                metadatas=stored_metadatas
+            )
+            self._sync_exact_index_add(name, [ids[i] for i in positions], vectors)
+        for name in full:
+            self._seal_shard(name)
+    
+    def _delete_located(self, ids: List[str], owner: Dict[str, Tuple[str, Any]]) -> None:
+        """Delete entries from the collections ``owner`` maps them to (call under the write lock)"""
+        groups: Dict[str, Tuple[Any, List[str]]] = {}
+        for doc_id in ids:
+            name, target = owner[doc_id]
+            groups.setdefault(name, (target, []))[1].append(doc_id)
+        for name, (target, group) in groups.items():
+            target.delete(ids=group)
+            self._sync_exact_index_remove(name, group)
+    
+    def create_project(self, project_name: str, engine: Optional[str] = None, shard_by: Optional[str] = None,
+                       shard_size: Optional[int] = None) -> bool:
+        """Create a new project (collection), optionally sharded by ``month`` or ``size``"""
+        if engine is not None and engine not in ENGINES:
+            raise ValueError(f"Unknown search engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+        if shard_by is not None and shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode '{shard_by}'. Choose from: {', '.join(SHARD_MODES)}")
+        
         try:
             collection_name = self._get_collection_name(project_name)
+            metadata = {
+                "project_name": project_name,
+                "created_at": datetime.now().isoformat(),
+                "embedding_model": embedding_service.signature,
+            }
+            if engine:
+                metadata["search_engine"] = engine
+            if shard_by:
+                metadata[SHARD_BY_KEY] = shard_by
+                if shard_size:
+                    metadata[SHARD_SIZE_KEY] = shard_size
             
-            # Try to get or create collection
-            try:
-                collection = self.client.get_or_create_collection(
-                    name=collection_name,
-                    metadata={"project_name": project_name, "created_at": datetime.now().isoformat()}
-                )
-                # Check if it was already existing by trying to get its count
+            with self._writing():
+                # Try to get or create collection
                 try:
-                    count = collection.count()
-                    if count == 0:
-                        return True  # New empty collection
-                    else:
-                        return False  # Collection already had data
-                except:
-                    return True  # Assume it's new if we can't check count
-            except Exception as e:
-                # Fallback: try create_collection directly
-                self.client.create_collection(
-                    name=collection_name,
-                    metadata={"project_name": project_name, "created_at": datetime.now().isoformat()}
-                )
-                return True
+                    collection = self.client.get_or_create_collection(
+                        name=collection_name,
+                        metadata=metadata
+                    )
+                    # Check if it was already existing by trying to get its count
+                    try:
+                        count = collection.count()
+                        if count == 0:
+                            return True  # New empty collection
+                        else:
+                            return False  # Collection already had data
+                    except:
+                        return True  # Assume it's new if we can't check count
+                except Exception as e:
+                    # Fallback: try create_collection directly
+                    self.client.create_collection(
+                        name=collection_name,
+                        metadata=metadata
+                    )
+                    return True
         except Exception as e:
             raise RuntimeError(f"Failed to create project '{project_name}': {str(e)}")
     
     def project_exists(self, project_name: str) -> bool:
         """Check if a project exists"""
         import sys
+        # 全操作の入口なので、ここで他プロセスの書き込みを検知する
+        self._refresh_if_stale()
         try:
             collection_name = self._get_collection_name(project_name)
             print(f"🔍 Checking if project exists: '{project_name}' -> collection: '{collection_name}'", file=sys.stderr)
@@ -85,8 +355,13 @@ class ChromaMemoDatabase:
             print(f"📝 Project '{project_name}' does not exist (Exception: {type(e).__name__}: {e})", file=sys.stderr)
             return False
     
-    def add_knowledge(self, project_name: str, content: str, tags: Optional[List[str]] = None) -> str:
-        """Add knowledge to a project"""
+    def add_knowledge(self, project_name: str, content: str, tags: Optional[List[str]] = None,
+                      async_ingest: Optional[bool] = None) -> str:
+        """Add knowledge to a project
+        
+        With async ingest (``async_ingest`` or the config default) the entry is
+        persisted to the ingest queue and its ID returned before it is embedded.
+        """
         if not self.project_exists(project_name):
             raise ValueError(f"Project '{project_name}' does not exist. Create it first with 'init' command.")
         
@@ -104,73 +379,1149 @@ class ChromaMemoDatabase:
                 updated_at=datetime.now()
             )
             
-            # Get embedding
-            embedding = embedding_service.get_embedding(content)
+            if self.config.async_ingest if async_ingest is None else async_ingest:
+                self._get_ingest_queue().enqueue([entry])
+                self._notify_ingest()
+                return entry_id
             
-            # Add to collection (存在しない場合は作成)
+            # Get embedding (プロジェクトが埋め込まれたモデルで)
             collection_name = self._get_collection_name(project_name)
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"project_name": project_name, "created_at": datetime.now().isoformat()}
-            )
+            embedder = self._embedder(self.client.get_collection(collection_name))
+            with metrics.span("db.add.embed"):
+                embedding = embedder.get_embedding(content)
             
-            collection.add(
-                ids=[entry_id],
-                documents=[content],
-                embeddings=[embedding],
-                metadatas=[entry.to_chroma_metadata()]
-            )
+            with metrics.span("db.add.write"), self._writing():
+                # Add to collection (存在しない場合は作成)
+                collection = self.client.get_or_create_collection(
+                    name=collection_name,
+                    metadata={"project_name": project_name, "created_at": datetime.now().isoformat()}
+                )
+                if self._embedder(collection) is not embedder:
+                    # 埋め込みの間に reembed で入れ替わった
+                    embedding = self._embedder(collection).get_embedding(content)
+                
+                self._write_entries(collection_name, collection, [entry_id], [content], [embedding],
+                                    [entry.to_chroma_metadata()])
             
             return entry_id
         except Exception as e:
             raise RuntimeError(f"Failed to add knowledge to project '{project_name}': {str(e)}")
     
-    def search_knowledge(self, project_name: str, query: str, max_results: Optional[int] = None) -> List[SearchResult]:
-        """Search knowledge in a project"""
+    def add_knowledge_batch(self, project_name: str, items: List[Dict[str, Any]],
+                            async_ingest: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Add several entries with one embedding request and one Chroma write
+        
+        ``items`` are ``{"content": str, "tags": [str, ...]}`` dicts, optionally
+        with ``"source"`` and extra ``"metadata"``. Returns one ``{"id", "error"}``
+        item per input, in order; invalid items fail individually without
+        affecting the others.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist. Create it first with 'init' command.")
+        
+        results: List[Dict[str, Any]] = []
+        entries: List[KnowledgeEntry] = []
+        positions: List[int] = []
+        now = datetime.now()
+        for i, item in enumerate(items):
+            try:
+                content = item.get("content") if isinstance(item, dict) else None
+                if not isinstance(content, str) or not content.strip():
+                    raise ValueError("Content must be a non-empty string")
+                metadata = item.get("metadata") or {}
+                if not isinstance(metadata, dict) or set(metadata) & RESERVED_METADATA_KEYS:
+                    raise ValueError(f"Metadata must be a dict without the keys: {', '.join(sorted(RESERVED_METADATA_KEYS))}")
+                entry = KnowledgeEntry(
+                    id=str(uuid.uuid4()),
+                    content=content,
+                    project=project_name,
+                    tags=item.get("tags") or [],
+                    source=SourceType(item.get("source") or SourceType.MANUAL.value),
+                    metadata=metadata,
+                    created_at=now,
+                    updated_at=now
+                )
+            except Exception as e:
+                results.append({"id": None, "error": str(e)})
+                continue
+            results.append({"id": entry.id, "error": None})
+            entries.append(entry)
+            positions.append(i)
+        
+        if not entries:
+            return results
+        
+        try:
+            if self.config.async_ingest if async_ingest is None else async_ingest:
+                self._get_ingest_queue().enqueue(entries)
+                self._notify_ingest()
+                return results
+            
+            # 全件を1回のAPI呼び出しで埋め込む
+            collection_name = self._get_collection_name(project_name)
+            embedder = self._embedder(self.client.get_collection(collection_name))
+            with metrics.span("db.add_batch.embed", batch_size=len(entries)):
+                embeddings = embedder.get_embeddings([entry.content for entry in entries])
+            if len(embeddings) != len(entries):
+                raise RuntimeError(f"Expected {len(entries)} embeddings, got {len(embeddings)}")
+            
+            with metrics.span("db.add_batch.write", batch_size=len(entries)), self._writing():
+                collection = self.client.get_or_create_collection(
+                    name=collection_name,
+                    metadata={"project_name": project_name, "created_at": datetime.now().isoformat()}
+                )
+                if self._embedder(collection) is not embedder:
+                    # 埋め込みの間に reembed で入れ替わった
+                    embeddings = self._embedder(collection).get_embeddings([entry.content for entry in entries])
+                self._write_entries(
+                    collection_name, collection, [entry.id for entry in entries],
+                    [entry.content for entry in entries], embeddings,
+                    [entry.to_chroma_metadata() for entry in entries]
+                )
+        except Exception as e:
+            # 埋め込みと書き込みは一括なので、有効な項目はまとめて失敗扱いになる
+            for i in positions:
+                results[i] = {"id": None, "error": f"Failed to add knowledge to project '{project_name}': {str(e)}"}
+        
+        return results
+    
+    def _get_ingest_queue(self) -> IngestQueue:
+        """Open the durable ingest queue on first use"""
+        if self._ingest_queue is None:
+            self._ingest_queue = IngestQueue(self.db_path / "ingest_queue.sqlite3")
+        return self._ingest_queue
+    
+    def _notify_ingest(self) -> None:
+        """Hand queued entries to the in-process worker, or to a detached drain process"""
+        if self._ingest_worker is not None and self._ingest_worker.is_alive():
+            self._ingest_worker.notify()
+            return
+        try:
+            spawn_drain_process()
+        except Exception as e:
+            # キューには永続化済みなので、次回の drain で処理される
+            import sys
+            print(f"⚠️  Failed to start background ingest: {e}", file=sys.stderr)
+    
+    def _index_queued(self, project_name: str, rows: List[Dict[str, Any]]) -> None:
+        """Embed and index a batch of queued entries of one project"""
+        entries = [
+            KnowledgeEntry(
+                id=row["id"],
+                content=row["content"],
+                project=project_name,
+                tags=row["tags"],
+                source=SourceType(row["source"]),
+                metadata=row["metadata"],
+                created_at=datetime.fromisoformat(row["created_at"]),
+                updated_at=datetime.fromisoformat(row["created_at"]),
+            )
+            for row in rows
+        ]
+        collection_name = self._get_collection_name(project_name)
+        embedder = self._embedder(self.client.get_collection(collection_name))
+        embeddings = embedder.get_embeddings([entry.content for entry in entries])
+        
+        with self._writing():
+            # 埋め込みの間に削除されたエントリは登録しない（削除も書き込みロック下でキューから消す）
+            still_queued = set(self._get_ingest_queue().queued([entry.id for entry in entries]))
+            if len(still_queued) < len(entries):
+                keep = [i for i, entry in enumerate(entries) if entry.id in still_queued]
+                entries = [entries[i] for i in keep]
+                embeddings = [embeddings[i] for i in keep]
+                if not entries:
+                    return
+            collection = self.client.get_collection(collection_name)
+            if self._embedder(collection) is not embedder:
+                embeddings = self._embedder(collection).get_embeddings([entry.content for entry in entries])
+            ids = [entry.id for entry in entries]
+            if (collection.metadata or {}).get(SHARD_BY_KEY):
+                # 再試行時に二重登録しないよう、登録済みのエントリは飛ばす
+                indexed = {doc_id for _, _, found in self._locate(collection_name, collection, ids) for doc_id in found}
+                todo = [i for i, entry in enumerate(entries) if entry.id not in indexed]
+                if todo:
+                    self._write_entries(
+                        collection_name, collection, [ids[i] for i in todo],
+                        [entries[i].content for i in todo], [embeddings[i] for i in todo],
+                        [entries[i].to_chroma_metadata() for i in todo]
+                    )
+                return
+            already_indexed = set(collection.get(ids=ids, include=[])['ids'] or [])
+            
+            documents, metadatas = self._pack_bodies(
+                [entry.content for entry in entries], [entry.to_chroma_metadata() for entry in entries]
+            )
+            # 再試行時に二重登録しないよう upsert を使う
+            collection.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas
+            )
+            
+            if already_indexed:
+                self.exact_index.invalidate(collection_name)
+            else:
+                self._sync_exact_index_add(collection_name, ids, embeddings)
+    
+    def drain_ingest_queue(self) -> int:
+        """Index every queued entry that is ready; returns the number indexed"""
+        return drain_queue(
+            self._get_ingest_queue(), self._index_queued,
+            self.config.ingest_batch_size, self.config.ingest_max_retries
+        )
+    
+    def start_ingest_worker(self) -> None:
+        """Run the ingest worker as a thread of this (long-running) process"""
+        if self._ingest_worker is not None and self._ingest_worker.is_alive():
+            return
+        self._ingest_worker = IngestWorker(
+            self._get_ingest_queue(), self._index_queued,
+            self.config.ingest_batch_size, self.config.ingest_max_retries
+        )
+        self._ingest_worker.start()
+    
+    def ingest_queue_status(self) -> List[Dict[str, Any]]:
+        """Per-project summary of the ingest queue"""
+        return self._get_ingest_queue().status()
+    
+    def retry_failed_ingest(self, project_name: Optional[str] = None) -> int:
+        """Requeue entries that exhausted their retries"""
+        count = self._get_ingest_queue().retry_failed(project_name)
+        if count:
+            self._notify_ingest()
+        return count
+    
+    def _has_ingest_queue(self) -> bool:
+        return self._ingest_queue is not None or (self.db_path / "ingest_queue.sqlite3").exists()
+    
+    def _remove_queued(self, project_name: str, entry_ids: List[str]) -> List[str]:
+        """Drop entries that are still waiting in the ingest queue (call under ``_writing``)"""
+        if not self._has_ingest_queue():
+            return []
+        return self._get_ingest_queue().remove(entry_ids, project=project_name)
+    
+    def _get_queued_entry(self, entry_id: str) -> Optional[KnowledgeEntry]:
+        if not self._has_ingest_queue():
+            return None
+        return self._get_ingest_queue().get(entry_id)
+    
+    def pending_entries(self, project_name: str) -> List[KnowledgeEntry]:
+        """Entries of a project that are queued and not searchable yet"""
+        if not self._has_ingest_queue():
+            return []
+        return self._get_ingest_queue().pending(project_name)
+    
+    def search_knowledge(self, project_name: str, query: str, max_results: Optional[int] = None,
+                         since: Optional[str] = None, until: Optional[str] = None) -> List[SearchHit]:
+        """Search knowledge in a project
+        
+        ``since`` / ``until`` (ISO 8601) keep only entries created in
+        [since, until); shards outside the range are not queried.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        try:
+            with metrics.span("db.search", project=project_name) as span:
+                max_results = max_results or self.config.max_results
+                
+                collection_name = self._get_collection_name(project_name)
+                collection = self.client.get_collection(collection_name)
+                
+                engine, results = self._search(collection_name, collection, [query], max_results,
+                                               since, until, "db.search")
+                
+                with metrics.span("db.search.convert") as convert_span:
+                    hits = self._to_search_hits(results, 0)
+                    convert_span["results"] = len(hits)
+                span["engine"] = engine
+                span["results"] = len(hits)
+                self._record_access(project_name, [hit.entry.id for hit in hits])
+                self._log_queries(project_name, [query])
+                return hits
+        except Exception as e:
+            raise RuntimeError(f"Failed to search in project '{project_name}': {str(e)}")
+    
+    def search_knowledge_batch(self, project_name: str, queries: List[str], max_results: Optional[int] = None,
+                               since: Optional[str] = None, until: Optional[str] = None,
+                               record_access: bool = True) -> List[Dict[str, Any]]:
+        """Run several searches with one embedding request and one index query
+        
+        Returns one ``{"query", "results", "error"}`` item per query, in order.
+        Invalid queries fail individually; the others are still answered.
+        ``record_access=False`` keeps evaluation runs out of the access
+        statistics that retention policies use.
+        """
         if not self.project_exists(project_name):
             raise ValueError(f"Project '{project_name}' does not exist.")
         
+        items: List[Dict[str, Any]] = [{"query": query, "results": [], "error": None} for query in queries]
+        valid = [i for i, query in enumerate(queries) if isinstance(query, str) and query.strip()]
+        for i in set(range(len(queries))) - set(valid):
+            items[i]["error"] = "Query must be a non-empty string"
+        if not valid:
+            return items
+        
         try:
             max_results = max_results or self.config.max_results
+            collection_name = self._get_collection_name(project_name)
+            collection = self.client.get_collection(collection_name)
             
-            # Get query embedding
-            query_embedding = embedding_service.get_embedding(query)
+            _, results = self._search(collection_name, collection, [queries[i] for i in valid], max_results,
+                                      since, until, "db.search_batch")
+        except Exception as e:
+            for i in valid:
+                items[i]["error"] = f"Failed to search in project '{project_name}': {str(e)}"
+            return items
+        
+        for row, i in enumerate(valid):
+            items[i]["results"] = self._to_search_hits(results, row)
+        if record_access:
+            self._record_access(project_name, [hit.entry.id for i in valid for hit in items[i]["results"]])
+            self._log_queries(project_name, [queries[i] for i in valid])
+        return items
+    
+    def _search(self, collection_name: str, collection, queries: List[str], max_results: int,
+                since: Optional[str], until: Optional[str], span_name: str) -> Tuple[str, Dict[str, Any]]:
+        """Embed ``queries`` and query every collection of a project that may match
+        
+        Returns (engine, Chroma-shaped result with one row per query). Shards
+        are queried in parallel and their hits merged into the overall top-k.
+        """
+        since = datetime.fromisoformat(since).isoformat() if since else None
+        until = datetime.fromisoformat(until).isoformat() if until else None
+        targets = self._read_collections(collection_name, collection, since, until)
+        settings = collection.metadata or {}
+        
+        # 埋め込みはモデルごとに1回（reembed の途中ではシャードごとにモデルが異なりうる）
+        embeddings: Dict[str, List[List[float]]] = {}
+        with metrics.span(f"{span_name}.embed", batch_size=len(queries)):
+            for _, target in targets:
+                embedder = self._embedder(target)
+                if embedder.signature not in embeddings:
+                    if len(queries) == 1:
+                        embeddings[embedder.signature] = [embedder.get_embedding(queries[0])]
+                    else:
+                        embeddings[embedder.signature] = embedder.get_embeddings(queries)
+        
+        # 日付で絞るときは範囲外のヒットを除くぶん多めに取得する
+        n_results = max_results * FILTER_OVERFETCH if since or until else max_results
+        
+        def query(target: Tuple[str, Any]) -> Tuple[str, Dict[str, Any]]:
+            name, shard = target
+            query_embeddings = embeddings[self._embedder(shard).signature]
+            engine = self._resolve_engine(shard, settings)
+            if engine == ENGINE_EXACT:
+                return engine, self._query_exact(name, shard, query_embeddings, n_results, settings)
+            return engine, shard.query(query_embeddings=query_embeddings, n_results=n_results)
+        
+        with metrics.span(f"{span_name}.query", batch_size=len(queries), n_results=max_results,
+                          shards=len(targets)) as span:
+            if len(targets) == 1:
+                answers = [query(targets[0])]
+            else:
+                answers = [*self._get_shard_pool().map(query, targets)]
+            engine = "+".join(sorted({engine for engine, _ in answers})) or ENGINE_EXACT
+            span["engine"] = engine
+        
+        if len(answers) == 1 and not (since or until):
+            return engine, answers[0][1]
+        return engine, merge_query_results([result for _, result in answers] or [_empty_result(len(queries))],
+                                           max_results, since, until)
+    
+    def _get_shard_pool(self) -> ThreadPoolExecutor:
+        if self._shard_pool is None:
+            self._shard_pool = ThreadPoolExecutor(
+                max_workers=max(1, self.config.shard_query_workers), thread_name_prefix="chroma-memo-shard"
+            )
+        return self._shard_pool
+    
+    def _to_search_hits(self, results: Dict[str, Any], row: int) -> List[SearchHit]:
+        """Convert one row of a Chroma-shaped query result into SearchHit views"""
+        search_results = []
+        if results['ids'] and results['ids'][row]:
+            rows = EntryRows(results['ids'][row], results['documents'][row], results['metadatas'][row],
+                             loader=self._load_blob)
+            for i, (entry, distance) in enumerate(zip(rows, results['distances'][row])):
+                # Convert distance to similarity score (ChromaDB uses cosine distance)
+                similarity_score = 1.0 - distance
+                
+                # Skip results below threshold
+                if similarity_score < self.config.similarity_threshold:
+                    continue
+                
+                search_results.append(SearchHit(
+                    entry=entry,
+                    similarity_score=similarity_score,
+                    rank=i + 1
+                ))
+        return search_results
+    
+    def _embedder(self, collection) -> EmbeddingService:
+        """Embedding service matching the model a collection was embedded with
+        
+        Queries and new entries must use the same model as the stored vectors,
+        so a changed ``embedding_model`` / ``USE_API`` only applies to new
+        projects until ``reembed`` migrates an existing one. Collections from
+        before the model was recorded use the current service.
+        """
+        return get_embedding_service_for((collection.metadata or {}).get("embedding_model"))
+    
+    def _resolve_engine(self, collection, settings: Optional[Dict[str, Any]] = None) -> str:
+        """Decide which search engine serves a collection
+
+        The project's own ``search_engine`` metadata wins over the config
+        default; ``auto`` picks the exact engine for small collections.
+        ``settings`` is the project collection's metadata when ``collection``
+        is one of its shards.
+        """
+        metadata = (collection.metadata or {}) if settings is None else settings
+        engine = metadata.get("search_engine") or self.config.search_engine
+        if engine == ENGINE_AUTO:
+            if collection.count() <= self.config.exact_engine_max_entries:
+                return ENGINE_EXACT
+            return ENGINE_HNSW
+        return engine if engine in ENGINES else ENGINE_HNSW
+    
+    def _query_exact(self, collection_name: str, collection, query_embeddings: List[List[float]],
+                     max_results: int, settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Query the exact engine and return a Chroma-shaped query result (one row per query)"""
+        metadata = collection.metadata or {}
+        space = metadata.get("hnsw:space", "l2")
+        quantization = (metadata if settings is None else settings).get("quantization") or self.config.quantization
+        if quantization not in QUANTIZATIONS:
+            quantization = QUANT_NONE
+        matches = self.exact_index.query_batch(
+            collection_name, collection, query_embeddings, max_results, space=space,
+            quantization=quantization, rerank_factor=self.config.quantization_rerank_factor
+        )
+        
+        # 全クエリのヒットをまとめて1回で取得する（Chromaのgetは順序を保証しないのでIDで引き直す）
+        wanted = sorted({doc_id for ids, _ in matches for doc_id in ids})
+        by_id = {}
+        if wanted:
+            fetched = collection.get(ids=wanted)
+            by_id = {
+                doc_id: (content, metadata)
+                for doc_id, content, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+            }
+        
+        results: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for ids, distances in matches:
+            rows = [(doc_id, distance) for doc_id, distance in zip(ids, distances) if doc_id in by_id]
+            results["ids"].append([doc_id for doc_id, _ in rows])
+            results["documents"].append([by_id[doc_id][0] for doc_id, _ in rows])
+            results["metadatas"].append([by_id[doc_id][1] for doc_id, _ in rows])
+            results["distances"].append([distance for _, distance in rows])
+        return results
+    
+    def _sync_exact_index_add(self, collection_name: str, ids: List[str], embeddings: List[List[float]]) -> None:
+        """Keep the exact index in step with a Chroma add"""
+        try:
+            self.exact_index.append(collection_name, ids, embeddings)
+        except Exception:
+            # 同期に失敗したら次回検索時に再構築させる
+            self.exact_index.invalidate(collection_name)
+    
+    def _sync_exact_index_remove(self, collection_name: str, ids: List[str]) -> None:
+        """Keep the exact index in step with a Chroma delete"""
+        try:
+            self.exact_index.remove(collection_name, ids)
+        except Exception:
+            self.exact_index.invalidate(collection_name)
+    
+    def set_search_engine(self, project_name: str, engine: str) -> None:
+        """Set the search engine used for a project (exact, hnsw or auto)"""
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown search engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        with self._writing():
+            collection = self.client.get_collection(self._get_collection_name(project_name))
+            # hnsw:* はChroma側で変更不可なので除外して渡す
+            metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+            metadata["search_engine"] = engine
+            collection.modify(metadata=metadata)
+    
+    def set_quantization(self, project_name: str, quantization: str) -> None:
+        """Set the quantized sidecar used by the exact engine for a project"""
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}'. Choose from: {', '.join(QUANTIZATIONS)}")
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        with self._writing():
+            collection = self.client.get_collection(self._get_collection_name(project_name))
+            metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+            metadata["quantization"] = quantization
+            collection.modify(metadata=metadata)
+    
+    def get_quantization(self, project_name: str) -> str:
+        """Return the quantization configured for a project"""
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection = self.client.get_collection(self._get_collection_name(project_name))
+        return (collection.metadata or {}).get("quantization") or self.config.quantization
+    
+    def quantization_report(self, project_name: str, modes: List[str], k: int = 10,
+                            samples: int = 100) -> List[Dict[str, Any]]:
+        """Recall@k of quantized search against full-precision search for a project
+        
+        Sharded projects are measured on their largest shard.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        try:
+            collection_name = self._get_collection_name(project_name)
+            collection = self.client.get_collection(collection_name)
+            targets = self._read_collections(collection_name, collection)
+            if targets:
+                collection_name, collection = max(targets, key=lambda target: target[1].count())
+            return self.exact_index.recall_report(
+                collection_name, collection, modes, k=k, samples=samples,
+                rerank_factor=self.config.quantization_rerank_factor
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to build quantization report for project '{project_name}': {str(e)}")
+    
+    def get_search_engine(self, project_name: str) -> Tuple[str, str]:
+        """Return (configured engine, engine actually used) for a project"""
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection_name = self._get_collection_name(project_name)
+        collection = self.client.get_collection(collection_name)
+        settings = collection.metadata or {}
+        configured = settings.get("search_engine") or self.config.search_engine
+        # シャードごとに件数で決まるので、使われているエンジンをまとめて返す
+        engines = {self._resolve_engine(target, settings) for _, target in self._read_collections(collection_name, collection)}
+        return configured, "+".join(sorted(engines)) or self._resolve_engine(collection)
+    
+    def shard_project(self, project_name: str, shard_by: str, shard_size: Optional[int] = None,
+                      batch_size: int = 1000,
+                      progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Turn on sharding for a project and move its entries into shards
+        
+        Entries are moved in creation order, one batch per write lock, with
+        their stored embeddings (nothing is re-embedded). New entries go to
+        the shards as soon as sharding is on, and searches read the project
+        collection until it is empty, so an interrupted run can be repeated.
+        """
+        if shard_by not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode '{shard_by}'. Choose from: {', '.join(SHARD_MODES)}")
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection_name = self._get_collection_name(project_name)
+        with self._writing():
+            collection = self.client.get_collection(collection_name)
+            current = (collection.metadata or {}).get(SHARD_BY_KEY)
+            if current and current != shard_by:
+                raise ValueError(f"Project '{project_name}' is already sharded by {current}.")
+            if not current:
+                metadata = self._settable_metadata(collection)
+                metadata[SHARD_BY_KEY] = shard_by
+                if shard_size:
+                    metadata[SHARD_SIZE_KEY] = shard_size
+                collection.modify(metadata=metadata)
+        
+        try:
+            # size のシャードが作成順に並ぶよう、作成日時順に移す
+            fetched = collection.get(include=["metadatas"])
+            order = sorted(
+                zip(fetched["ids"] or [], fetched["metadatas"] or []),
+                key=lambda row: ((row[1] or {}).get("created_at", ""), row[0])
+            )
+            total = len(order)
+            moved = 0
+            say = progress or (lambda done, total: None)
+            say(0, total)
+            for start in range(0, total, max(1, batch_size)):
+                with self._writing():
+                    collection = self.client.get_collection(collection_name)
+                    rows = collection.get(ids=[doc_id for doc_id, _ in order[start:start + batch_size]],
+                                          include=["documents", "metadatas", "embeddings"])
+                    if rows["ids"]:
+                        batch = sorted(
+                            zip(rows["ids"], rows["documents"], rows["embeddings"], rows["metadatas"]),
+                            key=lambda row: ((row[3] or {}).get("created_at", ""), row[0])
+                        )
+                        for row in batch:
+                            # 作成日時のない古いエントリは今月のシャードへ
+                            row[3].setdefault("created_at", datetime.now().isoformat())
+                        ids = [row[0] for row in batch]
+                        # 再実行時に二重登録しないよう upsert を使う
+                        self._write_entries(collection_name, collection, ids, [row[1] for row in batch],
+                                            [row[2] for row in batch], [row[3] for row in batch], upsert=True)
+                        collection.delete(ids=ids)
+                        self._sync_exact_index_remove(collection_name, ids)
+                        moved += len(ids)
+                say(min(start + batch_size, total), total)
             
-            # Search in collection
+            collection = self.client.get_collection(collection_name)
+            return {"project": project_name, "shard_by": shard_by, "moved": moved,
+                    "shards": len(shard_keys(collection.metadata or {}))}
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to shard project '{project_name}': {str(e)}")
+    
+    def list_shards(self, project_name: str) -> List[Dict[str, Any]]:
+        """``{"key", "collection", "entries", "archived", "created_from", "created_to"}`` per shard
+        
+        Entries still waiting to be moved out of the project collection are
+        reported with ``key`` None.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection_name = self._get_collection_name(project_name)
+        collection = self.client.get_collection(collection_name)
+        metadata = collection.metadata or {}
+        mode = metadata.get(SHARD_BY_KEY)
+        if not mode:
+            return []
+        
+        shards = []
+        for name, target in self._read_collections(collection_name, collection, include_archived=True):
+            shard_metadata = target.metadata or {}
+            key = shard_metadata.get(SHARD_KEY_KEY) if name != collection_name else None
+            start, end = shard_range(mode, key, shard_metadata) if key else (None, None)
+            if key and end is None:
+                # 書き込み中の size シャードは範囲を記録していないので実際の値を使う
+                created = [m.get("created_at") for m in target.get(include=["metadatas"])['metadatas'] or [] if m and m.get("created_at")]
+                start, end = (min(created), max(created)) if created else (None, None)
+            shards.append({
+                "key": key,
+                "collection": name,
+                "entries": target.count(),
+                "archived": bool(shard_metadata.get(ARCHIVED_KEY)),
+                "created_from": start,
+                "created_to": end,
+            })
+        return shards
+    
+    def set_shard_archived(self, project_name: str, keys: List[str], archived: bool = True) -> List[str]:
+        """Exclude shards from searches, listings, dedupe and pruning (or include them again)
+        
+        Archived shards stay on disk and can still be read by ID. Returns the
+        keys whose state changed.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection_name = self._get_collection_name(project_name)
+        changed = []
+        with self._writing():
+            collection = self.client.get_collection(collection_name)
+            known = shard_keys(collection.metadata or {})
+            for key in keys:
+                if key not in known:
+                    raise ValueError(f"Project '{project_name}' has no shard '{key}'.")
+                shard = self.client.get_collection(shard_collection_name(collection_name, key))
+                if bool((shard.metadata or {}).get(ARCHIVED_KEY)) == archived:
+                    continue
+                metadata = self._settable_metadata(shard)
+                metadata[ARCHIVED_KEY] = archived
+                shard.modify(metadata=metadata)
+                changed.append(key)
+        return changed
+    
+    def compact_shard(self, project_name: str, key: str) -> Dict[str, Any]:
+        """Rewrite a shard into a fresh collection, dropping space left by deleted entries
+        
+        The stored embeddings are copied as they are and the shard's exact
+        index is rebuilt on next use.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection_name = self._get_collection_name(project_name)
+        name = shard_collection_name(collection_name, key)
+        try:
+            with self._writing():
+                collection = self.client.get_collection(collection_name)
+                if key not in shard_keys(collection.metadata or {}):
+                    raise ValueError(f"Project '{project_name}' has no shard '{key}'.")
+                shard = self.client.get_collection(name)
+                fetched = shard.get(include=["documents", "metadatas", "embeddings"])
+                
+                temp_name = f"{COMPACT_PREFIX}{name}"
+                try:
+                    # 中断された前回の残り
+                    self.client.delete_collection(temp_name)
+                except Exception:
+                    pass
+                fresh = self.client.create_collection(name=temp_name, metadata=shard.metadata or None)
+                step = self.client.get_max_batch_size()
+                ids = fetched["ids"] or []
+                for start in range(0, len(ids), step):
+                    fresh.add(
+                        ids=ids[start:start + step],
+                        documents=fetched["documents"][start:start + step],
+                        embeddings=fetched["embeddings"][start:start + step],
+                        metadatas=fetched["metadatas"][start:start + step]
+                    )
+                
+                retired_name = f"retired_{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                shard.modify(name=retired_name)
+                fresh.modify(name=name)
+                self.client.delete_collection(retired_name)
+                self.exact_index.invalidate(name)
+                self.exact_index.invalidate(temp_name)
+            return {"key": key, "collection": name, "entries": len(ids)}
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to compact shard '{key}' of project '{project_name}': {str(e)}")
+    
+    def reembed_project(self, project_name: str, target: Optional[str] = None, batch_size: int = 64,
+                        workers: int = 4, keep_old: bool = False,
+                        progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Re-embed a project with ``target`` (``provider:model``, default: current config)
+        
+        Searches keep using the existing collection until the re-embedded copy
+        is swapped in. An interrupted run resumes where it stopped.
+        """
+        from .reembed import Reembedder
+        
+        try:
+            collection_name = self._get_collection_name(project_name)
+            if self.project_exists(project_name) and (self.client.get_collection(collection_name).metadata or {}).get(SHARD_BY_KEY):
+                return self._reembed_shards(project_name, target, batch_size, workers, keep_old, progress)
+            return Reembedder(self, project_name, target, batch_size=batch_size, workers=workers,
+                              progress=progress).run(keep_old=keep_old)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to re-embed project '{project_name}': {str(e)}")
+    
+    def _reembed_shards(self, project_name: str, target: Optional[str], batch_size: int, workers: int,
+                        keep_old: bool, progress: Optional[Callable[[int, int], None]]) -> Dict[str, Any]:
+        """Re-embed a sharded project shard by shard, then switch the project's model"""
+        from .reembed import Reembedder
+        
+        collection_name = self._get_collection_name(project_name)
+        collection = self.client.get_collection(collection_name)
+        if collection.count() > 0:
+            raise ValueError(f"Project '{project_name}' still has entries outside its shards. Run 'shard enable' first.")
+        signature = get_embedding_service_for(target).signature
+        source_model = (collection.metadata or {}).get("embedding_model")
+        summary = {"project": project_name, "from": source_model, "to": signature, "entries": 0, "resumed": 0,
+                   "caught_up": 0, "removed": 0, "seconds": 0.0, "retired_collection": None, "shards": 0}
+        while True:
+            # 移行中に作られたシャードは元のモデルを引き継ぐので、なくなるまで繰り返す
+            pending = [
+                name for name, shard in self._read_collections(collection_name, collection, include_archived=True)
+                if (shard.metadata or {}).get("embedding_model") != signature
+            ]
+            if not pending:
+                with self._writing():
+                    collection = self.client.get_collection(collection_name)
+                    if not any((shard.metadata or {}).get("embedding_model") != signature
+                               for _, shard in self._read_collections(collection_name, collection, include_archived=True)):
+                        metadata = self._settable_metadata(collection)
+                        metadata["embedding_model"] = signature
+                        collection.modify(metadata=metadata)
+                        summary["seconds"] = round(summary["seconds"], 2)
+                        return summary
+                continue
+            for name in pending:
+                result = Reembedder(self, project_name, target, batch_size=batch_size, workers=workers,
+                                    progress=progress, collection_name=name).run(keep_old=keep_old)
+                for key in ("entries", "resumed", "caught_up", "removed", "seconds"):
+                    summary[key] += result[key]
+                summary["shards"] += 1
+            collection = self.client.get_collection(collection_name)
+    
+    def find_duplicates(self, project_name: str, threshold: float = 0.95,
+                        method: str = "auto") -> List[Dict[str, Any]]:
+        """Clusters of entries whose embeddings have cosine similarity >= ``threshold``
+        
+        Each cluster is ``{"entries": [KnowledgeEntry, ...] (newest first),
+        "min_similarity", "max_similarity"}``; largest clusters come first.
+        """
+        from .dedupe import cluster_pairs, find_pairs
+        
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("Threshold must be in (0, 1]")
+        
+        try:
             collection_name = self._get_collection_name(project_name)
             collection = self.client.get_collection(collection_name)
+            targets = self._read_collections(collection_name, collection)
+            # exact エンジンの正規化済み行列をそのまま使う（シャードは縦に連結する）
+            loaded = [self.exact_index.ensure(name, target) for name, target in targets]
+            ids = [doc_id for index in loaded for doc_id in index.ids]
+            owners = [target for (_, target), index in zip(targets, loaded) for _ in index.ids]
+            if len(loaded) == 1:
+                matrix = loaded[0].matrix
+            else:
+                import numpy as np
+                matrix = np.concatenate([np.asarray(index.matrix) for index in loaded if len(index.ids)]) if ids else np.zeros((0, 1), dtype=np.float32)
+            with metrics.span("db.dedupe", entries=len(ids), method=method, shards=len(targets)):
+                clusters = cluster_pairs(find_pairs(matrix, threshold, method))
+            
+            wanted: Dict[int, Tuple[Any, List[str]]] = {}
+            for cluster in clusters:
+                for i in cluster["members"]:
+                    wanted.setdefault(id(owners[i]), (owners[i], []))[1].append(ids[i])
+            by_id = {}
+            for target, target_ids in wanted.values():
+                fetched = target.get(ids=target_ids)
+                by_id.update({
+                    doc_id: KnowledgeEntry.from_chroma_result(doc_id, self._full_text(content, metadata), metadata)
+                    for doc_id, content, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+                })
             
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=max_results
+            result = []
+            for cluster in clusters:
+                entries = [by_id[ids[i]] for i in cluster["members"] if ids[i] in by_id]
+                if len(entries) < 2:
+                    continue
+                entries.sort(key=lambda entry: (entry.created_at, entry.id), reverse=True)
+                result.append({
+                    "entries": entries,
+                    "min_similarity": cluster["min_similarity"],
+                    "max_similarity": cluster["max_similarity"],
+                })
+            return result
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to find duplicates in project '{project_name}': {str(e)}")
+    
+    def merge_duplicates(self, project_name: str, entry_ids: List[str]) -> Dict[str, Any]:
+        """Keep the newest of ``entry_ids`` with the union of all their tags; delete the rest
+        
+        The kept entry's content (and so its embedding) is unchanged, only its
+        tags and ``updated_at`` are rewritten. Returns ``{"kept", "deleted", "tags"}``.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        if len(set(entry_ids)) < 2:
+            raise ValueError("At least two entry IDs are needed to merge")
+        
+        try:
+            collection_name = self._get_collection_name(project_name)
+            with self._writing():
+                collection = self.client.get_collection(collection_name)
+                entries = []
+                owner = {}
+                for name, target, found in self._locate(collection_name, collection, entry_ids):
+                    fetched = target.get(ids=found)
+                    for doc_id, content, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                        entries.append(KnowledgeEntry.from_chroma_result(doc_id, content, metadata))
+                        owner[doc_id] = (name, target)
+                if len(entries) < 2:
+                    raise ValueError("Fewer than two of the given entries exist")
+                
+                entries.sort(key=lambda entry: (entry.created_at, entry.id), reverse=True)
+                keep, others = entries[0], entries[1:]
+                # タグは新しいエントリのものから順に重複なく並べる
+                tags = [*dict.fromkeys(tag for entry in entries for tag in entry.tags)]
+                keep.tags = tags
+                keep.updated_at = datetime.now()
+                owner[keep.id][1].update(ids=[keep.id], metadatas=[keep.to_chroma_metadata()])
+                
+                removed = [entry.id for entry in others]
+                self._delete_located(removed, owner)
+            return {"kept": keep.id, "deleted": removed, "tags": tags}
+        except ValueError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Failed to merge entries in project '{project_name}': {str(e)}")
+    
+    def _get_access_tracker(self) -> AccessTracker:
+        """Open the access stats store on first use"""
+        if self._access_tracker is None:
+            self._access_tracker = AccessTracker(
+                self.db_path / "access_stats.sqlite3", flush_interval=self.config.access_flush_interval
             )
+        return self._access_tracker
+    
+    def _record_access(self, project_name: str, entry_ids: List[str]) -> None:
+        """Count a search/get hit for each entry (buffered; never fails the read)"""
+        if not self.config.access_tracking or not entry_ids:
+            return
+        try:
+            self._get_access_tracker().record(project_name, entry_ids)
+        except Exception as e:
+            import sys
+            print(f"⚠️  Failed to record access stats: {e}", file=sys.stderr)
+    
+    def _get_query_log(self) -> QueryLog:
+        if self._query_log is None:
+            self._query_log = QueryLog(self.db_path / "query_log.jsonl")
+        return self._query_log
+    
+    def _log_queries(self, project_name: str, queries: List[str]) -> None:
+        """Remember searches for replay at warm-up (only if replay is enabled)"""
+        if self.config.warmup_replay_queries > 0:
+            self._get_query_log().record(project_name, queries)
+    
+    def warm_up(self, project_names: Optional[List[str]] = None, replay: Optional[int] = None) -> Dict[str, Any]:
+        """Do up front what the first search would otherwise do lazily
+        
+        Opens the collections of ``project_names`` (default: every project) and
+        runs one query against each, so that indexes and memory maps are
+        loaded; connects to the embedding API; and replays the ``replay`` most
+        recent logged searches (default: ``warmup_replay_queries``). Failures
+        are collected in the result instead of raised. Returns
+        ``{"collections", "entries", "embedding", "replayed", "errors", "seconds"}``.
+        """
+        started = time.perf_counter()
+        replay = self.config.warmup_replay_queries if replay is None else replay
+        result: Dict[str, Any] = {"collections": 0, "entries": 0, "embedding": False, "replayed": 0, "errors": []}
+        
+        with metrics.span("db.warmup") as span:
+            self._refresh_if_stale()
+            if project_names is None:
+                project_names = [
+                    (collection.metadata or {}).get('project_name', collection.name[8:])
+                    for collection in self.client.list_collections() if collection.name.startswith("project_")
+                ]
             
-            # Convert to SearchResult objects
-            search_results = []
-            if results['ids'] and results['ids'][0]:
-                for i, (doc_id, content, metadata, distance) in enumerate(zip(
-                    results['ids'][0],
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )):
-                    # Convert distance to similarity score (ChromaDB uses cosine distance)
-                    similarity_score = 1.0 - distance
-                    
-                    # Skip results below threshold
-                    if similarity_score < self.config.similarity_threshold:
+            embedders: Dict[str, EmbeddingService] = {}
+            for project_name in project_names:
+                try:
+                    collection_name = self._get_collection_name(project_name)
+                    collection = self.client.get_collection(collection_name)
+                    settings = collection.metadata or {}
+                    for name, target in self._read_collections(collection_name, collection):
+                        embedder = self._embedder(target)
+                        embedders.setdefault(embedder.signature, embedder)
+                        result["collections"] += 1
+                        count = target.count()
+                        result["entries"] += count
+                        if not count:
+                            continue
+                        # 保存済みのベクトルで1回検索して、インデックスを読み込ませる
+                        probe = [[float(v) for v in target.get(limit=1, include=["embeddings"])["embeddings"][0]]]
+                        if self._resolve_engine(target, settings) == ENGINE_EXACT:
+                            self._query_exact(name, target, probe, 1, settings)
+                        else:
+                            target.query(query_embeddings=probe, n_results=1)
+                except Exception as e:
+                    result["errors"].append(f"{project_name}: {e}")
+            
+            if not embedders:
+                embedders[embedding_service.signature] = get_embedding_service_for(None)
+            for embedder in embedders.values():
+                try:
+                    embedder.warm_up()
+                    result["embedding"] = True
+                except Exception as e:
+                    # APIキー未設定でも一覧・取得などは使えるので、起動は止めない
+                    result["errors"].append(f"embedding {embedder.signature}: {str(e).strip()}")
+            
+            if replay > 0:
+                by_project: Dict[str, List[str]] = {}
+                for project_name, query in self._get_query_log().recent(replay):
+                    if project_name in project_names:
+                        by_project.setdefault(project_name, []).append(query)
+                for project_name, queries in by_project.items():
+                    try:
+                        # 再生した検索はアクセス統計にもクエリログにも記録しない
+                        items = self.search_knowledge_batch(project_name, queries, record_access=False)
+                        result["replayed"] += sum(1 for item in items if item["error"] is None)
+                    except Exception as e:
+                        result["errors"].append(f"replay {project_name}: {e}")
+            
+            span["collections"] = result["collections"]
+            span["replayed"] = result["replayed"]
+        result["seconds"] = time.perf_counter() - started
+        return result
+    
+    def set_retention_policy(self, project_name: str, policy: RetentionPolicy) -> None:
+        """Store the retention policy of a project (an empty policy removes it)"""
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        with self._writing():
+            collection = self.client.get_collection(self._get_collection_name(project_name))
+            metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+            collection.modify(metadata=policy_to_metadata(metadata, policy))
+    
+    def get_retention_policy(self, project_name: str) -> RetentionPolicy:
+        """Return the retention policy of a project (empty if none is set)"""
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        collection = self.client.get_collection(self._get_collection_name(project_name))
+        return policy_from_metadata(collection.metadata or {})
+    
+    def prune_project(self, project_name: str, dry_run: bool = False,
+                      policy: Optional[RetentionPolicy] = None) -> Dict[str, Any]:
+        """Delete the entries a retention policy (default: the project's own) selects
+        
+        Returns ``{"project", "policy", "removed": [{"id", "reason", "hits",
+        "last_active", "preview"}, ...], "remaining", "dry_run"}``.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        try:
+            collection_name = self._get_collection_name(project_name)
+            collection = self.client.get_collection(collection_name)
+            policy = policy or policy_from_metadata(collection.metadata or {})
+            result: Dict[str, Any] = {"project": project_name, "policy": policy.model_dump(),
+                                      "removed": [], "remaining": collection.count(), "dry_run": dry_run}
+            if policy.is_empty():
+                return result
+            
+            with metrics.span("db.prune", project=project_name) as span:
+                # 本文は不要なのでメタデータだけ取得する
+                owner: Dict[str, Tuple[str, Any]] = {}
+                pairs = []
+                archived_ids = set()
+                for name, target in self._read_collections(collection_name, collection, include_archived=True):
+                    if (target.metadata or {}).get(ARCHIVED_KEY):
+                        # アーカイブ済みのシャードは保持ポリシーの対象外
+                        archived_ids.update(target.get(include=[])["ids"] or [])
                         continue
-                    
-                    entry = KnowledgeEntry.from_chroma_result(doc_id, content, metadata)
-                    search_results.append(SearchResult(
-                        entry=entry,
-                        similarity_score=similarity_score,
-                        rank=i + 1
-                    ))
-            
-            return search_results
+                    fetched = target.get(include=["metadatas"])
+                    for doc_id, metadata in zip(fetched["ids"] or [], fetched["metadatas"] or []):
+                        owner[doc_id] = (name, target)
+                        pairs.append((doc_id, metadata))
+                access = self._get_access_tracker().get(project_name)
+                rows = []
+                for doc_id, metadata in pairs:
+                    metadata = metadata or {}
+                    created = datetime.fromisoformat(metadata["created_at"]).timestamp() if metadata.get("created_at") else 0.0
+                    updated = datetime.fromisoformat(metadata["updated_at"]).timestamp() if metadata.get("updated_at") else created
+                    hits, last_accessed = access.get(doc_id, (0, 0.0))
+                    rows.append({"id": doc_id, "created_at": created, "last_active": max(updated, last_accessed), "hits": hits})
+                
+                by_id = {row["id"]: row for row in rows}
+                selected = select_prunable(rows, policy, datetime.now().timestamp())
+                span["entries"] = len(rows)
+                span["removed"] = len(selected)
+            
+            removed_ids = [doc_id for doc_id, _ in selected]
+            preview_by_id = {}
+            for name in {owner[doc_id][0] for doc_id in removed_ids}:
+                owner_ids = [doc_id for doc_id in removed_ids if owner[doc_id][0] == name]
+                previews = owner[owner_ids[0]][1].get(ids=owner_ids, include=["documents"])
+                preview_by_id.update(zip(previews["ids"] or [], previews["documents"] or []))
+            if removed_ids and not dry_run:
+                with self._writing():
+                    self._delete_located(removed_ids, owner)
+            
+            # 他の経路で削除されたエントリの統計もここで片付ける
+            stale = [doc_id for doc_id in access if doc_id not in by_id and doc_id not in archived_ids]
+            if not dry_run and (removed_ids or stale):
+                self._get_access_tracker().forget(project_name, removed_ids + stale)
+            
+            result["removed"] = [
+                {
+                    "id": doc_id,
+                    "reason": reason,
+                    "hits": by_id[doc_id]["hits"],
+                    "last_active": datetime.fromtimestamp(by_id[doc_id]["last_active"]).isoformat(),
+                    "preview": (preview_by_id.get(doc_id) or "")[:80],
+                }
+                for doc_id, reason in selected
+            ]
+            result["remaining"] = len(rows) - len(selected)
+            return result
+        except ValueError:
+            raise
         except Exception as e:
-            raise RuntimeError(f"Failed to search in project '{project_name}': {str(e)}")
+            raise RuntimeError(f"Failed to prune project '{project_name}': {str(e)}")
+    
+    def prune_projects(self, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Apply the retention policy of every project that has one"""
+        self._refresh_if_stale()
+        results = []
+        for collection in self.client.list_collections():
+            if not collection.name.startswith("project_"):
+                continue
+            metadata = collection.metadata or {}
+            if policy_from_metadata(metadata).is_empty():
+                continue
+            results.append(self.prune_project(metadata.get('project_name', collection.name[8:]), dry_run=dry_run))
+        return results
+    
+    def start_retention_worker(self, interval: Optional[float] = None) -> None:
+        """Apply retention policies every ``interval`` seconds in this (long-running) process"""
+        interval = self.config.auto_prune_interval if interval is None else interval
+        if interval <= 0 or (self._retention_worker is not None and self._retention_worker.is_alive()):
+            return
+        self._retention_worker = RetentionWorker(self.prune_projects, interval)
+        self._retention_worker.start()
+    
+    def pack_blobs(self, project_name: Optional[str] = None,
+                   progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, int]:
+        """Move existing bodies over ``blob_threshold_chars`` into the blob store
+        
+        Embeddings are kept as they are (they were computed from the same full
+        text). Returns project name -> entries packed.
+        """
+        threshold = self.config.blob_threshold_chars
+        if threshold <= 0:
+            raise ValueError("blob_threshold_chars is 0 (disabled); set it in the config first.")
+        if project_name is not None and not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        
+        self._refresh_if_stale()
+        packed: Dict[str, int] = {}
+        for collection in self.client.list_collections():
+            metadata = collection.metadata or {}
+            if not collection.name.startswith("project_"):
+                continue
+            name = metadata.get('project_name', collection.name[8:])
+            if project_name is not None and name != project_name:
+                continue
+            packed[name] = 0
+            for _, target in self._read_collections(collection.name, collection, include_archived=True):
+                fetched = target.get(include=["documents", "metadatas", "embeddings"])
+                positions = [
+                    i for i, (document, entry_metadata) in enumerate(zip(fetched["documents"], fetched["metadatas"]))
+                    if len(document or "") > threshold and not (entry_metadata or {}).get(BLOB_DIGEST_KEY)
+                ]
+                if not positions:
+                    continue
+                with self._writing():
+                    documents, metadatas = self._pack_bodies(
+                        [fetched["documents"][i] for i in positions], [fetched["metadatas"][i] for i in positions]
+                    )
+                    # 埋め込みを渡さないと Chroma が既定の関数で計算し直すので、そのまま渡す
+                    target.update(
+                        ids=[fetched["ids"][i] for i in positions],
+                        embeddings=[fetched["embeddings"][i] for i in positions],
+                        documents=documents,
+                        metadatas=metadatas
+                    )
+                packed[name] += len(positions)
+                if progress is not None:
+                    progress(name, packed[name], len(fetched["ids"]))
+        return packed
+    
+    def blob_stats(self) -> Dict[str, Any]:
+        """{"blobs", "bytes", "codec", "threshold"} of the blob store"""
+        store = self._get_blob_store()
+        return {**store.stats(), "codec": store.codec, "threshold": self.config.blob_threshold_chars}
+    
+    def collect_blob_garbage(self, dry_run: bool = False) -> Dict[str, int]:
+        """Delete blob files that no entry of any project refers to"""
+        self._refresh_if_stale()
+        # 参照の収集から削除までの間に新しい blob が書かれないよう、書き込みロックを取る
+        with self._writing():
+            referenced = set()
+            for collection in self.client.list_collections():
+                fetched = collection.get(include=["metadatas"])
+                referenced.update(
+                    metadata[BLOB_DIGEST_KEY] for metadata in fetched["metadatas"] or []
+                    if metadata and metadata.get(BLOB_DIGEST_KEY)
+                )
+            return self._get_blob_store().collect_garbage(referenced, dry_run=dry_run)
     
     def get_knowledge_by_id(self, project_name: str, entry_id: str) -> Optional[KnowledgeEntry]:
         """Get a specific knowledge entry by ID (supports partial ID)"""
@@ -180,34 +1531,43 @@ class ChromaMemoDatabase:
         try:
             collection_name = self._get_collection_name(project_name)
             collection = self.client.get_collection(collection_name)
+            targets = self._read_collections(collection_name, collection, include_archived=True)
             
             # First try exact match
-            results = collection.get(ids=[entry_id])
+            for _, target in targets:
+                results = target.get(ids=[entry_id])
+                
+                if results['ids'] and results['ids'][0]:
+                    # Exact match found
+                    doc_id = results['ids'][0]
+                    content = results['documents'][0]
+                    metadata = results['metadatas'][0]
+                    self._record_access(project_name, [doc_id])
+                    return KnowledgeEntry.from_chroma_result(doc_id, self._full_text(content, metadata), metadata)
             
-            if results['ids'] and results['ids'][0]:
-                # Exact match found
-                doc_id = results['ids'][0]
-                content = results['documents'][0]
-                metadata = results['metadatas'][0]
-                return KnowledgeEntry.from_chroma_result(doc_id, content, metadata)
+            # Entries still waiting in the ingest queue
+            queued = self._get_queued_entry(entry_id)
+            if queued is not None and queued.project == project_name:
+                return queued
             
             # If not found and entry_id is short (partial ID), search through all entries
             if len(entry_id) < 36:  # UUID is 36 chars
-                all_results = collection.get()
-                if all_results['ids']:
+                # IDだけを取得して前方一致を探し、本文は一致した1件だけ読む
+                owner = {}
+                for _, target in targets:
+                    owner.update((doc_id, target) for doc_id in target.get(include=[])['ids'] or [])
+                if owner:
                     # Find entries that start with the partial ID
-                    matching_entries = []
-                    for i, doc_id in enumerate(all_results['ids']):
-                        if doc_id.startswith(entry_id):
-                            matching_entries.append(i)
+                    matching_entries = [doc_id for doc_id in owner if doc_id.startswith(entry_id)]
                     
                     if len(matching_entries) == 1:
                         # Exactly one match found
-                        idx = matching_entries[0]
+                        match = owner[matching_entries[0]].get(ids=matching_entries)
+                        self._record_access(project_name, match['ids'][:1])
                         return KnowledgeEntry.from_chroma_result(
-                            all_results['ids'][idx],
-                            all_results['documents'][idx],
-                            all_results['metadatas'][idx]
+                            match['ids'][0],
+                            self._full_text(match['documents'][0], match['metadatas'][0]),
+                            match['metadatas'][0]
                         )
                     elif len(matching_entries) > 1:
                         # Multiple matches found
@@ -227,49 +1587,162 @@ class ChromaMemoDatabase:
         
         try:
             collection_name = self._get_collection_name(project_name)
-            collection = self.client.get_collection(collection_name)
             
-            # Check if entry exists
-            try:
-                results = collection.get(ids=[entry_id])
-                if not results['ids']:
-                    return False  # Entry doesn't exist
-            except Exception:
-                return False
-            
-            # Delete the entry
-            collection.delete(ids=[entry_id])
+            # Delete the entry (シャーディングされていれば、それを持つシャードから)
+            with self._writing():
+                # 非同期取り込みでまだインデックスされていないエントリはキューから消す
+                removed = self._remove_queued(project_name, [entry_id])
+                collection = self.client.get_collection(collection_name)
+                located = self._locate(collection_name, collection, [entry_id])
+                if not located:
+                    return bool(removed)
+                for name, target, found in located:
+                    target.delete(ids=found)
+                    self._sync_exact_index_remove(name, found)
             return True
         except Exception as e:
             raise RuntimeError(f"Failed to delete knowledge from project '{project_name}': {str(e)}")
     
-    def list_knowledge(self, project_name: str) -> List[KnowledgeEntry]:
-        """List all knowledge in a project"""
+    def delete_knowledge_batch(self, project_name: str, entry_ids: List[str]) -> int:
+        """Delete several entries with one Chroma write; returns the number deleted"""
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        if not entry_ids:
+            return 0
+        
+        try:
+            collection_name = self._get_collection_name(project_name)
+            deleted = set()
+            with self._writing():
+                # 非同期取り込みでまだインデックスされていないエントリはキューから消す
+                deleted.update(self._remove_queued(project_name, entry_ids))
+                collection = self.client.get_collection(collection_name)
+                for name, target, found in self._locate(collection_name, collection, entry_ids):
+                    target.delete(ids=found)
+                    self._sync_exact_index_remove(name, found)
+                    deleted.update(found)
+            return len(deleted)
+        except Exception as e:
+            raise RuntimeError(f"Failed to delete knowledge from project '{project_name}': {str(e)}")
+    
+    def list_knowledge(self, project_name: str, since: Optional[str] = None,
+                       until: Optional[str] = None) -> EntryRows:
+        """List all knowledge in a project (newest first) as a columnar result set
+        
+        ``since`` / ``until`` (ISO 8601) keep only entries created in
+        [since, until); shards outside the range are not read.
+        """
         if not self.project_exists(project_name):
             raise ValueError(f"Project '{project_name}' does not exist.")
         
         try:
             collection_name = self._get_collection_name(project_name)
             collection = self.client.get_collection(collection_name)
+            since = datetime.fromisoformat(since).isoformat() if since else None
+            until = datetime.fromisoformat(until).isoformat() if until else None
+            targets = self._read_collections(collection_name, collection, since, until)
             
             # Get all entries
-            results = collection.get()
-            
-            entries = []
-            if results['ids']:
-                for doc_id, content, metadata in zip(
-                    results['ids'],
-                    results['documents'],
-                    results['metadatas']
-                ):
-                    entry = KnowledgeEntry.from_chroma_result(doc_id, content, metadata)
-                    entries.append(entry)
+            with metrics.span("db.list.fetch", project=project_name, shards=len(targets)) as span:
+                if len(targets) == 1 and not (since or until):
+                    results = targets[0][1].get()
+                else:
+                    results = {"ids": [], "documents": [], "metadatas": []}
+                    for _, target in targets:
+                        fetched = target.get()
+                        for row in zip(fetched['ids'] or [], fetched['documents'] or [], fetched['metadatas'] or []):
+                            if (since or until) and not in_range((row[2] or {}).get('created_at', ''), since, until):
+                                continue
+                            results["ids"].append(row[0])
+                            results["documents"].append(row[1])
+                            results["metadatas"].append(row[2])
+                span["results"] = len(results['ids'] or [])
             
             # Sort by creation date (newest first)
-            entries.sort(key=lambda x: x.created_at, reverse=True)
-            return entries
+            with metrics.span("db.list.convert"):
+                # blob に保存された本文は、全文が必要になったときに読む
+                return EntryRows.from_chroma(results, loader=self._load_blob).sorted_by_created(reverse=True)
+        except Exception as e:
+            raise RuntimeError(f"Failed to list knowledge in project '{project_name}': {str(e)}")
+    
+    def iter_knowledge(self, project_name: str, since: Optional[str] = None, until: Optional[str] = None,
+                       limit: Optional[int] = None, page_size: int = 500,
+                       include_content: bool = True) -> Iterator[EntryRows]:
+        """``list_knowledge`` in pages (newest first) for streaming output
+        
+        Only the metadata is read up front, to order the entries; bodies are
+        fetched one page at a time, and not at all if ``include_content`` is
+        False. At most ``limit`` entries are produced.
+        """
+        if not self.project_exists(project_name):
+            raise ValueError(f"Project '{project_name}' does not exist.")
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        
+        try:
+            collection_name = self._get_collection_name(project_name)
+            collection = self.client.get_collection(collection_name)
+            since = datetime.fromisoformat(since).isoformat() if since else None
+            until = datetime.fromisoformat(until).isoformat() if until else None
+            
+            ids: List[str] = []
+            metadatas: List[Dict[str, Any]] = []
+            owners: List[Any] = []
+            with metrics.span("db.list.fetch", project=project_name, streaming=True) as span:
+                for _, target in self._read_collections(collection_name, collection, since, until):
+                    fetched = target.get(include=["metadatas"])
+                    for doc_id, metadata in zip(fetched['ids'] or [], fetched['metadatas'] or []):
+                        if (since or until) and not in_range((metadata or {}).get('created_at', ''), since, until):
+                            continue
+                        ids.append(doc_id)
+                        metadatas.append(metadata)
+                        owners.append(target)
+                span["results"] = len(ids)
+            
+            # ページの行は同じ documents リストを共有するので、ページごとに埋めて渡す
+            documents: List[Optional[str]] = [None] * len(ids)
+            rows = EntryRows(ids, documents, metadatas, loader=self._load_blob).sorted_by_created(reverse=True)
+            if limit is not None:
+                rows = rows[:max(0, limit)]
+            position = {doc_id: index for index, doc_id in enumerate(ids)} if include_content else {}
         except Exception as e:
             raise RuntimeError(f"Failed to list knowledge in project '{project_name}': {str(e)}")
+        
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            indices = [position[row.id] for row in page] if include_content else []
+            if indices:
+                wanted: Dict[int, Tuple[Any, List[str]]] = {}
+                for index in indices:
+                    wanted.setdefault(id(owners[index]), (owners[index], []))[1].append(ids[index])
+                for target, target_ids in wanted.values():
+                    fetched = target.get(ids=target_ids, include=["documents"])
+                    for doc_id, document in zip(fetched['ids'] or [], fetched['documents'] or []):
+                        documents[position[doc_id]] = document
+            yield page
+            # 出力済みのページの本文は保持しない
+            for index in indices:
+                documents[index] = None
+    
+    def iter_projects(self) -> Iterator[ProjectInfo]:
+        """``list_projects`` one project at a time, in storage order (unsorted)"""
+        self._refresh_if_stale()
+        try:
+            collections = self.client.list_collections()
+        except Exception as e:
+            raise RuntimeError(f"Failed to list projects: {str(e)}")
+        
+        for collection in collections:
+            if not collection.name.startswith("project_"):
+                continue
+            # Extract project name from collection name
+            project_name = (collection.metadata or {}).get('project_name', collection.name[8:])
+            try:
+                project_info = self.get_project_info(project_name)
+            except Exception:
+                # Skip collections that can't be processed
+                continue
+            yield project_info
     
     def get_project_info(self, project_name: str) -> ProjectInfo:
         """Get project information"""
@@ -283,52 +1756,48 @@ class ChromaMemoDatabase:
             # Get collection metadata
             collection_metadata = collection.metadata or {}
             
-            # Count entries
-            results = collection.get()
-            total_entries = len(results['ids']) if results['ids'] else 0
+            # Count entries (シャーディングされていれば全シャードの合計)
+            targets = self._read_collections(collection_name, collection, include_archived=True)
+            total_entries = sum(target.count() for _, target in targets)
             
             # Get creation date from metadata
             created_at_str = collection_metadata.get('created_at')
             created_at = datetime.fromisoformat(created_at_str) if created_at_str else datetime.now()
             
             # Get last updated (from most recent entry)
+            # 本文は不要なのでメタデータだけ取得し、ISO文字列のまま比較する
             last_updated = None
             if total_entries > 0:
-                entries = self.list_knowledge(project_name)
-                if entries:
-                    last_updated = max(entry.updated_at for entry in entries)
+                updated = []
+                for _, target in targets:
+                    metadatas = target.get(include=["metadatas"])['metadatas'] or []
+                    updated.extend(m.get('updated_at') for m in metadatas if m and m.get('updated_at'))
+                if updated:
+                    last_updated = datetime.fromisoformat(max(updated))
             
             return ProjectInfo(
                 name=project_name,
                 total_entries=total_entries,
                 created_at=created_at,
-                last_updated=last_updated
+                last_updated=last_updated,
+                embedding_model=collection_metadata.get('embedding_model'),
+                shard_by=collection_metadata.get(SHARD_BY_KEY),
+                shards=len(shard_keys(collection_metadata))
             )
         except Exception as e:
             raise RuntimeError(f"Failed to get info for project '{project_name}': {str(e)}")
     
     def list_projects(self) -> List[ProjectInfo]:
         """List all projects"""
-        try:
-            collections = self.client.list_collections()
-            projects = []
-            
-            for collection in collections:
-                if collection.name.startswith("project_"):
-                    # Extract project name from collection name
-                    project_name = collection.metadata.get('project_name', collection.name[8:])
-                    try:
-                        project_info = self.get_project_info(project_name)
-                        projects.append(project_info)
-                    except Exception:
-                        # Skip collections that can't be processed
-                        continue
-            
-            # Sort by creation date (newest first)
-            projects.sort(key=lambda x: x.created_at, reverse=True)
-            return projects
-        except Exception as e:
-            raise RuntimeError(f"Failed to list projects: {str(e)}")
+        projects = [*self.iter_projects()]
+        # Sort by creation date (newest first)
+        projects.sort(key=lambda x: x.created_at, reverse=True)
+        return projects
+
+
+def _empty_result(rows: int) -> Dict[str, Any]:
+    return {"ids": [[] for _ in range(rows)], "documents": [[] for _ in range(rows)],
+            "metadatas": [[] for _ in range(rows)], "distances": [[] for _ in range(rows)]}
 
 
 # Global database instance (遅延初期化)
@@ -0,0 +1,129 @@
+"""
+Near-duplicate detection over a project's stored embeddings
+
+正規化済みの埋め込み行列から、コサイン類似度がしきい値以上の組を探す。
+小〜中規模ではブロック単位の行列積で全組を調べ、大規模では
+ランダム超平面の LSH (SimHash をバンドに分割) で候補を絞ってから
+類似度を確認する。見つかった組は union-find でクラスタにまとめる。
+"""
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+
+METHOD_AUTO = "auto"
+METHOD_EXACT = "exact"
+METHOD_LSH = "lsh"
+METHODS = (METHOD_AUTO, METHOD_EXACT, METHOD_LSH)
+
+# auto でこの件数を超えたら LSH を使う
+LSH_MIN_ENTRIES = 20000
+# 行列積1回あたりの行数（一時メモリは _BLOCK_ROWS^2 * 4 バイト程度）
+_BLOCK_ROWS = 2048
+# LSH: 1バンドのビット数とバンド数。cos 0.9 の組を約94%、0.95 の組を99%以上拾う
+_LSH_BITS = 12
+_LSH_BANDS = 16
+_LSH_SEED = 0
+
+Pair = Tuple[int, int, float]
+
+
+def _exact_pairs(matrix: np.ndarray, threshold: float) -> List[Pair]:
+    """All pairs i < j with cosine >= threshold, by blocked matrix multiplication"""
+    pairs: List[Pair] = []
+    n = matrix.shape[0]
+    for start in range(0, n, _BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _BLOCK_ROWS])
+        # 上三角（自分以降の行）だけを計算する
+        for other in range(start, n, _BLOCK_ROWS):
+            scores = block @ np.asarray(matrix[other:other + _BLOCK_ROWS]).T
+            rows, cols = np.nonzero(scores >= threshold)
+            for row, col in zip(rows, cols):
+                i, j = start + int(row), other + int(col)
+                if i < j:
+                    pairs.append((i, j, float(scores[row, col])))
+    return pairs
+
+
+def _lsh_pairs(matrix: np.ndarray, threshold: float) -> List[Pair]:
+    """Pairs with cosine >= threshold among LSH bucket collisions (may miss a few)"""
+    n, dim = matrix.shape
+    rng = np.random.default_rng(_LSH_SEED)
+    planes = rng.standard_normal((dim, _LSH_BITS * _LSH_BANDS)).astype(np.float32)
+    weights = (1 << np.arange(_LSH_BITS, dtype=np.int64))
+
+    keys = np.empty((n, _LSH_BANDS), dtype=np.int64)
+    for start in range(0, n, _BLOCK_ROWS):
+        bits = (np.asarray(matrix[start:start + _BLOCK_ROWS]) @ planes) > 0
+        keys[start:start + bits.shape[0]] = bits.reshape(-1, _LSH_BANDS, _LSH_BITS) @ weights
+
+    # 候補の組は i * n + j に符号化して重複を除く
+    encoded: List[np.ndarray] = []
+    for band in range(_LSH_BANDS):
+        order = np.argsort(keys[:, band], kind="stable")
+        # 同じキーが続く区間がバケット
+        boundaries = np.flatnonzero(np.diff(keys[order, band])) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+            bucket = np.sort(bucket)
+            a, b = np.triu_indices(len(bucket), 1)
+            encoded.append(bucket[a] * n + bucket[b])
+    if not encoded:
+        return []
+    candidates = np.unique(np.concatenate(encoded))
+
+    pairs: List[Pair] = []
+    chunk = _BLOCK_ROWS * 8
+    for start in range(0, len(candidates), chunk):
+        i, j = np.divmod(candidates[start:start + chunk], n)
+        scores = np.einsum("ij,ij->i", np.asarray(matrix[i]), np.asarray(matrix[j]))
+        for k in np.flatnonzero(scores >= threshold):
+            pairs.append((int(i[k]), int(j[k]), float(scores[k])))
+    return pairs
+
+
+def find_pairs(matrix: np.ndarray, threshold: float, method: str = METHOD_AUTO) -> List[Pair]:
+    """(i, j, cosine) for rows of a normalized matrix with cosine >= ``threshold``"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown dedupe method '{method}'. Choose from: {', '.join(METHODS)}")
+    if matrix.shape[0] < 2:
+        return []
+    if method == METHOD_LSH or (method == METHOD_AUTO and matrix.shape[0] > LSH_MIN_ENTRIES):
+        return _lsh_pairs(matrix, threshold)
+    return _exact_pairs(matrix, threshold)
+
+
+def cluster_pairs(pairs: List[Pair]) -> List[Dict[str, Any]]:
+    """Group pairs into connected components with union-find
+
+    Returns ``{"members": [row, ...], "min_similarity", "max_similarity"}``
+    per cluster, largest first.
+    """
+    parent: Dict[int, int] = {}
+
+    def find(x: int) -> int:
+        root = x
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    for i, j, _ in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    members: Dict[int, set] = {}
+    scores: Dict[int, List[float]] = {}
+    for i, j, score in pairs:
+        root = find(i)
+        members.setdefault(root, set()).update((i, j))
+        scores.setdefault(root, []).append(score)
+    clusters = [
+        {"members": sorted(members[root]), "min_similarity": min(scores[root]), "max_similarity": max(scores[root])}
+        for root in members
+    ]
+    clusters.sort(key=lambda cluster: (-len(cluster["members"]), cluster["members"][0]))
+    return clusters
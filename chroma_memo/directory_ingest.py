@@ -0,0 +1,234 @@
+"""
+Incremental ingestion of a directory of text files
+
+ファイルのパス → サイズ・更新時刻・内容のハッシュ → エントリIDのマニフェストを
+保存し、再実行時は追加・変更されたファイルだけを読み込んで埋め込み直し、
+削除されたファイルのエントリを消す。サイズと更新時刻が変わっていなければ
+ファイルを開かないので、変更のないツリーではデータベースも埋め込みAPIも
+使わずに終わる。
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .models import SourceType
+
+
+MANIFEST_VERSION = 1
+DEFAULT_PATTERNS = ("*.md",)
+DEFAULT_CHUNK_CHARS = 1500
+
+_HEADING = re.compile(r"^#{1,6}\s")
+
+
+def manifest_path(db_path: Path, project_name: str, root: Path) -> Path:
+    """One manifest per (project, directory) under ``<db_path>/manifests``"""
+    key = hashlib.sha1(f"{project_name}\0{root}".encode("utf-8")).hexdigest()[:16]
+    return db_path / "manifests" / f"{key}.json"
+
+
+def load_manifest(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def save_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    # 書きかけのマニフェストを残さないよう、一時ファイルから置き換える
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _matches(rel: str, patterns: Sequence[str]) -> bool:
+    name = rel.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(rel, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def scan(root: Path, patterns: Sequence[str]) -> Dict[str, os.stat_result]:
+    """Relative POSIX path -> stat of every matching file (hidden directories skipped)"""
+    found: Dict[str, os.stat_result] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if _matches(rel, patterns):
+                found[rel] = os.stat(path)
+    return found
+
+
+def chunk_text(text: str, max_chars: int = DEFAULT_CHUNK_CHARS) -> List[str]:
+    """Split at Markdown headings, then pack paragraphs into chunks of at most ``max_chars``"""
+    sections: List[List[str]] = [[]]
+    for line in text.splitlines():
+        if _HEADING.match(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    chunks: List[str] = []
+    for section in sections:
+        current = ""
+        for paragraph in re.split(r"\n\s*\n", "\n".join(section)):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            # 1段落が長すぎる場合は強制的に分割する
+            pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)]
+            for piece in pieces:
+                if current and len(current) + len(piece) + 2 > max_chars:
+                    chunks.append(current)
+                    current = ""
+                current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _read(root: Path, rel: str, max_chars: int) -> Tuple[str, Optional[str], List[str]]:
+    """(path, sha256 or None if unreadable, chunks)"""
+    try:
+        with open(root / rel, "rb") as f:
+            data = f.read()
+        text = data.decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return rel, None, []
+    return rel, hashlib.sha256(data).hexdigest(), chunk_text(text, max_chars)
+
+
+class DirectoryIngest:
+    """Plans and applies the changes needed to mirror ``root`` into a project"""
+
+    def __init__(self, project_name: str, root: Path, db_path: Path,
+                 patterns: Sequence[str] = DEFAULT_PATTERNS, chunk_chars: int = DEFAULT_CHUNK_CHARS,
+                 tags: Optional[List[str]] = None, workers: int = 4, batch_size: int = 64):
+        self.project_name = project_name
+        self.root = Path(root).expanduser().resolve()
+        self.patterns = [*patterns] or [*DEFAULT_PATTERNS]
+        self.chunk_chars = max(100, chunk_chars)
+        self.tags = tags or []
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.manifest_path = manifest_path(db_path, project_name, self.root)
+        self.manifest = load_manifest(self.manifest_path)
+        if self.manifest.get("chunk_chars") != self.chunk_chars:
+            # 分割方法が変わったら全ファイルを取り込み直す
+            for record in self.manifest["files"].values():
+                record["sha256"] = None
+        self.manifest.update({"project": project_name, "root": str(self.root), "chunk_chars": self.chunk_chars})
+
+    def plan(self) -> Dict[str, Any]:
+        """Find added, changed and removed files; only files whose size or mtime moved are read"""
+        if not self.root.is_dir():
+            raise ValueError(f"Directory '{self.root}' does not exist.")
+        files = self.manifest["files"]
+        current = scan(self.root, self.patterns)
+
+        candidates = [
+            rel for rel, st in current.items()
+            if rel not in files
+            or files[rel].get("size") != st.st_size
+            or files[rel].get("mtime_ns") != st.st_mtime_ns
+            or not files[rel].get("sha256")
+        ]
+        changed: List[Dict[str, Any]] = []
+        touched: List[str] = []
+        unreadable: List[str] = []
+        if candidates:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for rel, digest, chunks in pool.map(lambda rel: _read(self.root, rel, self.chunk_chars), candidates):
+                    st = current[rel]
+                    if digest is None:
+                        unreadable.append(rel)
+                    elif rel in files and files[rel].get("sha256") == digest:
+                        # 内容は同じ（touch されただけ）
+                        files[rel].update({"size": st.st_size, "mtime_ns": st.st_mtime_ns})
+                        touched.append(rel)
+                    else:
+                        changed.append({"path": rel, "sha256": digest, "chunks": chunks,
+                                        "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+
+        return {
+            "changed": sorted(changed, key=lambda item: item["path"]),
+            "removed": sorted(rel for rel in files if rel not in current),
+            "touched": touched,
+            "unreadable": sorted(unreadable),
+            "unchanged": len(current) - len(candidates),
+            "total": len(current),
+        }
+
+    def apply(self, db, plan: Dict[str, Any],
+              progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Embed changed files in batches, then drop their old entries and removed files' entries
+
+        The manifest is saved after every batch, so an interrupted run only
+        redoes the files whose batch had not been written.
+        """
+        files = self.manifest["files"]
+        say = progress or (lambda done, total: None)
+        summary = {"added": 0, "updated": 0, "removed": 0, "chunks": 0, "failed": [], "deleted_entries": 0}
+
+        def flush(group: List[Dict[str, Any]]) -> None:
+            items = [
+                {
+                    "content": f"{item['path']}\n\n{chunk}",
+                    "tags": self.tags,
+                    "source": SourceType.IMPORT.value,
+                    "metadata": {"source_path": item["path"], "chunk_index": index},
+                }
+                for item in group
+                for index, chunk in enumerate(item["chunks"])
+            ]
+            results = db.add_knowledge_batch(self.project_name, items) if items else []
+            offset = 0
+            for item in group:
+                item_results = results[offset:offset + len(item["chunks"])]
+                offset += len(item["chunks"])
+                new_ids = [result["id"] for result in item_results if result["id"]]
+                if len(new_ids) != len(item["chunks"]):
+                    # 一部だけ登録された場合は取り消し、次回に再試行する
+                    db.delete_knowledge_batch(self.project_name, new_ids)
+                    summary["failed"].append(item["path"])
+                    continue
+                previous = files.get(item["path"])
+                if previous and previous.get("ids"):
+                    summary["deleted_entries"] += db.delete_knowledge_batch(self.project_name, previous["ids"])
+                summary["updated" if previous else "added"] += 1
+                summary["chunks"] += len(new_ids)
+                files[item["path"]] = {"size": item["size"], "mtime_ns": item["mtime_ns"],
+                                       "sha256": item["sha256"], "ids": new_ids}
+            save_manifest(self.manifest_path, self.manifest)
+
+        changed = plan["changed"]
+        group: List[Dict[str, Any]] = []
+        pending_chunks = 0
+        for done, item in enumerate(changed, 1):
+            group.append(item)
+            pending_chunks += len(item["chunks"])
+            # 複数ファイルのチャンクをまとめて1回の埋め込みリクエストにする
+            if pending_chunks >= self.batch_size or done == len(changed):
+                flush(group)
+                group, pending_chunks = [], 0
+                say(done, len(changed))
+
+        for rel in plan["removed"]:
+            summary["deleted_entries"] += db.delete_knowledge_batch(self.project_name, files[rel].get("ids") or [])
+            del files[rel]
+            summary["removed"] += 1
+        save_manifest(self.manifest_path, self.manifest)
+        return summary
+
+    def save(self) -> None:
+        save_manifest(self.manifest_path, self.manifest)
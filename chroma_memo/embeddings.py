@@ -1,30 +1,66 @@
 """
 Embedding utilities for Chroma-Memo
 """
+import math
 import os
-import openai
-from typing import List, Union
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
 from .config import config_manager
+from .metrics import metrics
+
+
+# オフライン用ハッシュ埋め込みの次元数
+HASH_EMBEDDING_DIM = 384
+
+
+def hash_embedding(text: str, dim: int = HASH_EMBEDDING_DIM) -> List[float]:
+    """Deterministic offline embedding from hashed character trigrams
+    
+    Needs no network or API key, and gives the same vector for the same text
+    on every machine, so it is used for benchmarks and offline testing.
+    Texts sharing many trigrams (in any script) get similar vectors.
+    """
+    vector = [0.0] * dim
+    padded = f"  {text.lower()}  "
+    for i in range(len(padded) - 2):
+        h = zlib.crc32(padded[i:i + 3].encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
 
 
 class EmbeddingService:
-    """Service for generating embeddings using OpenAI or Google"""
+    """Service for generating embeddings using OpenAI or Google (or offline hashing)"""
     
-    def __init__(self):
+    def __init__(self, use_api: Optional[str] = None, model: Optional[str] = None):
+        """``use_api``/``model`` override USE_API and ``embedding_model`` (e.g. for re-embedding)"""
         self.config = config_manager.load_config()
-        self.use_api = os.getenv("USE_API", "OPENAI").upper()
+        self.use_api = (use_api or os.getenv("USE_API", "OPENAI")).upper()
         self._client = None
         self._initialized = False
         
-        if self.use_api == "GOOGLE":
-            self.google_model = "text-embedding-004"
+        if self.use_api == "HASH":
+            self.model = f"trigram-{HASH_EMBEDDING_DIM}"
+        elif self.use_api == "GOOGLE":
+            self.google_model = model or "text-embedding-004"
+            self.model = self.google_model
+        else:
+            self.model = model or self.config.embedding_model
+    
+    @property
+    def signature(self) -> str:
+        """``provider:model`` recorded on collections embedded by this service"""
+        return f"{self.use_api.lower()}:{self.model}"
     
     def _ensure_initialized(self):
         """遅延初期化 - 実際に使用する時にAPIキーをチェック"""
         if self._initialized:
             return
             
-        if self.use_api == "GOOGLE":
+        if self.use_api == "HASH":
+            # オフラインのハッシュ埋め込みはAPIキー不要
+            pass
+        elif self.use_api == "GOOGLE":
             import google.generativeai as genai
             api_key = os.getenv("GOOGLE_API_KEY")
             if not api_key:
@@ -37,9 +73,16 @@ class EmbeddingService:
                 )
             genai.configure(api_key=api_key)
         else:  # OpenAI
+            # openai は重いので実際に使うときまで import しない
+            import openai
             try:
                 api_key = config_manager.get_api_key()
-                self._client = openai.OpenAI(api_key=api_key)
+                self._client = openai.OpenAI(
+                    api_key=api_key,
+                    timeout=self.config.embedding_timeout,
+                    max_retries=self.config.embedding_max_retries,
+                    http_client=self._build_http_client(openai),
+                )
             except ValueError as e:
                 # より親切なエラーメッセージに置き換え
                 raise ValueError(
@@ -53,11 +96,68 @@ class EmbeddingService:
         
         self._initialized = True
         
+    def _build_http_client(self, openai_module):
+        """httpx client with a keep-alive pool, so requests reuse warm TLS connections"""
+        import httpx
+        
+        # openai の既定値（リダイレクト追従など）を引き継げるなら、そのクラスを使う
+        client_class = getattr(openai_module, "DefaultHttpxClient", httpx.Client)
+        pool_size = max(1, self.config.embedding_pool_connections)
+        return client_class(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=self.config.embedding_keepalive,
+            ),
+            timeout=httpx.Timeout(self.config.embedding_timeout, connect=min(10.0, self.config.embedding_timeout)),
+        )
+    
+    def warm_up(self) -> None:
+        """Create the client and open a pooled connection (raises on failure)
+        
+        Looks up the model's metadata instead of embedding anything, so
+        warming up costs no tokens.
+        """
+        self._ensure_initialized()
+        if self.use_api == "HASH":
+            return
+        # テスト用ダミーキーでは API に接続しない
+        if os.getenv(f"{self.use_api}_API_KEY", "").startswith("test-"):
+            return
+        
+        with metrics.span("embedding.warmup", provider=self.use_api):
+            try:
+                if self.use_api == "GOOGLE":
+                    import google.generativeai as genai
+                    genai.get_model(f"models/{self.google_model}")
+                else:  # OpenAI
+                    assert self._client is not None, "OpenAI client should be initialized"
+                    # GET /models/{model} は課金されず、接続はプールに残る
+                    self._client.models.retrieve(self.model)
+            except Exception as e:
+                raise RuntimeError(f"Failed to connect to the embedding API: {str(e)}")
+    
     def get_embedding(self, text: str) -> List[float]:
         """Get embedding for a single text"""
+        with metrics.span("embedding.request", batch_size=1, chars=len(text)) as span:
+            embedding = self._request_embedding(text)
+            span["provider"] = self.use_api
+            return embedding
+    
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for multiple texts"""
+        with metrics.span("embedding.request", batch_size=len(texts), chars=sum(len(text) for text in texts)) as span:
+            embeddings = self._request_embeddings(texts)
+            span["provider"] = self.use_api
+            return embeddings
+    
+    def _request_embedding(self, text: str) -> List[float]:
         # APIキーの初期化を確認
         self._ensure_initialized()
         
+        if self.use_api == "HASH":
+            return hash_embedding(text)
+        
         try:
             # テスト用ダミーキーの場合はダミーの埋め込みを返す
             if self.use_api == "GOOGLE" and os.getenv("GOOGLE_API_KEY", "").startswith("test-"):
@@ -75,7 +175,7 @@ class EmbeddingService:
             else:  # OpenAI
                 assert self._client is not None, "OpenAI client should be initialized"
                 response = self._client.embeddings.create(
-                    model=self.config.embedding_model,
+                    model=self.model,
                     input=text,
                     encoding_format="float"
                 )
@@ -83,11 +183,13 @@ class EmbeddingService:
         except Exception as e:
             raise RuntimeError(f"Failed to get embedding: {str(e)}")
     
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for multiple texts"""
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
         # APIキーの初期化を確認
         self._ensure_initialized()
         
+        if self.use_api == "HASH":
+            return [hash_embedding(text) for text in texts]
+        
         try:
             # テスト用ダミーキーの場合はダミーの埋め込みを返す
             if self.use_api == "GOOGLE" and os.getenv("GOOGLE_API_KEY", "").startswith("test-"):
@@ -108,7 +210,7 @@ class EmbeddingService:
             else:  # OpenAI
                 assert self._client is not None, "OpenAI client should be initialized"
                 response = self._client.embeddings.create(
-                    model=self.config.embedding_model,
+                    model=self.model,
                     input=texts,
                     encoding_format="float"
                 )
@@ -118,6 +220,8 @@ class EmbeddingService:
     
     def get_embedding_dimension(self) -> int:
         """Get the dimension of embeddings for the current model"""
+        if self.use_api == "HASH":
+            return HASH_EMBEDDING_DIM
         if self.use_api == "GOOGLE":
             # Google's text-embedding-004 has 768 dimensions
             return 768
@@ -128,8 +232,42 @@ class EmbeddingService:
                 "text-embedding-3-large": 3072,
                 "text-embedding-ada-002": 1536,
             }
-            return model_dimensions.get(self.config.embedding_model, 1536)
+            return model_dimensions.get(self.model, 1536)
+
+
+# Global embedding service instance (遅延初期化)
+_embedding_service_instance = None
+
+def get_embedding_service() -> EmbeddingService:
+    """埋め込みサービスを取得（遅延初期化）"""
+    global _embedding_service_instance
+    if _embedding_service_instance is None:
+        _embedding_service_instance = EmbeddingService()
+    return _embedding_service_instance
+
+
+def parse_signature(signature: str) -> Tuple[str, Optional[str]]:
+    """Split ``provider:model`` into (USE_API value, model)"""
+    provider, _, model = signature.partition(":")
+    return provider.upper(), model or None
+
+
+_services_by_signature: Dict[str, EmbeddingService] = {}
+
+def get_embedding_service_for(signature: Optional[str]) -> EmbeddingService:
+    """The service that embeds like ``signature`` (the current one if None or equal)"""
+    current = get_embedding_service()
+    if not signature or signature == current.signature:
+        return current
+    if signature not in _services_by_signature:
+        use_api, model = parse_signature(signature)
+        _services_by_signature[signature] = EmbeddingService(use_api=use_api, model=model)
+    return _services_by_signature[signature]
 
+# Proxyクラスでembedding_serviceオブジェクトをエミュレート
+class EmbeddingServiceProxy:
+    def __getattr__(self, name):
+        return getattr(get_embedding_service(), name)
 
-# Global embedding service instance
-embedding_service = EmbeddingService() 
\ No newline at end of file
+embedding_service = EmbeddingServiceProxy()
+ 
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""
+Exact (brute-force) vector search engine for Chroma-Memo
+
+小〜中規模プロジェクト向けに、正規化済み float32 行列を memory-map して
+行列ベクトル積 + argpartition で完全な近傍探索を行う。
+"""
+import contextlib
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import metrics
+from .quantization import QUANT_NONE, QUANT_INT8, QUANT_BINARY, QuantizedSidecar, recall_report, rescore, top_k
+
+
+ENGINE_EXACT = "exact"
+ENGINE_HNSW = "hnsw"
+ENGINE_AUTO = "auto"
+ENGINES = (ENGINE_EXACT, ENGINE_HNSW, ENGINE_AUTO)
+
+# Rebuild時に一度にChromaから取り出す件数
+_REBUILD_PAGE_SIZE = 1000
+
+
+def normalize_rows(vectors: Any) -> np.ndarray:
+    """Return a float32 matrix with L2-normalized rows"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_to_distance(cosine: np.ndarray, space: str) -> np.ndarray:
+    """Convert cosine similarity into the distance Chroma reports for ``space``
+
+    Rows and queries are unit length, so the squared L2 distance is 2 - 2cos.
+    Returning Chroma's distance keeps ``similarity_threshold`` meaningful for
+    both engines.
+    """
+    if space == "l2":
+        return 2.0 - 2.0 * cosine
+    return 1.0 - cosine
+
+
+class _LoadedIndex:
+    """In-memory view of one collection's index files"""
+
+    __slots__ = ("ids", "matrix", "stamp")
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, stamp: Tuple[int, int]):
+        self.ids = ids
+        self.matrix = matrix
+        self.stamp = stamp
+
+
+class ExactIndex:
+    """Memory-mapped float32 embedding matrices, one per collection
+
+    Layout under ``<root>/<collection_name>/``:
+      - vectors.f32: row-major float32 matrix with normalized rows
+      - ids.txt:     entry IDs, one per line, parallel to the matrix rows
+      - meta.json:   {"dim": int, "count": int}
+    """
+
+    def __init__(self, root: Path, lock: Optional[Any] = None):
+        self.root = Path(root)
+        # 他プロセスと同時に再構築しないためのロック（FileLockなど）
+        self._lock = lock if lock is not None else contextlib.nullcontext()
+        self._cache: Dict[str, _LoadedIndex] = {}
+
+    def _dir(self, collection_name: str) -> Path:
+        return self.root / collection_name
+
+    def _read_meta(self, collection_name: str) -> Optional[Dict[str, int]]:
+        meta_path = self._dir(collection_name) / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, collection_name: str, dim: int, count: int) -> None:
+        meta_path = self._dir(collection_name) / "meta.json"
+        tmp_path = meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "count": count}, f)
+        tmp_path.replace(meta_path)
+
+    def count(self, collection_name: str) -> Optional[int]:
+        """Number of indexed rows, or None if the index has not been built"""
+        meta = self._read_meta(collection_name)
+        return meta["count"] if meta else None
+
+    def clear_cache(self) -> None:
+        """Forget memory-mapped views so that files are re-read on next use"""
+        self._cache.clear()
+
+    def invalidate(self, collection_name: str) -> None:
+        """Drop the on-disk index so that it is rebuilt on next use"""
+        self._cache.pop(collection_name, None)
+        shutil.rmtree(self._dir(collection_name), ignore_errors=True)
+
+    def rebuild(self, collection_name: str, collection: Any) -> None:
+        """Rebuild the index from the embeddings stored in Chroma"""
+        with metrics.span("exact_index.rebuild", collection=collection_name):
+            self._rebuild(collection_name, collection)
+
+    def _rebuild(self, collection_name: str, collection: Any) -> None:
+        self.invalidate(collection_name)
+        index_dir = self._dir(collection_name)
+        index_dir.mkdir(parents=True, exist_ok=True)
+
+        dim = 0
+        count = 0
+        offset = 0
+        with open(index_dir / "vectors.f32", "wb") as vf, \
+                open(index_dir / "ids.txt", "w", encoding="utf-8") as idf:
+            while True:
+                page = collection.get(include=["embeddings"], limit=_REBUILD_PAGE_SIZE, offset=offset)
+                page_ids = page["ids"] or []
+                if not page_ids:
+                    break
+                matrix = normalize_rows(page["embeddings"])
+                dim = matrix.shape[1]
+                vf.write(matrix.tobytes())
+                idf.writelines(f"{doc_id}\n" for doc_id in page_ids)
+                count += len(page_ids)
+                offset += len(page_ids)
+                if len(page_ids) < _REBUILD_PAGE_SIZE:
+                    break
+
+        self._write_meta(collection_name, dim, count)
+
+    def append(self, collection_name: str, ids: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        """Append rows after a write to Chroma (no-op if the index is not built yet)"""
+        meta = self._read_meta(collection_name)
+        if meta is None:
+            return
+        matrix = normalize_rows(embeddings)
+        if meta["count"] and matrix.shape[1] != meta["dim"]:
+            # 次元が変わった場合（埋め込みモデル変更など）は作り直す
+            self.invalidate(collection_name)
+            return
+
+        index_dir = self._dir(collection_name)
+        with open(index_dir / "vectors.f32", "ab") as vf:
+            vf.write(matrix.tobytes())
+        with open(index_dir / "ids.txt", "a", encoding="utf-8") as idf:
+            idf.writelines(f"{doc_id}\n" for doc_id in ids)
+        new_count = meta["count"] + len(ids)
+        self._write_meta(collection_name, matrix.shape[1], new_count)
+        self._cache.pop(collection_name, None)
+
+        # 構築済みのサイドカーには同じ行を追記する
+        for mode in (QUANT_INT8, QUANT_BINARY):
+            sidecar = QuantizedSidecar(index_dir, mode)
+            if sidecar.count() == meta["count"]:
+                sidecar.append(matrix, new_count)
+            else:
+                sidecar.invalidate()
+
+    def remove(self, collection_name: str, ids: Sequence[str]) -> None:
+        """Remove rows after a delete from Chroma (rewrites the files compactly)"""
+        loaded = self._load(collection_name)
+        if loaded is None:
+            return
+        drop = set(ids)
+        keep = [i for i, doc_id in enumerate(loaded.ids) if doc_id not in drop]
+        if len(keep) == len(loaded.ids):
+            return
+
+        kept_ids = [loaded.ids[i] for i in keep]
+        kept_matrix = np.ascontiguousarray(loaded.matrix[keep])
+        dim = loaded.matrix.shape[1]
+        self._cache.pop(collection_name, None)
+        del loaded
+
+        index_dir = self._dir(collection_name)
+        tmp_vectors = index_dir / "vectors.f32.tmp"
+        with open(tmp_vectors, "wb") as vf:
+            vf.write(kept_matrix.tobytes())
+        tmp_vectors.replace(index_dir / "vectors.f32")
+        tmp_ids = index_dir / "ids.txt.tmp"
+        with open(tmp_ids, "w", encoding="utf-8") as idf:
+            idf.writelines(f"{doc_id}\n" for doc_id in kept_ids)
+        tmp_ids.replace(index_dir / "ids.txt")
+        self._write_meta(collection_name, dim, len(kept_ids))
+        for mode in (QUANT_INT8, QUANT_BINARY):
+            QuantizedSidecar(index_dir, mode).invalidate()
+
+    def _load(self, collection_name: str) -> Optional[_LoadedIndex]:
+        """Memory-map the index files, reusing the cached view if unchanged"""
+        meta_path = self._dir(collection_name) / "meta.json"
+        try:
+            stat = meta_path.stat()
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._cache.get(collection_name)
+        if cached is not None and cached.stamp == stamp:
+            metrics.incr("exact_index.cache_hit")
+            return cached
+        metrics.incr("exact_index.cache_miss")
+
+        meta = self._read_meta(collection_name)
+        if meta is None:
+            return None
+        index_dir = self._dir(collection_name)
+        with open(index_dir / "ids.txt", "r", encoding="utf-8") as f:
+            ids = f.read().splitlines()
+        count, dim = meta["count"], meta["dim"]
+        if len(ids) != count:
+            return None
+        if count == 0:
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        else:
+            matrix = np.memmap(index_dir / "vectors.f32", dtype=np.float32, mode="r", shape=(count, dim))
+
+        loaded = _LoadedIndex(ids, matrix, stamp)
+        self._cache[collection_name] = loaded
+        return loaded
+
+    def ensure(self, collection_name: str, collection: Any) -> _LoadedIndex:
+        """Load the index, rebuilding it if it is missing or out of sync with Chroma"""
+        loaded = self._load(collection_name)
+        if loaded is None or len(loaded.ids) != collection.count():
+            with self._lock:
+                # ロック待ちの間に他プロセスが再構築済みかもしれない
+                loaded = self._load(collection_name)
+                if loaded is None or len(loaded.ids) != collection.count():
+                    self.rebuild(collection_name, collection)
+                    loaded = self._load(collection_name)
+        assert loaded is not None, "Exact index should be loadable after rebuild"
+        return loaded
+
+    def query(self, collection_name: str, collection: Any, query_embedding: Sequence[float],
+              n_results: int, space: str = "l2", quantization: str = QUANT_NONE,
+              rerank_factor: int = 10) -> Tuple[List[str], List[float]]:
+        """Return the top ``n_results`` IDs and Chroma-compatible distances
+
+        With ``quantization`` set to int8 or binary, a quantized sidecar is
+        scanned first and only ``n_results * rerank_factor`` candidates are
+        re-scored against the full-precision rows.
+        """
+        return self.query_batch(
+            collection_name, collection, [query_embedding], n_results, space=space,
+            quantization=quantization, rerank_factor=rerank_factor
+        )[0]
+
+    def query_batch(self, collection_name: str, collection: Any, query_embeddings: Sequence[Sequence[float]],
+                    n_results: int, space: str = "l2", quantization: str = QUANT_NONE,
+                    rerank_factor: int = 10) -> List[Tuple[List[str], List[float]]]:
+        """``query`` for several embeddings at once; one (ids, distances) pair per query
+
+        Without quantization all queries are scored in a single matrix product.
+        """
+        loaded = self.ensure(collection_name, collection)
+        total = len(loaded.ids)
+        if total == 0 or n_results <= 0 or len(query_embeddings) == 0:
+            return [([], []) for _ in query_embeddings]
+
+        queries = normalize_rows(query_embeddings)
+        if queries.shape[1] != loaded.matrix.shape[1]:
+            raise ValueError(
+                f"Embedding dimension mismatch: query has {queries.shape[1]}, "
+                f"index has {loaded.matrix.shape[1]}"
+            )
+
+        results = []
+        if quantization != QUANT_NONE:
+            sidecar = QuantizedSidecar(self._dir(collection_name), quantization)
+            if sidecar.count() != total:
+                with self._lock:
+                    sidecar.ensure(loaded.matrix)
+            n_candidates = min(total, n_results * max(rerank_factor, 1))
+            for query in queries:
+                shortlist = sidecar.candidates(query, total, n_candidates)
+                top, cosines = rescore(loaded.matrix, query, shortlist, n_results)
+                distances = cosine_to_distance(cosines, space)
+                results.append(([loaded.ids[i] for i in top], [float(d) for d in distances]))
+        else:
+            scores = loaded.matrix @ queries.T
+            for column in range(queries.shape[0]):
+                top = top_k(scores[:, column], n_results)
+                distances = cosine_to_distance(scores[top, column], space)
+                results.append(([loaded.ids[i] for i in top], [float(d) for d in distances]))
+        return results
+
+    def recall_report(self, collection_name: str, collection: Any, modes: Sequence[str],
+                      k: int = 10, samples: int = 100, rerank_factor: int = 10) -> List[Dict[str, Any]]:
+        """Recall@k of quantized search versus full-precision search for a collection"""
+        loaded = self.ensure(collection_name, collection)
+        sidecars = [QuantizedSidecar(self._dir(collection_name), mode) for mode in modes if mode != QUANT_NONE]
+        # 検索 (query_batch) と同じロックの下でサイドカーを作っておく（recall_report 内では作り直さない）
+        with self._lock:
+            for sidecar in sidecars:
+                sidecar.ensure(loaded.matrix)
+        return recall_report(loaded.matrix, sidecars, k=k, samples=samples, rerank_factor=rerank_factor)
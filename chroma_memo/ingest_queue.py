@@ -0,0 +1,336 @@
+"""
+Durable ingest queue for asynchronous writes
+
+非同期取り込みモードでは add_knowledge がIDを払い出してエントリを SQLite の
+キューに永続化し、すぐに戻る。埋め込みとインデックス登録はバックグラウンドの
+ワーカーがバッチ単位で行い、失敗時はバックオフ付きで再試行する。
+"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .models import KnowledgeEntry, SourceType
+
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_FAILED = "failed"
+
+# processing のまま放置された行（ワーカー異常終了など）を再取得するまでの秒数
+_LEASE_SECONDS = 300
+# 再試行間隔の上限（秒）
+_MAX_BACKOFF_SECONDS = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_queue (
+    id TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    source TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ingest_queue_ready ON ingest_queue (status, next_attempt);
+CREATE INDEX IF NOT EXISTS ingest_queue_project ON ingest_queue (project);
+"""
+
+
+class IngestQueue:
+    """SQLite-backed queue of entries waiting to be embedded and indexed"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # スレッド・プロセスごとに接続を開く（sqlite3の接続は共有しない）
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, entries: List[KnowledgeEntry]) -> None:
+        """Persist entries so that they survive until they are indexed"""
+        rows = [
+            (
+                entry.id,
+                entry.project,
+                entry.content,
+                json.dumps(entry.tags, ensure_ascii=False),
+                entry.source.value,
+                json.dumps(entry.metadata, ensure_ascii=False),
+                entry.created_at.isoformat(),
+                STATUS_PENDING,
+            )
+            for entry in entries
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO ingest_queue (id, project, content, tags, source, metadata, created_at, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Atomically claim up to ``limit`` entries that are ready to be indexed"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, project, content, tags, source, metadata, created_at, attempts "
+                    "FROM ingest_queue "
+                    "WHERE (status = ? AND next_attempt <= ?) OR (status = ? AND claimed_at < ?) "
+                    "ORDER BY created_at LIMIT ?",
+                    (STATUS_PENDING, now, STATUS_PROCESSING, now - _LEASE_SECONDS, limit),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE ingest_queue SET status = ?, claimed_at = ? WHERE id = ?",
+                    [(STATUS_PROCESSING, now, row[0]) for row in rows],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return [
+            {
+                "id": row[0],
+                "project": row[1],
+                "content": row[2],
+                "tags": json.loads(row[3]),
+                "source": row[4],
+                "metadata": json.loads(row[5]),
+                "created_at": row[6],
+                "attempts": row[7],
+            }
+            for row in rows
+        ]
+
+    def complete(self, ids: List[str]) -> None:
+        """Remove entries that have been indexed"""
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM ingest_queue WHERE id = ?", [(entry_id,) for entry_id in ids])
+
+    def remove(self, ids: List[str], project: Optional[str] = None) -> List[str]:
+        """Drop queued entries (deleted before they were indexed); returns the IDs removed
+
+        Rows a worker has already claimed are removed too: the worker checks
+        ``queued`` under the database write lock before indexing, so they are
+        not written afterwards.
+        """
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        query = f"SELECT id FROM ingest_queue WHERE id IN ({placeholders})"
+        params: List[Any] = [*ids]
+        if project is not None:
+            query += " AND project = ?"
+            params.append(project)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = [row[0] for row in conn.execute(query, params).fetchall()]
+                conn.executemany("DELETE FROM ingest_queue WHERE id = ?", [(entry_id,) for entry_id in removed])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def queued(self, ids: List[str]) -> List[str]:
+        """Those of ``ids`` that are still in the queue"""
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT id FROM ingest_queue WHERE id IN ({placeholders})", [*ids]).fetchall()
+        return [row[0] for row in rows]
+
+    def fail(self, ids: List[str], error: str, max_retries: int) -> None:
+        """Schedule a retry with exponential backoff, or give up after ``max_retries``"""
+        now = time.time()
+        with self._connect() as conn:
+            for entry_id in ids:
+                row = conn.execute("SELECT attempts FROM ingest_queue WHERE id = ?", (entry_id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                status = STATUS_FAILED if attempts >= max_retries else STATUS_PENDING
+                backoff = min(_MAX_BACKOFF_SECONDS, 2 ** attempts)
+                conn.execute(
+                    "UPDATE ingest_queue SET status = ?, attempts = ?, next_attempt = ?, "
+                    "claimed_at = NULL, last_error = ? WHERE id = ?",
+                    (status, attempts, now + backoff, error[:1000], entry_id),
+                )
+
+    def retry_failed(self, project: Optional[str] = None) -> int:
+        """Put entries that exhausted their retries back into the queue"""
+        query = "UPDATE ingest_queue SET status = ?, attempts = 0, next_attempt = 0 WHERE status = ?"
+        params: List[Any] = [STATUS_PENDING, STATUS_FAILED]
+        if project is not None:
+            query += " AND project = ?"
+            params.append(project)
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount
+
+    def pending(self, project: str) -> List[KnowledgeEntry]:
+        """Entries of a project that are not searchable yet"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, project, content, tags, source, metadata, created_at FROM ingest_queue "
+                "WHERE project = ? ORDER BY created_at",
+                (project,),
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def get(self, entry_id: str) -> Optional[KnowledgeEntry]:
+        """Look up a queued entry by its full ID"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, project, content, tags, source, metadata, created_at FROM ingest_queue WHERE id = ?",
+                (entry_id,),
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-project counts by status, oldest entry and latest error"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT project, status, COUNT(*), MIN(created_at), MAX(last_error) "
+                "FROM ingest_queue GROUP BY project, status ORDER BY project"
+            ).fetchall()
+
+        summary: Dict[str, Dict[str, Any]] = {}
+        for project, status, count, oldest, last_error in rows:
+            item = summary.setdefault(project, {
+                "project": project,
+                STATUS_PENDING: 0,
+                STATUS_PROCESSING: 0,
+                STATUS_FAILED: 0,
+                "oldest": oldest,
+                "last_error": None,
+            })
+            item[status] = count
+            item["oldest"] = min(item["oldest"], oldest)
+            if last_error:
+                item["last_error"] = last_error
+        return list(summary.values())
+
+    def size(self) -> int:
+        """Number of entries that still have to be indexed"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM ingest_queue WHERE status != ?", (STATUS_FAILED,)
+            ).fetchone()[0]
+
+    @staticmethod
+    def _to_entry(row) -> KnowledgeEntry:
+        created_at = datetime.fromisoformat(row[6])
+        return KnowledgeEntry(
+            id=row[0],
+            project=row[1],
+            content=row[2],
+            tags=json.loads(row[3]),
+            source=SourceType(row[4]),
+            metadata=json.loads(row[5]),
+            created_at=created_at,
+            updated_at=created_at,
+        )
+
+
+def drain_queue(queue: IngestQueue, index_batch: Callable[[str, List[Dict[str, Any]]], None],
+                batch_size: int, max_retries: int) -> int:
+    """Index every ready entry once; returns the number of entries indexed"""
+    indexed = 0
+    while True:
+        rows = queue.claim(batch_size)
+        if not rows:
+            return indexed
+
+        by_project: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_project.setdefault(row["project"], []).append(row)
+
+        for project, project_rows in by_project.items():
+            ids = [row["id"] for row in project_rows]
+            try:
+                index_batch(project, project_rows)
+            except Exception as e:
+                queue.fail(ids, str(e), max_retries)
+                continue
+            queue.complete(ids)
+            indexed += len(ids)
+
+
+class IngestWorker(threading.Thread):
+    """Background thread that keeps draining the ingest queue"""
+
+    def __init__(self, queue: IngestQueue, index_batch: Callable[[str, List[Dict[str, Any]]], None],
+                 batch_size: int, max_retries: int, poll_interval: float = 2.0):
+        super().__init__(name="chroma-memo-ingest", daemon=True)
+        self.queue = queue
+        self.index_batch = index_batch
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def notify(self) -> None:
+        """Wake the worker up after new entries were queued"""
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                drain_queue(self.queue, self.index_batch, self.batch_size, self.max_retries)
+            except Exception as e:
+                print(f"⚠️  Ingest worker error: {e}", file=sys.stderr)
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+def spawn_drain_process() -> None:
+    """Start a detached ``chroma-memo queue drain`` so that the caller can exit"""
+    if getattr(sys, "frozen", False):
+        # PyInstallerでビルドされたバイナリは自身がCLI
+        command = [sys.executable, "queue", "drain", "--quiet"]
+    else:
+        command = [sys.executable, "-m", "chroma_memo.cli", "queue", "drain", "--quiet"]
+
+    kwargs: Dict[str, Any] = {
+        "stdin": subprocess.DEVNULL,
+        "stdout": subprocess.DEVNULL,
+        "stderr": subprocess.DEVNULL,
+        "close_fds": True,
+    }
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    subprocess.Popen(command, **kwargs)
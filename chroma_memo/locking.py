@@ -0,0 +1,152 @@
+"""
+Cross-process coordination for a shared database directory
+
+複数の chroma-memo プロセス（エディタごとの serve、CLI など）が同じ db_path を
+使うときのために、ファイルロックによる単一ライターと、変更シーケンス番号による
+読み込み側のリフレッシュ判定を提供する。
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class LockTimeoutError(RuntimeError):
+    """Raised when the write lock could not be acquired in time"""
+
+
+class FileLock:
+    """Exclusive, re-entrant inter-process lock backed by a lock file
+
+    Waiting is bounded by ``timeout`` seconds. The lock is re-entrant for the
+    same ``FileLock`` object, so nested write operations do not deadlock on
+    themselves; use one instance per lock file within a process.
+    """
+
+    def __init__(self, path: Path, timeout: float = 10.0, poll_interval: float = 0.05):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if os.name == "nt":
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(self, fd: int) -> None:
+        if os.name == "nt":
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def acquire(self) -> None:
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=max(self.timeout, 0)):
+            raise LockTimeoutError(f"Timed out after {self.timeout}s waiting for lock: {self.path}")
+        if self._depth > 0:
+            self._depth += 1
+            return
+
+        try:
+            fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+            while not self._try_lock(fd):
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    holder = self._read_holder()
+                    raise LockTimeoutError(
+                        f"Timed out after {self.timeout}s waiting for the database write lock "
+                        f"{self.path}" + (f" (held by pid {holder})" if holder else "")
+                    )
+                time.sleep(self.poll_interval)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+        # 診断用に保持プロセスのPIDを書いておく
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        self._depth = 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            try:
+                self._unlock(fd)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def _read_holder(self) -> Optional[str]:
+        try:
+            return self.path.read_text().strip() or None
+        except OSError:
+            return None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+class ChangeSequence:
+    """Monotonic change counter shared by all processes using a database
+
+    Writers bump it (while holding the write lock) after every change. Readers
+    compare it with the last value they saw; checking costs one ``stat`` unless
+    the file actually changed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._value = 0
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def read(self) -> int:
+        """Current sequence number (0 if nothing was ever written)"""
+        stamp = self._stat()
+        if stamp is None:
+            return 0
+        if stamp != self._stamp:
+            try:
+                self._value = int(self.path.read_text().strip() or 0)
+            except (OSError, ValueError):
+                return self._value
+            self._stamp = stamp
+        return self._value
+
+    def bump(self) -> int:
+        """Increment the sequence number; call only while holding the write lock"""
+        value = self.read() + 1
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(str(value))
+        tmp_path.replace(self.path)
+        self._stamp = self._stat()
+        self._value = value
+        return value
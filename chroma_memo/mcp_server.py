@@ -1,31 +1,125 @@
 #!/usr/bin/env python3
 """MCP Server for Chroma-Memo"""
 
+import asyncio
+import functools
+import inspect
+import json
+import signal
 import sys
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from mcp.server.fastmcp import FastMCP
 
 from .database import get_database
 from .config import config_manager
+from .paging import (
+    MIN_SNIPPET_CHARS, decode_cursor, encode_cursor, fit_to_budget, query_fingerprint, truncate,
+    validate_output_format,
+)
+from .tool_executor import ToolExecutor, ToolTimeoutError
+from .metrics import metrics
+from .profiling import profiler
+from .write_coalescer import WriteCoalescer
+
+
+# memo_list で表示する本文プレビューの文字数
+_LIST_PREVIEW_CHARS = 80
+
+TRANSPORT_STDIO = "stdio"
+TRANSPORT_HTTP = "http"
+TRANSPORT_SSE = "sse"
+TRANSPORTS = (TRANSPORT_STDIO, TRANSPORT_HTTP, TRANSPORT_SSE)
+
+DEFAULT_HTTP_HOST = "127.0.0.1"
+DEFAULT_HTTP_PORT = 8765
+
+_LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
+
+
+def _format_added(entry_id: str, project: str, content: str) -> str:
+    return f"✅ Knowledge entry added successfully!\nID: {entry_id}\nProject: {project}\nContent: {content[:100]}{'...' if len(content) > 100 else ''}"
 
 
 class ChromaMemoMCPServer:
     """MCP Server wrapper for Chroma-Memo"""
     
-    def __init__(self, project_name: str = None):
-        self.mcp = FastMCP("chroma-memo")
+    def __init__(self, project_name: str = None, host: str = DEFAULT_HTTP_HOST, port: int = DEFAULT_HTTP_PORT):
+        # host/port are only used by the HTTP and SSE transports
+        self.mcp = FastMCP("chroma-memo", host=host, port=port)
         self.project_name = project_name
         self.db = get_database()
         self.config = config_manager.load_config()
+        self.executor = ToolExecutor(self.config.mcp_max_workers, self.config.mcp_tool_timeout)
+        
+        # 連続する memo_add をまとめて書き込む（window が 0 なら無効）
+        self.coalescer: Optional[WriteCoalescer] = None
+        if self.config.write_coalesce_window > 0:
+            self.coalescer = WriteCoalescer(
+                self._flush_adds, self.config.write_coalesce_window, self.config.write_coalesce_max_batch
+            )
         
         # Register tools
         self._register_tools()
     
+    def _tool(self, write: bool = False, coalesce_add: bool = False) -> Callable[[Callable[..., str]], Callable[..., str]]:
+        """Register a blocking tool body as an async MCP tool
+        
+        The body runs on the worker pool under the read (or write) lock of the
+        project it targets. The undecorated function is returned so that other
+        tool bodies can call it directly from their worker thread.
+        
+        With ``coalesce_add`` the call is handed to the write coalescer instead
+        (if enabled), so waiting adds do not occupy pool workers.
+        """
+        def decorator(func: Callable[..., str]) -> Callable[..., str]:
+            signature = inspect.signature(func)
+            
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> str:
+                bound = signature.bind(*args, **kwargs)
+                project = bound.arguments.get("project", self.project_name)
+                with metrics.span(f"mcp.{func.__name__}"):
+                    if coalesce_add and self.coalescer is not None:
+                        return await self._add_coalesced(project, bound.arguments["content"], bound.arguments.get("tags"))
+                    try:
+                        call = profiler.wrap(f"mcp.{func.__name__}", functools.partial(func, *args, **kwargs))
+                        return await self.executor.run(func.__name__, call, project=project, write=write)
+                    except ToolTimeoutError as e:
+                        return f"❌ {str(e)}"
+            
+            self.mcp.tool()(wrapper)
+            return func
+        
+        return decorator
+    
+    def _flush_adds(self, project: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write one coalesced batch of adds (runs on the coalescer thread)"""
+        with self.executor.project_lock(project).write(), profiler.profile("mcp.coalesced_add"):
+            # Create project if it doesn't exist
+            if not self.db.project_exists(project):
+                self.db.create_project(project)
+            return self.db.add_knowledge_batch(project, items)
+    
+    async def _add_coalesced(self, project: str, content: str, tags: Optional[List[str]]) -> str:
+        """Add one entry through the write coalescer"""
+        try:
+            future = self.coalescer.submit(project, content, tags)
+            entry_id = await asyncio.wait_for(asyncio.wrap_future(future), self.executor.timeout)
+        except asyncio.TimeoutError:
+            return f"❌ memo_add timed out after {self.executor.timeout}s; the entry may still be written"
+        except Exception as e:
+            return f"❌ Error adding knowledge entry: {str(e)}"
+        return _format_added(entry_id, project, content)
+    
     def _register_tools(self):
         """Register all MCP tools"""
         
-        @self.mcp.tool()
+        @self._tool(write=True, coalesce_add=True)
         def memo_add(project: str, content: str, tags: Optional[List[str]] = None) -> str:
             """Add a new knowledge entry to a project
             
@@ -42,75 +136,174 @@ class ChromaMemoMCPServer:
                 # Add knowledge to database
                 entry_id = self.db.add_knowledge(project, content, tags or [])
                 
-                return f"✅ Knowledge entry added successfully!\nID: {entry_id}\nProject: {project}\nContent: {content[:100]}{'...' if len(content) > 100 else ''}"
+                return _format_added(entry_id, project, content)
                 
             except Exception as e:
                 return f"❌ Error adding knowledge entry: {str(e)}"
 
-        @self.mcp.tool()
-        def memo_search(project: str, query: str, max_results: int = 5) -> str:
+        @self._tool()
+        def memo_search(project: str, query: str, max_results: int = 5, cursor: Optional[str] = None,
+                        max_chars: Optional[int] = None, output_format: str = "text") -> str:
             """Search knowledge entries in a project
             
+            Long contents are truncated to fit the response budget; use memo_get
+            for the full entry. Pass the returned cursor to get the next page.
+            
             Args:
                 project: Project name to search in
                 query: Search query
-                max_results: Maximum number of results (default: 5)
+                max_results: Maximum number of results per page (default: 5)
+                cursor: Continuation token from a previous call
+                max_chars: Response size budget in characters (default: mcp_max_chars setting)
+                output_format: "text" or "json"
             """
             try:
-                # Search in database
-                results = self.db.search_knowledge(project, query, max_results)
+                validate_output_format(output_format)
+                budget = self.config.mcp_max_chars if max_chars is None else max_chars
+                fingerprint = query_fingerprint(query)
+                offset = 0
+                if cursor:
+                    state = decode_cursor(cursor, "search", project)
+                    if state.get("q") != fingerprint:
+                        raise ValueError("Cursor was issued for a different query")
+                    offset = int(state["o"])
                 
-                if not results:
-                    return f"🔍 No results found for '{query}' in project '{project}'"
+                # Search in database (one extra result tells whether another page exists)
+                results = self.db.search_knowledge(project, query, offset + max_results + 1)
+                page = results[offset:offset + max_results]
+                pending = self.db.pending_entries(project)
+                pending_note = f"\n⏳ {len(pending)} entries are pending indexing and not searchable yet" if pending else ""
                 
-                # Format results
-                formatted_results = [f"🔍 Search results for '{query}' in '{project}': {len(results)} found\n"]
+                if not page and output_format == "text":
+                    return f"🔍 No {'more ' if offset else ''}results found for '{query}' in project '{project}'{pending_note}"
                 
-                for i, search_result in enumerate(results, 1):
+                snippet_chars = max(MIN_SNIPPET_CHARS, budget // max(len(page), 1)) if budget else 0
+                
+                def render(search_result):
                     entry = search_result.entry
-                    similarity = search_result.similarity_score
+                    content, truncated = truncate(entry.content, snippet_chars)
+                    if output_format == "json":
+                        return {
+                            "rank": search_result.rank,
+                            "id": entry.id,
+                            "content": content,
+                            "truncated": truncated,
+                            "tags": entry.tags,
+                            "similarity": round(search_result.similarity_score, 4),
+                            "created_at": entry.created_at.isoformat(),
+                        }
                     tags_str = f" [Tags: {', '.join(entry.tags)}]" if entry.tags else ""
-                    formatted_results.append(
-                        f"\n#{i}{tags_str}\n"
-                        f"Content: {entry.content}\n"
-                        f"Similarity: {similarity:.3f} | ID: {entry.id} | Created: {entry.created_at}"
+                    hint = (f"... [truncated {len(entry.content) - len(content)} chars; "
+                            f"use memo_get with entry_id '{entry.id}' for the full entry]") if truncated else ""
+                    return (
+                        f"\n#{search_result.rank}{tags_str}\n"
+                        f"Content: {content}{hint}\n"
+                        f"Similarity: {search_result.similarity_score:.3f} | ID: {entry.id} | Created: {entry.created_at}"
                     )
                 
+                header = f"🔍 Search results for '{query}' in '{project}': {len(page)} found{pending_note}\n"
+                rendered = fit_to_budget(page, render, budget, reserved=len(header) + len(query) + 200)
+                shown = offset + len(rendered)
+                has_more = len(rendered) < len(page) or len(results) > offset + max_results
+                next_cursor = encode_cursor({"k": "search", "p": project, "q": fingerprint, "o": shown}) if has_more else None
+                
+                if output_format == "json":
+                    return json.dumps({
+                        "project": project,
+                        "query": query,
+                        "results": rendered,
+                        "pending": len(pending),
+                        "next_cursor": next_cursor,
+                    }, ensure_ascii=False)
+                
+                formatted_results = [f"🔍 Search results for '{query}' in '{project}': {offset + 1}-{shown}{pending_note}\n"]
+                formatted_results.extend(rendered)
+                if next_cursor:
+                    formatted_results.append(f"\n➡️ More results: call again with cursor=\"{next_cursor}\"")
+                
                 return "\n".join(formatted_results)
                 
             except Exception as e:
                 return f"❌ Error searching knowledge: {str(e)}"
 
-        @self.mcp.tool()
-        def memo_list(project: str) -> str:
-            """List all knowledge entries in a project
+        @self._tool()
+        def memo_list(project: str, cursor: Optional[str] = None, limit: int = 20,
+                      max_chars: Optional[int] = None, output_format: str = "text") -> str:
+            """List knowledge entries in a project, newest first
+            
+            Contents are shown as previews; use memo_get for the full entry.
+            Pass the returned cursor to get the next page.
             
             Args:
                 project: Project name
+                cursor: Continuation token from a previous call
+                limit: Maximum number of entries per page (default: 20)
+                max_chars: Response size budget in characters (default: mcp_max_chars setting)
+                output_format: "text" or "json"
             """
             try:
+                validate_output_format(output_format)
+                budget = self.config.mcp_max_chars if max_chars is None else max_chars
                 entries = self.db.list_knowledge(project)
                 
-                if not entries:
+                if not entries and output_format == "text":
                     return f"📝 No knowledge entries found in project '{project}'"
                 
-                formatted_entries = [f"📝 Knowledge entries in '{project}': {len(entries)} found\n"]
+                start = 0
+                if cursor:
+                    # 作成日時とIDでの位置指定なので、途中で追加・削除があってもずれない
+                    start = entries.position_after(decode_cursor(cursor, "list", project)["a"])
+                page = entries[start:start + limit]
                 
-                for i, entry in enumerate(entries, 1):
+                def render(item):
+                    number, entry = item
+                    # blob に保存された本文は読まず、保存済みのプレビューから切り出す
+                    content, truncated = truncate(entry.preview, _LIST_PREVIEW_CHARS)
+                    truncated = truncated or len(content) < entry.content_length
+                    if output_format == "json":
+                        return {
+                            "id": entry.id,
+                            "content": content,
+                            "truncated": truncated,
+                            "tags": entry.tags,
+                            "created_at": entry.created_at.isoformat(),
+                        }
                     tags_str = f" [Tags: {', '.join(entry.tags)}]" if entry.tags else ""
-                    content_preview = entry.content[:80] + "..." if len(entry.content) > 80 else entry.content
-                    formatted_entries.append(
-                        f"\n#{i}{tags_str}\n"
-                        f"Content: {content_preview}\n"
+                    return (
+                        f"\n#{number}{tags_str}\n"
+                        f"Content: {content}{'...' if truncated else ''}\n"
                         f"ID: {entry.id} | Created: {entry.created_at}"
                     )
                 
+                rendered = fit_to_budget([*enumerate(page, start + 1)], render, budget, reserved=len(project) + 300)
+                end = start + len(rendered)
+                next_cursor = None
+                if end < len(entries):
+                    next_cursor = encode_cursor({"k": "list", "p": project, "a": [*page[len(rendered) - 1].sort_key]})
+                
+                if output_format == "json":
+                    return json.dumps({
+                        "project": project,
+                        "total": len(entries),
+                        "entries": rendered,
+                        "next_cursor": next_cursor,
+                    }, ensure_ascii=False)
+                
+                if not rendered:
+                    return f"📝 No more knowledge entries in project '{project}'"
+                
+                formatted_entries = [f"📝 Knowledge entries in '{project}': {start + 1}-{end} of {len(entries)}\n"]
+                formatted_entries.extend(rendered)
+                formatted_entries.append("\n💡 Contents are previews; use memo_get with an ID for the full entry.")
+                if next_cursor:
+                    formatted_entries.append(f"➡️ More entries: call again with cursor=\"{next_cursor}\"")
+                
                 return "\n".join(formatted_entries)
                 
             except Exception as e:
                 return f"❌ Error listing knowledge entries: {str(e)}"
 
-        @self.mcp.tool()
+        @self._tool(write=True)
         def memo_delete(project: str, entry_id: str) -> str:
             """Delete a knowledge entry from a project
             
@@ -129,7 +322,51 @@ class ChromaMemoMCPServer:
             except Exception as e:
                 return f"❌ Error deleting knowledge entry: {str(e)}"
 
-        @self.mcp.tool()
+        @self._tool(write=True)
+        def memo_dedupe(project: str, threshold: float = 0.95, merge: bool = False, max_clusters: int = 20) -> str:
+            """Find near-duplicate entries in a project and optionally merge them
+            
+            Entries whose embeddings have cosine similarity >= threshold are
+            grouped into clusters. With merge=True each cluster keeps its newest
+            entry, which receives the union of the cluster's tags, and the other
+            entries are deleted. Review the clusters with merge=False first.
+            
+            Args:
+                project: Project name
+                threshold: Cosine similarity cutoff (default: 0.95)
+                merge: Merge every reported cluster (default: False)
+                max_clusters: Maximum number of clusters to report or merge (default: 20)
+            """
+            try:
+                clusters = self.db.find_duplicates(project, threshold)[:max(1, max_clusters)]
+                if not clusters:
+                    return f"✨ No near-duplicates (cosine >= {threshold}) found in project '{project}'"
+                
+                lines = [f"🧹 {len(clusters)} duplicate cluster(s) in project '{project}' (cosine >= {threshold})"]
+                for i, cluster in enumerate(clusters, 1):
+                    lines.append(
+                        f"\n#{i} {len(cluster['entries'])} entries, similarity "
+                        f"{cluster['min_similarity']:.3f}-{cluster['max_similarity']:.3f}"
+                    )
+                    for j, entry in enumerate(cluster["entries"]):
+                        preview, truncated = truncate(entry.content.replace("\n", " "), _LIST_PREVIEW_CHARS)
+                        marker = "keep" if j == 0 else "dup "
+                        lines.append(
+                            f"  [{marker}] {entry.id} | {entry.created_at.strftime('%Y-%m-%d %H:%M')} | "
+                            f"tags: {', '.join(entry.tags) or '-'} | {preview}{'…' if truncated else ''}"
+                        )
+                    if merge:
+                        merged = self.db.merge_duplicates(project, [entry.id for entry in cluster["entries"]])
+                        lines.append(f"  ✅ Merged into {merged['kept']} (deleted {len(merged['deleted'])}, tags: {', '.join(merged['tags']) or '-'})")
+                
+                if not merge:
+                    lines.append("\nCall again with merge=true to keep the newest entry of each cluster.")
+                return "\n".join(lines)
+                
+            except Exception as e:
+                return f"❌ Error finding duplicates: {str(e)}"
+
+        @self._tool()
         def projects_list() -> str:
             """List all available projects"""
             try:
@@ -153,7 +390,134 @@ class ChromaMemoMCPServer:
             except Exception as e:
                 return f"❌ Error listing projects: {str(e)}"
 
+        @self._tool(write=True)
+        def memo_add_batch(project: str, entries: List[Dict[str, Any]], output_format: str = "text") -> str:
+            """Add several knowledge entries to a project in one call
+            
+            All contents are embedded in a single request. Each entry succeeds or
+            fails on its own; failures are reported per item.
+            
+            Args:
+                project: Project name
+                entries: List of {"content": str, "tags": [str, ...]} objects
+                output_format: "text" or "json"
+            """
+            try:
+                validate_output_format(output_format)
+                
+                # Create project if it doesn't exist
+                if not self.db.project_exists(project):
+                    self.db.create_project(project)
+                
+                results = self.db.add_knowledge_batch(project, entries)
+                added = sum(1 for result in results if result["error"] is None)
+                
+                if output_format == "json":
+                    return json.dumps({"project": project, "added": added, "results": results}, ensure_ascii=False)
+                
+                status = "✅" if added == len(results) else "⚠️"
+                formatted_results = [f"{status} Added {added} of {len(results)} knowledge entries to '{project}'\n"]
+                for i, (item, result) in enumerate(zip(entries, results), 1):
+                    if result["error"] is None:
+                        content = item["content"]
+                        formatted_results.append(f"#{i} ✅ ID: {result['id']} | {content[:60]}{'...' if len(content) > 60 else ''}")
+                    else:
+                        formatted_results.append(f"#{i} ❌ {result['error']}")
+                
+                return "\n".join(formatted_results)
+                
+            except Exception as e:
+                return f"❌ Error adding knowledge entries: {str(e)}"
+
+        @self._tool()
+        def memo_search_batch(project: str, queries: List[str], max_results: int = 5,
+                              max_chars: Optional[int] = None, output_format: str = "text") -> str:
+            """Run several searches in a project in one call
+            
+            All queries are embedded in a single request and answered by one
+            index query. Long contents are truncated to fit the response budget;
+            use memo_get for the full entry.
+            
+            Args:
+                project: Project name to search in
+                queries: List of search queries
+                max_results: Maximum number of results per query (default: 5)
+                max_chars: Response size budget in characters (default: mcp_max_chars setting)
+                output_format: "text" or "json"
+            """
+            try:
+                validate_output_format(output_format)
+                budget = self.config.mcp_max_chars if max_chars is None else max_chars
+                items = self.db.search_knowledge_batch(project, queries, max_results)
+                
+                total_hits = sum(len(item["results"]) for item in items)
+                snippet_chars = max(MIN_SNIPPET_CHARS, budget // max(total_hits, 1)) if budget else 0
+                
+                def render(search_result):
+                    entry = search_result.entry
+                    content, truncated = truncate(entry.content, snippet_chars)
+                    if output_format == "json":
+                        return {
+                            "rank": search_result.rank,
+                            "id": entry.id,
+                            "content": content,
+                            "truncated": truncated,
+                            "tags": entry.tags,
+                            "similarity": round(search_result.similarity_score, 4),
+                        }
+                    hint = f"... [truncated; use memo_get with entry_id '{entry.id}']" if truncated else ""
+                    return f"  #{search_result.rank} ({search_result.similarity_score:.3f}) {content}{hint} | ID: {entry.id}"
+                
+                if output_format == "json":
+                    return json.dumps({
+                        "project": project,
+                        "results": [
+                            {"query": item["query"], "error": item["error"], "results": [render(hit) for hit in item["results"]]}
+                            for item in items
+                        ],
+                    }, ensure_ascii=False)
+                
+                formatted_results = [f"🔍 Batch search in '{project}': {len(items)} queries"]
+                for i, item in enumerate(items, 1):
+                    formatted_results.append(f"\n[{i}] {item['query']}")
+                    if item["error"]:
+                        formatted_results.append(f"  ❌ {item['error']}")
+                    elif not item["results"]:
+                        formatted_results.append("  No results found")
+                    else:
+                        formatted_results.extend(render(hit) for hit in item["results"])
+                
+                return "\n".join(formatted_results)
+                
+            except Exception as e:
+                return f"❌ Error searching knowledge: {str(e)}"
+
         @self.mcp.tool()
+        def server_stats(output_format: str = "text") -> str:
+            """Timing statistics of this server: p50/p95/p99 per operation and counters
+            
+            Args:
+                output_format: "text" (table), "json" or "prometheus"
+            """
+            if output_format == "prometheus":
+                return metrics.prometheus()
+            snapshot = metrics.snapshot()
+            if output_format == "json":
+                return json.dumps(snapshot, ensure_ascii=False)
+            
+            formatted = [f"📊 Server stats (ms): {len(snapshot['operations'])} operations\n",
+                         f"{'operation':<32} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}"]
+            for name, op_stats in sorted(snapshot["operations"].items()):
+                formatted.append(
+                    f"{name:<32} {op_stats['count']:>7} {op_stats['p50'] * 1000:>9.1f} "
+                    f"{op_stats['p95'] * 1000:>9.1f} {op_stats['p99'] * 1000:>9.1f}"
+                )
+            if snapshot["counters"]:
+                formatted.append("")
+                formatted.extend(f"{name}: {value:g}" for name, value in sorted(snapshot["counters"].items()))
+            return "\n".join(formatted)
+
+        @self._tool()
         def memo_get(project: str, entry_id: str) -> str:
             """Get a specific knowledge entry by ID
             
@@ -182,7 +546,7 @@ class ChromaMemoMCPServer:
             except Exception as e:
                 return f"❌ Error getting knowledge entry: {str(e)}"
 
-        @self.mcp.tool()
+        @self._tool()
         def project_info(project: str) -> str:
             """Get detailed information about a project
             
@@ -208,7 +572,7 @@ class ChromaMemoMCPServer:
         
         # If project name is specified, add project-specific tools
         if self.project_name:
-            @self.mcp.tool()
+            @self._tool(write=True, coalesce_add=True)
             def add_to_current_project(content: str, tags: Optional[List[str]] = None) -> str:
                 """Add knowledge entry to the current project
                 
@@ -218,22 +582,34 @@ class ChromaMemoMCPServer:
                 """
                 return memo_add(self.project_name, content, tags)
             
-            @self.mcp.tool()
-            def search_current_project(query: str, max_results: int = 5) -> str:
+            @self._tool()
+            def search_current_project(query: str, max_results: int = 5, cursor: Optional[str] = None,
+                                       max_chars: Optional[int] = None, output_format: str = "text") -> str:
                 """Search in the current project
                 
                 Args:
                     query: Search query
-                    max_results: Maximum number of results (default: 5)
+                    max_results: Maximum number of results per page (default: 5)
+                    cursor: Continuation token from a previous call
+                    max_chars: Response size budget in characters (default: mcp_max_chars setting)
+                    output_format: "text" or "json"
                 """
-                return memo_search(self.project_name, query, max_results)
+                return memo_search(self.project_name, query, max_results, cursor, max_chars, output_format)
             
-            @self.mcp.tool()
-            def list_current_project() -> str:
-                """List all entries in the current project"""
-                return memo_list(self.project_name)
+            @self._tool()
+            def list_current_project(cursor: Optional[str] = None, limit: int = 20,
+                                     max_chars: Optional[int] = None, output_format: str = "text") -> str:
+                """List entries in the current project, newest first
+                
+                Args:
+                    cursor: Continuation token from a previous call
+                    limit: Maximum number of entries per page (default: 20)
+                    max_chars: Response size budget in characters (default: mcp_max_chars setting)
+                    output_format: "text" or "json"
+                """
+                return memo_list(self.project_name, cursor, limit, max_chars, output_format)
             
-            @self.mcp.tool()
+            @self._tool()
             def get_from_current_project(entry_id: str) -> str:
                 """Get a specific knowledge entry from the current project
                 
@@ -242,7 +618,7 @@ class ChromaMemoMCPServer:
                 """
                 return memo_get(self.project_name, entry_id)
             
-            @self.mcp.tool()
+            @self._tool(write=True)
             def delete_from_current_project(entry_id: str) -> str:
                 """Delete a knowledge entry from the current project
                 
@@ -251,27 +627,107 @@ class ChromaMemoMCPServer:
                 """
                 return memo_delete(self.project_name, entry_id)
     
-    def run(self):
-        """Run the MCP server"""
+    def warm_up(self) -> None:
+        """Load the served collections and connect to the embedding API before the first request"""
+        report = self.db.warm_up([self.project_name] if self.project_name else None)
+        parts = [f"{report['collections']} collection(s), {report['entries']} entries"]
+        if report["embedding"]:
+            parts.append("embedding client ready")
+        if report["replayed"]:
+            parts.append(f"replayed {report['replayed']} queries")
+        print(f"🔥 Warmed up {', '.join(parts)} in {report['seconds']:.2f}s", file=sys.stderr)
+        for error in report["errors"]:
+            print(f"⚠️  Warm-up: {error}", file=sys.stderr)
+    
+    def run(self, transport: str = TRANSPORT_STDIO, max_connections: int = 32,
+            shutdown_timeout: float = 10.0):
+        """Run the MCP server
+        
+        Args:
+            transport: "stdio" (one client), or "http" (streamable HTTP) / "sse"
+                to share one warm server between many clients
+            max_connections: Concurrent HTTP connections before new ones get 503
+            shutdown_timeout: Seconds to let open requests finish on shutdown
+        """
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport '{transport}'. Choose from: {', '.join(TRANSPORTS)}")
+        
         # Log server startup to stderr (not stdout)
         if self.project_name:
             print(f"🚀 Chroma-Memo MCP Server starting for project: {self.project_name}", file=sys.stderr)
-            print(f"📦 Available tools: memo_add, memo_search, memo_list, memo_get, memo_delete, projects_list, project_info", file=sys.stderr)
+            print(f"📦 Available tools: memo_add, memo_add_batch, memo_search, memo_search_batch, memo_list, memo_get, memo_delete, memo_dedupe, projects_list, project_info, server_stats", file=sys.stderr)
             print(f"🎯 Project-specific tools: add_to_current_project, search_current_project, list_current_project, get_from_current_project, delete_from_current_project", file=sys.stderr)
         else:
             print("🚀 Chroma-Memo MCP Server starting (all projects)", file=sys.stderr)
-            print(f"📦 Available tools: memo_add, memo_search, memo_list, memo_get, memo_delete, projects_list, project_info", file=sys.stderr)
+            print(f"📦 Available tools: memo_add, memo_add_batch, memo_search, memo_search_batch, memo_list, memo_get, memo_delete, memo_dedupe, projects_list, project_info, server_stats", file=sys.stderr)
+        
+        print(f"🧵 Tool workers: {self.executor.max_workers}, timeout: {self.executor.timeout or 'none'}s", file=sys.stderr)
+        if profiler.enabled:
+            print(f"🔬 Profiling every {profiler.every} call(s) per tool into {profiler.output_dir}"
+                  f"{' (with tracemalloc)' if profiler.memory else ''}", file=sys.stderr)
         
         # Run the server
-        self.mcp.run(transport="stdio")
+        try:
+            if transport == TRANSPORT_STDIO:
+                self.mcp.run(transport="stdio")
+            else:
+                self._run_http(transport, max_connections, shutdown_timeout)
+        finally:
+            if self.coalescer is not None:
+                self.coalescer.close()
+            self.executor.shutdown()
+    
+    def _run_http(self, transport: str, max_connections: int, shutdown_timeout: float):
+        """Serve the streamable HTTP or SSE app with uvicorn"""
+        import uvicorn
+        
+        host = self.mcp.settings.host
+        port = self.mcp.settings.port
+        if transport == TRANSPORT_HTTP:
+            app = self.mcp.streamable_http_app()
+            path = self.mcp.settings.streamable_http_path
+        else:
+            app = self.mcp.sse_app()
+            path = self.mcp.settings.sse_path
+        
+        if host not in _LOOPBACK_HOSTS:
+            print(f"⚠️  Listening on {host}: the MCP server has no authentication; "
+                  f"anyone who can reach this address can read and write your knowledge base", file=sys.stderr)
+        print(f"🌐 Listening on http://{host}:{port}{path} "
+              f"(max connections: {max_connections}, graceful shutdown: {shutdown_timeout}s)", file=sys.stderr)
+        
+        # uvicorn は SIGINT/SIGTERM で新規接続の受付を止め、処理中のリクエストを待ってから終了する
+        server = uvicorn.Server(uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            limit_concurrency=max_connections,
+            timeout_graceful_shutdown=shutdown_timeout,
+            log_level="warning",
+        ))
+        
+        # uvicorn は終了後に受け取ったシグナルを再送出するので、SIGTERM でも後片付けが走るよう通常終了に変える
+        previous_handler = signal.signal(signal.SIGTERM, _exit_on_sigterm)
+        try:
+            server.run()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            print("🛑 Chroma-Memo MCP Server stopped", file=sys.stderr)
 
 
-def start_mcp_server(project_name: str = None, auto_init: bool = True):
+def start_mcp_server(project_name: str = None, auto_init: bool = True, transport: str = TRANSPORT_STDIO,
+                     host: str = DEFAULT_HTTP_HOST, port: int = DEFAULT_HTTP_PORT, max_connections: int = 32,
+                     warmup: Optional[bool] = None):
     """Start MCP server for a specific project
     
     Args:
         project_name: Project name to serve (optional)
         auto_init: Automatically initialize project if it doesn't exist
+        transport: stdio, http or sse
+        host: Address to bind for http/sse (localhost by default)
+        port: Port to bind for http/sse
+        max_connections: Concurrent connection limit for http/sse
+        warmup: Warm up collections and the embedding client before serving (default: warmup setting)
     """
     if project_name and auto_init:
         # Auto-initialize project if it doesn't exist
@@ -290,5 +746,13 @@ def start_mcp_server(project_name: str = None, auto_init: bool = True):
             # Don't exit - continue running the server
     
     # Start the server
-    server = ChromaMemoMCPServer(project_name)
-    server.run()
\ No newline at end of file
+    server = ChromaMemoMCPServer(project_name, host=host, port=port)
+    if server.config.async_ingest:
+        server.db.start_ingest_worker()
+    if server.config.auto_prune_interval > 0:
+        # 保持ポリシーが設定されたプロジェクトだけが対象
+        server.db.start_retention_worker(server.config.auto_prune_interval)
+        print(f"🗄️  Applying retention policies every {server.config.auto_prune_interval:g}s", file=sys.stderr)
+    if server.config.warmup if warmup is None else warmup:
+        server.warm_up()
+    server.run(transport, max_connections=max_connections)
\ No newline at end of file
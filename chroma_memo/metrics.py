@@ -0,0 +1,202 @@
+"""
+Timing spans and counters for performance analysis
+
+処理の各段階（埋め込み、インデックス検索、結果の変換、表示など）の所要時間を
+スパンとして記録する。直近の値はプロセス内に保持してパーセンタイルを計算し、
+有効にした場合は JSON Lines のログにも追記する。CLI の `stats` はこのログを
+集計し、MCP の `server_stats` は実行中のサーバーの値を返す。
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Union
+
+
+# 1操作あたりに保持する直近の所要時間の数
+_RESERVOIR_SIZE = 2048
+# ログがこのサイズを超えたら .1 に退避する
+_MAX_LOG_BYTES = 10 * 1024 * 1024
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class MetricsRegistry:
+    """Thread-safe store of operation timings and event counters"""
+
+    def __init__(self, reservoir_size: int = _RESERVOIR_SIZE):
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._durations: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._sums: Dict[str, float] = {}
+        self._counters: Dict[str, float] = {}
+        self._log_path: Optional[Path] = None
+        self._log_resolved = False
+        self._log_file = None
+
+    def configure(self, log_path: Optional[Union[str, Path]]) -> None:
+        """Set (or with None disable) the JSON-lines log file"""
+        with self._lock:
+            self._close_log()
+            self._log_path = Path(log_path).expanduser() if log_path else None
+            self._log_resolved = True
+
+    def _resolve_log_path(self) -> Optional[Path]:
+        # 設定の読み込みは最初の記録まで遅らせる
+        if not self._log_resolved:
+            self._log_resolved = True
+            env = os.getenv("CHROMA_MEMO_METRICS_LOG")
+            if env is not None:
+                self._log_path = Path(env).expanduser() if env.strip() else None
+            else:
+                from .config import config_manager
+                config = config_manager.load_config()
+                if config.metrics_log:
+                    self._log_path = default_log_path()
+        return self._log_path
+
+    def _close_log(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def _write_log(self, record: Dict[str, Any]) -> None:
+        path = self._resolve_log_path()
+        if path is None:
+            return
+        try:
+            if self._log_file is None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if path.exists() and path.stat().st_size > _MAX_LOG_BYTES:
+                    path.replace(path.with_name(path.name + ".1"))
+                self._log_file = open(path, "a", encoding="utf-8", buffering=1)
+            self._log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            # 計測のせいで本来の処理を失敗させない
+            self._log_path = None
+
+    def record(self, name: str, seconds: float, attrs: Optional[Dict[str, Any]] = None,
+               log: bool = True) -> None:
+        """Record one completed operation"""
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.reservoir_size)
+            durations.append(seconds)
+            self._counts[name] = self._counts.get(name, 0) + 1
+            self._sums[name] = self._sums.get(name, 0.0) + seconds
+            for key, value in (attrs or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    counter = f"{name}.{key}"
+                    self._counters[counter] = self._counters.get(counter, 0) + value
+            if log:
+                record = {"ts": round(time.time(), 3), "op": name, "ms": round(seconds * 1000.0, 3), "pid": os.getpid()}
+                record.update(attrs or {})
+                self._write_log(record)
+
+    def incr(self, name: str, value: float = 1, log: bool = True) -> None:
+        """Increment an event counter such as a cache hit"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            if log:
+                self._write_log({"ts": round(time.time(), 3), "event": name, "value": value, "pid": os.getpid()})
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """Time the enclosed block; the yielded dict can carry extra attributes"""
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException:
+            attrs["error"] = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, attrs)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._sums.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-operation count, total and p50/p95/p99 (seconds), plus counters"""
+        with self._lock:
+            operations = {}
+            for name, durations in self._durations.items():
+                values = sorted(durations)
+                operations[name] = {
+                    "count": self._counts[name],
+                    "sum": self._sums[name],
+                    "max": values[-1],
+                    **{f"p{int(q * 100)}": percentile(values, q) for q in QUANTILES},
+                }
+            return {"operations": operations, "counters": dict(self._counters)}
+
+    def prometheus(self) -> str:
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP chroma_memo_operation_seconds Duration of chroma-memo operations",
+            "# TYPE chroma_memo_operation_seconds summary",
+        ]
+        for name, stats in sorted(snapshot["operations"].items()):
+            label = _escape_label(name)
+            for q in QUANTILES:
+                lines.append(
+                    f'chroma_memo_operation_seconds{{operation="{label}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}'
+                )
+            lines.append(f'chroma_memo_operation_seconds_sum{{operation="{label}"}} {stats["sum"]:.6f}')
+            lines.append(f'chroma_memo_operation_seconds_count{{operation="{label}"}} {stats["count"]}')
+        lines.append("# HELP chroma_memo_events_total Cache hits/misses and summed batch sizes and result counts")
+        lines.append("# TYPE chroma_memo_events_total counter")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f'chroma_memo_events_total{{event="{_escape_label(name)}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def default_log_path() -> Path:
+    """``metrics.jsonl`` next to config.yaml"""
+    from .config import config_manager
+    return config_manager.config_dir / "metrics.jsonl"
+
+
+def load_log(path: Path, since: Optional[float] = None) -> MetricsRegistry:
+    """Rebuild a registry from a JSON-lines log (``since``: unix time cutoff)"""
+    registry = MetricsRegistry(reservoir_size=1 << 20)
+    registry.configure(None)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since is not None and record.get("ts", 0) < since:
+                continue
+            if "op" in record:
+                attrs = {k: v for k, v in record.items() if k not in ("ts", "op", "ms", "pid")}
+                registry.record(record["op"], record["ms"] / 1000.0, attrs, log=False)
+            elif "event" in record:
+                registry.incr(record["event"], record.get("value", 1), log=False)
+    return registry
+
+
+metrics = MetricsRegistry()
@@ -2,10 +2,16 @@
 Data models for Chroma-Memo
 """
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence, Iterator, Tuple, Union, Callable, overload
 from pydantic import BaseModel, Field
 from enum import Enum
 
+from .blob_store import BLOB_DIGEST_KEY, BLOB_CHARS_KEY
+
+
+# KnowledgeEntry の固定フィールドとして扱うメタデータのキー
+RESERVED_METADATA_KEYS = frozenset({"project", "created_at", "updated_at", "tags", "source", BLOB_DIGEST_KEY, BLOB_CHARS_KEY})
+
 
 class SourceType(str, Enum):
     """Source type for knowledge entries"""
@@ -48,16 +54,188 @@ class KnowledgeEntry(BaseModel):
             tags=metadata.get("tags", "").split(",") if metadata.get("tags") else [],
             source=SourceType(metadata.get("source", SourceType.MANUAL.value)),
             metadata={k: v for k, v in metadata.items() 
-                     if k not in ["project", "created_at", "updated_at", "tags", "source"]}
+                     if k not in RESERVED_METADATA_KEYS}
         )
 
 
+class EntryRow:
+    """Read-only view of one row of an ``EntryRows`` result set
+    
+    Exposes the same attributes as ``KnowledgeEntry`` but parses dates and
+    tags only when they are accessed. Use ``to_entry()`` when a full,
+    validated model is needed.
+    """
+    __slots__ = ("_rows", "_index")
+    
+    def __init__(self, rows: "EntryRows", index: int):
+        self._rows = rows
+        self._index = index
+    
+    @property
+    def _meta(self) -> Dict[str, Any]:
+        return self._rows.metadatas[self._index] or {}
+    
+    @property
+    def id(self) -> str:
+        return self._rows.ids[self._index]
+    
+    @property
+    def content(self) -> str:
+        """Full text; bodies kept in the blob store are read on first access"""
+        digest = self._meta.get(BLOB_DIGEST_KEY)
+        if digest and self._rows.loader is not None:
+            text = self._rows.loader(digest)
+            if text is not None:
+                return text
+        return self.preview
+    
+    @property
+    def preview(self) -> str:
+        """Stored text: the whole body, or only its leading part if it is in the blob store"""
+        return self._rows.documents[self._index] or ""
+    
+    @property
+    def content_length(self) -> int:
+        """Length of the full text, known without reading the blob"""
+        chars = self._meta.get(BLOB_CHARS_KEY)
+        return chars if isinstance(chars, int) else len(self.preview)
+    
+    @property
+    def project(self) -> str:
+        return self._meta.get("project", "")
+    
+    @property
+    def created_at(self) -> datetime:
+        value = self._meta.get("created_at")
+        return datetime.fromisoformat(value) if value else datetime.now()
+    
+    @property
+    def updated_at(self) -> datetime:
+        value = self._meta.get("updated_at")
+        return datetime.fromisoformat(value) if value else datetime.now()
+    
+    @property
+    def sort_key(self) -> Tuple[str, str]:
+        """(created_at ISO string, id): the total order used for listing"""
+        return (self._meta.get("created_at", ""), self.id)
+    
+    @property
+    def tags(self) -> List[str]:
+        tags = self._meta.get("tags")
+        return tags.split(",") if tags else []
+    
+    @property
+    def source(self) -> SourceType:
+        return SourceType(self._meta.get("source", SourceType.MANUAL.value))
+    
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return {k: v for k, v in self._meta.items() if k not in RESERVED_METADATA_KEYS}
+    
+    def to_entry(self) -> KnowledgeEntry:
+        """Materialize this row as a validated ``KnowledgeEntry``"""
+        return KnowledgeEntry.from_chroma_result(self.id, self.content, self._meta)
+
+
+class EntryRows(Sequence):
+    """Columnar result set over the parallel arrays returned by ChromaDB
+    
+    Rows are ``EntryRow`` views created on access; ``order`` is a permutation
+    of row indices so sorting and slicing never copy the columns.
+    """
+    __slots__ = ("ids", "documents", "metadatas", "_order", "loader")
+    
+    def __init__(self, ids: List[str], documents: Optional[List[Optional[str]]],
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]], order: Optional[List[int]] = None,
+                 loader: Optional[Callable[[str], Optional[str]]] = None):
+        self.ids = ids or []
+        self.documents = documents if documents is not None else [None] * len(self.ids)
+        self.metadatas = metadatas if metadatas is not None else [None] * len(self.ids)
+        self._order = order
+        # 本文が blob に保存されているエントリの全文を digest から読む関数
+        self.loader = loader
+    
+    @classmethod
+    def from_chroma(cls, results: Dict[str, Any],
+                    loader: Optional[Callable[[str], Optional[str]]] = None) -> "EntryRows":
+        """Wrap the result of ``collection.get`` without copying it"""
+        return cls(results.get("ids") or [], results.get("documents"), results.get("metadatas"), loader=loader)
+    
+    def _row_index(self, position: int) -> int:
+        return self._order[position] if self._order is not None else position
+    
+    def __len__(self) -> int:
+        return len(self._order) if self._order is not None else len(self.ids)
+    
+    @overload
+    def __getitem__(self, position: int) -> EntryRow: ...
+    
+    @overload
+    def __getitem__(self, position: slice) -> "EntryRows": ...
+    
+    def __getitem__(self, position: Union[int, slice]) -> Union[EntryRow, "EntryRows"]:
+        if isinstance(position, slice):
+            order = self._order if self._order is not None else range(len(self.ids))
+            return EntryRows(self.ids, self.documents, self.metadatas, list(order[position]), self.loader)
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("EntryRows index out of range")
+        return EntryRow(self, self._row_index(position))
+    
+    def __iter__(self) -> Iterator[EntryRow]:
+        for position in range(len(self)):
+            yield EntryRow(self, self._row_index(position))
+    
+    def sorted_by_created(self, reverse: bool = True) -> "EntryRows":
+        """Rows ordered by creation time (newest first by default)
+        
+        ISO-8601 timestamps sort chronologically as strings, so no datetime
+        parsing is needed. Ties are broken by ID so the order is total.
+        """
+        order = self._order if self._order is not None else range(len(self.ids))
+        ids = self.ids
+        metadatas = self.metadatas
+        
+        def created(index: int) -> Tuple[str, str]:
+            return ((metadatas[index] or {}).get("created_at", ""), ids[index])
+        
+        return EntryRows(self.ids, self.documents, self.metadatas, sorted(order, key=created, reverse=reverse), self.loader)
+    
+    def position_after(self, key: Sequence[str]) -> int:
+        """Position of the first row that sorts after ``key`` in newest-first order"""
+        key = tuple(key)
+        for position, row in enumerate(self):
+            if row.sort_key < key:
+                return position
+        return len(self)
+    
+    def to_entries(self) -> List[KnowledgeEntry]:
+        """Materialize every row as a ``KnowledgeEntry``"""
+        return [row.to_entry() for row in self]
+
+
 class ProjectInfo(BaseModel):
     """Model for project information"""
     name: str = Field(..., description="Project name")
     total_entries: int = Field(default=0, description="Total number of entries")
     created_at: datetime = Field(default_factory=datetime.now, description="Project creation timestamp")
     last_updated: Optional[datetime] = Field(default=None, description="Last update timestamp")
+    embedding_model: Optional[str] = Field(default=None, description="provider:model the entries were embedded with")
+    shard_by: Optional[str] = Field(default=None, description="Sharding mode (month or size), None if unsharded")
+    shards: int = Field(default=0, description="Number of shard collections")
+    
+    
+class RetentionPolicy(BaseModel):
+    """Per-project limits applied by ``prune`` (None: no limit)"""
+    max_age_days: Optional[float] = Field(default=None, description="Remove entries not updated or accessed for this many days")
+    max_entries: Optional[int] = Field(default=None, description="Keep at most this many entries, evicting the least recently used")
+    min_hits: Optional[int] = Field(default=None, description="Remove entries with fewer search/get hits once older than grace_days")
+    grace_days: float = Field(default=7.0, description="Age before min_hits applies to an entry")
+    
+    def is_empty(self) -> bool:
+        """Whether the policy never removes anything"""
+        return self.max_age_days is None and self.max_entries is None and self.min_hits is None
     
     
 class SearchResult(BaseModel):
@@ -67,6 +245,21 @@ class SearchResult(BaseModel):
     rank: int = Field(..., description="Rank in search results")
 
 
+class SearchHit:
+    """Lightweight search result with the same attributes as ``SearchResult``"""
+    __slots__ = ("entry", "similarity_score", "rank")
+    
+    def __init__(self, entry: Union[EntryRow, KnowledgeEntry], similarity_score: float, rank: int):
+        self.entry = entry
+        self.similarity_score = similarity_score
+        self.rank = rank
+    
+    def to_result(self) -> SearchResult:
+        """Materialize as a validated ``SearchResult``"""
+        entry = self.entry.to_entry() if isinstance(self.entry, EntryRow) else self.entry
+        return SearchResult(entry=entry, similarity_score=self.similarity_score, rank=self.rank)
+
+
 class AppConfig(BaseModel):
     """Application configuration model"""
     embedding_model: str = Field(default="text-embedding-3-small", description="OpenAI embedding model")
@@ -76,4 +269,34 @@ class AppConfig(BaseModel):
     config_path: str = Field(default="~/.chroma-memo/config.yaml", description="Config file path")
     max_results: int = Field(default=10, description="Maximum search results")
     similarity_threshold: float = Field(default=0.1, description="Similarity threshold for searches")
-    export_formats: List[str] = Field(default=["json", "csv", "markdown"], description="Supported export formats") 
\ No newline at end of file
+    export_formats: List[str] = Field(default=["json", "csv", "markdown"], description="Supported export formats")
+    search_engine: str = Field(default="auto", description="Default search engine (exact, hnsw or auto)")
+    exact_engine_max_entries: int = Field(default=20000, description="Largest project that 'auto' serves with the exact engine")
+    quantization: str = Field(default="none", description="Quantized sidecar for the exact engine (none, int8 or binary)")
+    quantization_rerank_factor: int = Field(default=10, description="Candidates re-scored per requested result when quantized")
+    async_ingest: bool = Field(default=False, description="Queue writes and embed/index them in the background")
+    ingest_batch_size: int = Field(default=64, description="Entries embedded per background ingest batch")
+    ingest_max_retries: int = Field(default=8, description="Attempts before a queued entry is marked as failed")
+    lock_timeout: float = Field(default=10.0, description="Seconds to wait for the database write lock")
+    use_daemon: bool = Field(default=False, description="Forward CLI commands to a warm background daemon")
+    daemon_idle_timeout: float = Field(default=1800.0, description="Seconds without requests before the daemon exits (0: never)")
+    mcp_max_workers: int = Field(default=4, description="Worker threads that run MCP tool calls")
+    mcp_tool_timeout: float = Field(default=60.0, description="Seconds an MCP tool call may take (0: no limit)")
+    mcp_max_chars: int = Field(default=8000, description="Default size budget of MCP list/search responses (0: no limit)")
+    write_coalesce_window: float = Field(default=0.02, description="Seconds the MCP server waits to batch concurrent adds (0: off)")
+    write_coalesce_max_batch: int = Field(default=64, description="Largest batch of adds written at once by the MCP server")
+    metrics_log: bool = Field(default=False, description="Append timing spans to metrics.jsonl for 'chroma-memo stats'")
+    access_tracking: bool = Field(default=True, description="Record hit counts and last access per entry for retention policies")
+    access_flush_interval: float = Field(default=30.0, description="Seconds buffered access stats may wait before being written")
+    auto_prune_interval: float = Field(default=3600.0, description="Seconds between retention passes while serving MCP (0: off)")
+    shard_query_workers: int = Field(default=4, description="Threads that query the shards of a sharded project in parallel")
+    blob_threshold_chars: int = Field(default=0, description="Store bodies longer than this in the compressed blob store (0: off)")
+    blob_preview_chars: int = Field(default=1000, description="Leading characters kept in the collection for blob-stored bodies")
+    blob_compression: str = Field(default="auto", description="Blob compression (auto, zstd or zlib)")
+    storage_backend: str = Field(default="chroma", description="Storage backend (chroma or sqlite)")
+    embedding_timeout: float = Field(default=30.0, description="Seconds an embedding API request may take")
+    embedding_max_retries: int = Field(default=2, description="Retries of a failed embedding API request")
+    embedding_pool_connections: int = Field(default=8, description="Keep-alive HTTP connections to the embedding API")
+    embedding_keepalive: float = Field(default=120.0, description="Seconds an idle embedding API connection is kept open")
+    warmup: bool = Field(default=True, description="Load collections and connect to the embedding API when serve/daemon starts")
+    warmup_replay_queries: int = Field(default=0, description="Recent searches logged and replayed at warm-up (0: no query log)") 
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+Cursor pagination and size budgets for MCP tool responses
+
+大きなプロジェクトでもツールの応答がエージェントのコンテキストを圧迫しないよう、
+一覧・検索結果をページに分け、文字数の上限内に収める。継続トークンは中身を
+意識させない不透明な文字列として返す。
+"""
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+OUTPUT_TEXT = "text"
+OUTPUT_JSON = "json"
+OUTPUT_FORMATS = (OUTPUT_TEXT, OUTPUT_JSON)
+
+# 予算を切り詰めても1件あたり最低限残す本文の文字数
+MIN_SNIPPET_CHARS = 200
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Serialize pagination state into an opaque URL-safe token"""
+    raw = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(token: str, kind: str, project: str) -> Dict[str, Any]:
+    """Parse a token from ``encode_cursor`` and check it belongs to this listing"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(state, dict) or state.get("k") != kind or state.get("p") != project:
+        raise ValueError(f"Cursor does not belong to this {kind} of project '{project}'")
+    return state
+
+
+def query_fingerprint(query: str) -> str:
+    """Short digest used to tie a search cursor to its query"""
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+
+
+def validate_output_format(output_format: str) -> str:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose from: {', '.join(OUTPUT_FORMATS)}")
+    return output_format
+
+
+def truncate(text: str, limit: int) -> Tuple[str, bool]:
+    """Cut ``text`` to ``limit`` characters; returns (text, truncated)"""
+    if limit <= 0 or len(text) <= limit:
+        return text, False
+    return text[:limit], True
+
+
+def rendered_size(item: Union[str, Dict[str, Any]]) -> int:
+    if isinstance(item, str):
+        return len(item)
+    return len(json.dumps(item, ensure_ascii=False))
+
+
+def fit_to_budget(items: Sequence[Any], render: Callable[[Any], Union[str, Dict[str, Any]]],
+                  max_chars: Optional[int], reserved: int = 0) -> List[Union[str, Dict[str, Any]]]:
+    """Render items in order until the next one would exceed ``max_chars``
+
+    ``reserved`` accounts for headers and footers. At least one item is
+    always returned so that pagination can make progress.
+    """
+    rendered: List[Union[str, Dict[str, Any]]] = []
+    used = reserved
+    for item in items:
+        part = render(item)
+        size = rendered_size(part)
+        if rendered and max_chars and used + size > max_chars:
+            break
+        rendered.append(part)
+        used += size
+    return rendered
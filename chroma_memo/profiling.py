@@ -0,0 +1,215 @@
+"""
+On-demand cProfile / tracemalloc hooks for CLI commands and MCP tool calls
+
+`chroma-memo --profile <command>` または `CHROMA_MEMO_PROFILE` を設定した
+`serve` で有効になる。呼び出しごとに cProfile の結果 (.pstats) と
+flamegraph.pl / speedscope で読める collapsed stack (.collapsed)、必要なら
+tracemalloc のメモリ確保の差分 (.alloc.txt) を書き出す。本番で使うときは
+N回に1回だけ計測してオーバーヘッドを抑える。
+"""
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+
+# collapsed stack で辿る最大の深さと、辿る呼び出しの最小の時間
+# （マイクロ秒、および全体に対する割合）
+_MAX_STACK_DEPTH = 64
+_MIN_COLLAPSED_US = 1.0
+_MIN_COLLAPSED_FRACTION = 0.0005
+# tracemalloc が記録するスタックの深さと、差分を書き出す件数
+_TRACEMALLOC_FRAMES = 25
+_ALLOC_TOP = 30
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in _TRUE_VALUES
+
+
+class Profiler:
+    """Profiles sampled invocations of named operations into files"""
+
+    def __init__(self):
+        self.output_dir: Optional[Path] = None
+        self.every = 1
+        self.memory = False
+        self._resolved = False
+        self._lock = threading.Lock()
+        self._calls: Dict[str, int] = defaultdict(int)
+        # cProfile (3.12+) と tracemalloc はプロセスで同時に1つだけ
+        self._active = threading.Lock()
+
+    def configure(self, output_dir: Optional[Union[str, Path]], every: int = 1, memory: bool = False) -> None:
+        """Enable profiling into ``output_dir`` (None disables it)"""
+        with self._lock:
+            self.output_dir = Path(output_dir).expanduser() if output_dir else None
+            self.every = max(1, int(every))
+            self.memory = memory
+            self._calls.clear()
+            self._resolved = True
+
+    def _resolve(self) -> None:
+        # CHROMA_MEMO_PROFILE: 1/true なら既定のディレクトリ、それ以外の値は出力先のパス
+        if self._resolved:
+            return
+        value = os.getenv("CHROMA_MEMO_PROFILE", "").strip()
+        if value and value.lower() not in ("0", "false", "no", "off"):
+            every = os.getenv("CHROMA_MEMO_PROFILE_EVERY", "1")
+            self.configure(
+                default_profile_dir() if value.lower() in _TRUE_VALUES else value,
+                every=int(every) if every.strip().isdigit() else 1,
+                memory=_env_flag("CHROMA_MEMO_PROFILE_MEMORY"),
+            )
+        self._resolved = True
+
+    @property
+    def enabled(self) -> bool:
+        self._resolve()
+        return self.output_dir is not None
+
+    def _sampled(self, operation: str) -> bool:
+        with self._lock:
+            count = self._calls[operation]
+            self._calls[operation] = count + 1
+        # 各操作の最初の呼び出しは必ず計測する
+        return count % self.every == 0
+
+    @contextmanager
+    def profile(self, operation: str) -> Iterator[None]:
+        """Profile the enclosed block if profiling is on and this call is sampled"""
+        if not self.enabled or not self._sampled(operation):
+            yield
+            return
+        # 別スレッドで計測中ならこの呼び出しは計測しない
+        if not self._active.acquire(blocking=False):
+            yield
+            return
+        try:
+            yield from self._run_profiled(operation)
+        finally:
+            self._active.release()
+
+    def _run_profiled(self, operation: str) -> Iterator[None]:
+        import tracemalloc
+
+        started_tracing = False
+        before = None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(_TRACEMALLOC_FRAMES)
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            after = peak = None
+            if before is not None:
+                after = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            try:
+                self._write(operation, profile, before, after, peak)
+            except OSError as e:
+                # 計測のせいで本来の処理を失敗させない
+                print(f"⚠️  Failed to write profile for {operation}: {e}", file=sys.stderr)
+
+    def wrap(self, operation: str, func: Callable[[], Any]) -> Callable[[], Any]:
+        """``func`` with its calls profiled as ``operation``"""
+        def profiled() -> Any:
+            with self.profile(operation):
+                return func()
+        return profiled
+
+    def _write(self, operation: str, profile: cProfile.Profile, before: Any, after: Any,
+               peak: Optional[int]) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        name = re.sub(r"[^\w.-]", "_", operation)
+        base = self.output_dir / f"{name}-{stamp}-{os.getpid()}"
+
+        profile.dump_stats(str(base) + ".pstats")
+        stats = pstats.Stats(profile).stats  # type: ignore[attr-defined]
+        with open(str(base) + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, micros in sorted(collapsed_stacks(stats).items()):
+                f.write(f"{stack} {micros}\n")
+
+        if after is not None:
+            with open(str(base) + ".alloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"# {operation}: peak traced memory {peak / (1024 * 1024):.2f} MiB\n")
+                f.write(f"# top {_ALLOC_TOP} allocation changes by line\n")
+                for stat in after.compare_to(before, "lineno")[:_ALLOC_TOP]:
+                    f.write(f"{stat}\n")
+
+        print(f"🔬 Profile written: {base}.pstats", file=sys.stderr)
+
+
+def _label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        # 組み込み関数 ("<built-in method ...>")
+        return name.replace(";", ":")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+
+def collapsed_stacks(stats: Dict[Tuple[str, int, str], Any]) -> Dict[str, int]:
+    """Approximate collapsed stacks (``a;b;c`` -> self microseconds) from pstats data
+
+    cProfile only records caller/callee pairs, so time below each edge is
+    split in proportion to that edge's share of the callee's total time.
+    """
+    callees: Dict[Tuple[str, int, str], List[Tuple[Tuple[str, int, str], float]]] = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+
+    roots = [func for func, (_, _, _, _, callers) in stats.items() if not callers]
+    total_us = sum(stats[func][3] for func in roots) * 1e6
+    # 大きな呼び出しグラフでも辿るパスの数が爆発しないよう、小さい枝は省く
+    cutoff_us = max(_MIN_COLLAPSED_US, total_us * _MIN_COLLAPSED_FRACTION)
+    stacks: Dict[str, int] = defaultdict(int)
+
+    def walk(func: Tuple[str, int, str], path: List[str], on_path: set, share: float) -> None:
+        _, _, self_time, total_time, _ = stats[func]
+        micros = self_time * share * 1e6
+        if micros >= _MIN_COLLAPSED_US:
+            stacks[";".join(path)] += int(round(micros))
+        if len(path) >= _MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in callees.get(func, ()):
+            callee_total = stats[callee][3]
+            if callee in on_path or callee_total <= 0:
+                continue
+            callee_share = min(1.0, edge_time * share / callee_total)
+            if callee_total * callee_share * 1e6 < cutoff_us:
+                continue
+            on_path.add(callee)
+            walk(callee, path + [_label(callee)], on_path, callee_share)
+            on_path.discard(callee)
+
+    for func in roots:
+        walk(func, [_label(func)], {func}, 1.0)
+    return dict(stacks)
+
+
+def default_profile_dir() -> Path:
+    """``profiles/`` next to config.yaml"""
+    from .config import config_manager
+    return config_manager.config_dir / "profiles"
+
+
+profiler = Profiler()
@@ -0,0 +1,225 @@
+"""
+Quantized sidecar index for the exact search engine
+
+埋め込みを int8 (スカラー量子化) または 1bit (符号) に量子化したサイドカーを
+作り、第一段の候補スキャンに使う。候補は元の float32 行列で再スコアリングする。
+"""
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+QUANT_NONE = "none"
+QUANT_INT8 = "int8"
+QUANT_BINARY = "binary"
+QUANTIZATIONS = (QUANT_NONE, QUANT_INT8, QUANT_BINARY)
+
+# 量子化・スキャン時に一度に処理する行数（一時メモリを抑える）
+_BLOCK_ROWS = 8192
+
+# uint8 の各値に立っているビット数
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(matrix: np.ndarray):
+    """Symmetric per-row int8 quantization; returns (codes, scales)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    """Sign quantization packed into bytes (one bit per dimension)"""
+    return np.packbits(np.asarray(matrix) > 0, axis=1)
+
+
+class QuantizedSidecar:
+    """Quantized codes stored next to an exact index
+
+    Files in the exact index directory:
+      - <mode>.codes: int8 codes (int8) or packed sign bits (binary)
+      - <mode>.scales: per-row float32 scales (int8 only)
+      - <mode>.json: {"dim": int, "count": int}
+    """
+
+    def __init__(self, index_dir: Path, mode: str):
+        if mode not in (QUANT_INT8, QUANT_BINARY):
+            raise ValueError(f"Unknown quantization '{mode}'. Choose from: {', '.join(QUANTIZATIONS)}")
+        self.index_dir = Path(index_dir)
+        self.mode = mode
+        self._codes_path = self.index_dir / f"{mode}.codes"
+        self._scales_path = self.index_dir / f"{mode}.scales"
+        self._meta_path = self.index_dir / f"{mode}.json"
+
+    def _row_bytes(self, dim: int) -> int:
+        return dim if self.mode == QUANT_INT8 else (dim + 7) // 8
+
+    def _encode(self, rows: np.ndarray):
+        if self.mode == QUANT_INT8:
+            return quantize_int8(rows)
+        return quantize_binary(rows), None
+
+    def count(self) -> Optional[int]:
+        """Number of quantized rows, or None if the sidecar is missing"""
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)["count"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def nbytes(self) -> int:
+        """Size of the sidecar on disk"""
+        return sum(p.stat().st_size for p in (self._codes_path, self._scales_path) if p.exists())
+
+    def _write_meta(self, dim: int, count: int) -> None:
+        tmp_path = self._meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": dim, "count": count}, f)
+        tmp_path.replace(self._meta_path)
+
+    def build(self, matrix: np.ndarray) -> None:
+        """(Re)build codes for every row of ``matrix`` block by block"""
+        dim = matrix.shape[1]
+        with open(self._codes_path, "wb") as cf, open(self._scales_path, "wb") as sf:
+            for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+                codes, scales = self._encode(matrix[start:start + _BLOCK_ROWS])
+                cf.write(codes.tobytes())
+                if scales is not None:
+                    sf.write(scales.tobytes())
+        self._write_meta(dim, matrix.shape[0])
+
+    def append(self, rows: np.ndarray, new_count: int) -> None:
+        """Append codes for newly indexed rows"""
+        codes, scales = self._encode(rows)
+        with open(self._codes_path, "ab") as cf:
+            cf.write(codes.tobytes())
+        if scales is not None:
+            with open(self._scales_path, "ab") as sf:
+                sf.write(scales.tobytes())
+        self._write_meta(rows.shape[1], new_count)
+
+    def invalidate(self) -> None:
+        for path in (self._codes_path, self._scales_path, self._meta_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def ensure(self, matrix: np.ndarray) -> None:
+        """Rebuild the sidecar if it does not match the full-precision matrix"""
+        if self.count() != matrix.shape[0]:
+            self.build(matrix)
+
+    def scores(self, query: np.ndarray, count: int) -> np.ndarray:
+        """Approximate similarity of ``query`` against every quantized row"""
+        dim = query.shape[0]
+        row_bytes = self._row_bytes(dim)
+        if self.mode == QUANT_INT8:
+            codes = np.memmap(self._codes_path, dtype=np.int8, mode="r", shape=(count, row_bytes))
+            scales = np.fromfile(self._scales_path, dtype=np.float32, count=count)
+        else:
+            codes = np.memmap(self._codes_path, dtype=np.uint8, mode="r", shape=(count, row_bytes))
+            query_bits = quantize_binary(query.reshape(1, -1))[0]
+
+        result = np.empty(count, dtype=np.float32)
+        for start in range(0, count, _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS]
+            if self.mode == QUANT_INT8:
+                result[start:start + len(block)] = (block.astype(np.float32) @ query) * scales[start:start + len(block)]
+            else:
+                # ハミング距離が小さいほど類似
+                hamming = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1, dtype=np.int32)
+                result[start:start + len(block)] = -hamming
+        return result
+
+    def candidates(self, query: np.ndarray, count: int, n_candidates: int) -> np.ndarray:
+        """Row indices of the ``n_candidates`` best rows by approximate score"""
+        scores = self.scores(query, count)
+        if n_candidates >= count:
+            return np.arange(count)
+        return np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first"""
+    total = scores.shape[0]
+    k = min(k, total)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < total:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(total)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def rescore(matrix: np.ndarray, query: np.ndarray, candidates: np.ndarray, k: int):
+    """Exactly re-score a shortlist with full vectors; returns (rows, cosines)"""
+    # memmap上で連続的に読むために行番号順に並べる
+    candidates = np.sort(candidates)
+    cosines = matrix[candidates] @ query
+    best = top_k(cosines, k)
+    return candidates[best], cosines[best]
+
+
+def recall_report(matrix: np.ndarray, sidecars: Sequence[QuantizedSidecar], k: int = 10,
+                  samples: int = 100, rerank_factor: int = 10, seed: int = 0) -> List[Dict[str, Any]]:
+    """Compare quantized two-stage search against full-precision search
+
+    Stored vectors of randomly sampled entries are used as queries. For each
+    mode the report gives recall@k of the first stage alone and after exact
+    re-scoring, mean latency, and the sidecar size versus the float32 matrix.
+    """
+    count = matrix.shape[0]
+    if count == 0:
+        return []
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(count, size=min(samples, count), replace=False)
+    k = min(k, count)
+    n_candidates = min(count, k * max(rerank_factor, 1))
+
+    truth = []
+    started = time.perf_counter()
+    for row in query_rows:
+        query = np.asarray(matrix[row], dtype=np.float32)
+        truth.append(set(top_k(matrix @ query, k).tolist()))
+    full_ms = (time.perf_counter() - started) * 1000.0 / len(query_rows)
+
+    report = [{
+        "mode": QUANT_NONE,
+        "k": k,
+        "queries": len(query_rows),
+        "first_stage_recall": 1.0,
+        "recall": 1.0,
+        "mean_latency_ms": full_ms,
+        "index_bytes": int(matrix.shape[0] * matrix.shape[1] * 4),
+    }]
+
+    for sidecar in sidecars:
+        sidecar.ensure(matrix)
+        first_hits = 0
+        hits = 0
+        started = time.perf_counter()
+        for row, expected in zip(query_rows, truth):
+            query = np.asarray(matrix[row], dtype=np.float32)
+            shortlist = top_k(sidecar.scores(query, count), n_candidates)
+            rows, _ = rescore(matrix, query, shortlist, k)
+            hits += len(expected.intersection(rows.tolist()))
+            first_hits += len(expected.intersection(shortlist[:k].tolist()))
+        elapsed_ms = (time.perf_counter() - started) * 1000.0 / len(query_rows)
+
+        report.append({
+            "mode": sidecar.mode,
+            "k": k,
+            "queries": len(query_rows),
+            "first_stage_recall": first_hits / (k * len(query_rows)),
+            "recall": hits / (k * len(query_rows)),
+            "mean_latency_ms": elapsed_ms,
+            "index_bytes": sidecar.nbytes(),
+        })
+    return report
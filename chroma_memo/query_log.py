@@ -0,0 +1,79 @@
+"""
+Log of recent search queries, replayed to warm up a starting server
+
+`warmup_replay_queries` が 0 より大きいときだけ、検索したクエリを
+`<db_path>/query_log.jsonl` に追記する。`serve` / デーモンの起動時に直近の
+クエリをもう一度検索して、埋め込み API への接続・インデックス・ページ
+キャッシュを温めておく。ファイルはローカルにだけ置き、起動時に古い行を切り詰める。
+"""
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+
+# ファイルに残す行数の下限（replay する件数の何倍かも残す）
+_MIN_KEEP_LINES = 1000
+_KEEP_FACTOR = 10
+
+
+class QueryLog:
+    """Append-only JSON Lines of (time, project, query)"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def record(self, project: str, queries: List[str]) -> None:
+        """Append ``queries`` (never fails the search that made them)"""
+        now = time.time()
+        lines = "".join(
+            json.dumps({"t": now, "p": project, "q": query}, ensure_ascii=False) + "\n"
+            for query in queries if query and query.strip()
+        )
+        if not lines:
+            return
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            print(f"⚠️  Failed to write the query log: {e}", file=sys.stderr)
+
+    def recent(self, limit: int) -> List[Tuple[str, str]]:
+        """The last ``limit`` distinct (project, query) pairs, oldest first
+
+        Also trims the file to its most recent lines.
+        """
+        if limit <= 0 or not self.path.exists():
+            return []
+        with self._lock:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            keep = max(_MIN_KEEP_LINES, limit * _KEEP_FACTOR)
+            if len(lines) > keep:
+                lines = lines[-keep:]
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+                tmp.replace(self.path)
+
+        pairs: List[Tuple[str, str]] = []
+        seen = set()
+        for line in reversed(lines):
+            try:
+                record = json.loads(line)
+                pair = (record["p"], record["q"])
+            except (ValueError, KeyError, TypeError):
+                # 書きかけの行などは読み飛ばす
+                continue
+            if pair in seen:
+                continue
+            seen.add(pair)
+            pairs.append(pair)
+            if len(pairs) >= limit:
+                break
+        return pairs[::-1]
@@ -0,0 +1,175 @@
+"""
+Resumable re-embedding of a project into a new embedding model
+
+既存のコレクションはそのまま検索に使い続け、本文を `reembed_<コレクション名>`
+というシャドウコレクションへ新しいモデルで埋め込み直す。バッチごとに
+シャドウへ書き込むので、それ自体がチェックポイントになり、中断しても
+同じコマンドで未処理の分だけを再開できる。最後に書き込みロックを取って
+途中で追加・削除された分を反映し、コレクション名を入れ替える。
+"""
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, TYPE_CHECKING
+
+from .embeddings import EmbeddingService, get_embedding_service_for
+
+if TYPE_CHECKING:
+    from .database import ChromaMemoDatabase
+
+
+SHADOW_PREFIX = "reembed_"
+RETIRED_PREFIX = "retired_"
+
+# シャドウにだけ付けるメタデータ（入れ替え時に外す）
+_TARGET_KEY = "reembed_target"
+_STARTED_KEY = "reembed_started_at"
+
+
+def shadow_collection_name(collection_name: str) -> str:
+    # "project_" で始まらないので projects の一覧には出ない
+    return f"{SHADOW_PREFIX}{collection_name}"
+
+
+def _settable(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    # hnsw:* は作成後に変更できない
+    return {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}
+
+
+class Reembedder:
+    """Migrates one project to ``target`` with batched, parallel, checkpointed embedding"""
+
+    def __init__(self, db: "ChromaMemoDatabase", project_name: str, target: Optional[str] = None,
+                 batch_size: int = 64, workers: int = 4,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 collection_name: Optional[str] = None):
+        self.db = db
+        self.project_name = project_name
+        self.embedder: EmbeddingService = get_embedding_service_for(target)
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.progress = progress or (lambda done, total: None)
+        # シャーディングされたプロジェクトではシャードを1つずつ移行する
+        self.collection_name = collection_name or db._get_collection_name(project_name)
+        self.shadow_name = shadow_collection_name(self.collection_name)
+
+    def _open_shadow(self, source) -> Any:
+        """Create the shadow collection, or reuse the one left by an interrupted run"""
+        client = self.db.client
+        try:
+            shadow = client.get_collection(self.shadow_name)
+        except Exception:
+            shadow = None
+        if shadow is not None and (shadow.metadata or {}).get(_TARGET_KEY) != self.embedder.signature:
+            # 別のモデルへの移行の残りは使えない
+            print(f"🗑️  Discarding shadow collection for {(shadow.metadata or {}).get(_TARGET_KEY)}", file=sys.stderr)
+            with self.db._write_lock:
+                client.delete_collection(self.shadow_name)
+            shadow = None
+        if shadow is not None:
+            return shadow
+
+        metadata = dict(source.metadata or {})
+        metadata.update({
+            "embedding_model": self.embedder.signature,
+            _TARGET_KEY: self.embedder.signature,
+            _STARTED_KEY: datetime.now().isoformat(),
+        })
+        with self.db._write_lock:
+            return client.create_collection(name=self.shadow_name, metadata=metadata)
+
+    def _embed_batch(self, source, ids: List[str]) -> Dict[str, Any]:
+        fetched = source.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            "ids": fetched["ids"],
+            "documents": fetched["documents"],
+            "metadatas": fetched["metadatas"],
+            # blob に保存された本文は全文で埋め込む
+            "embeddings": self.embedder.get_embeddings([
+                self.db._full_text(document, metadata)
+                for document, metadata in zip(fetched["documents"], fetched["metadatas"])
+            ]) if fetched["ids"] else [],
+        }
+
+    def _copy(self, source, shadow, ids: List[str], lock: bool = True) -> int:
+        """Embed ``ids`` on the worker pool and write each batch to the shadow as it completes"""
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        copied = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chroma-memo-reembed") as pool:
+            pending: List[Future] = []
+            next_batch = 0
+            while next_batch < len(batches) or pending:
+                # 先読みはワーカー数の2倍まで（メモリを抑える）
+                while next_batch < len(batches) and len(pending) < self.workers * 2:
+                    pending.append(pool.submit(self._embed_batch, source, batches[next_batch]))
+                    next_batch += 1
+                batch = pending.pop(0).result()
+                if batch["ids"]:
+                    if lock:
+                        # シャドウは他のプロセスから読まれないので、変更シーケンスは更新しない
+                        with self.db._write_lock:
+                            shadow.upsert(**batch)
+                    else:
+                        shadow.upsert(**batch)
+                copied += len(batch["ids"])
+                yield copied
+
+    def run(self, keep_old: bool = False) -> Dict[str, Any]:
+        """Re-embed every entry, then swap the shadow in; returns a summary"""
+        db = self.db
+        if not db.project_exists(self.project_name):
+            raise ValueError(f"Project '{self.project_name}' does not exist.")
+
+        started = time.perf_counter()
+        source = db.client.get_collection(self.collection_name)
+        source_model = (source.metadata or {}).get("embedding_model")
+        shadow = self._open_shadow(source)
+
+        source_ids = source.get(include=[])["ids"] or []
+        done: Set[str] = set(shadow.get(include=[])["ids"] or [])
+        todo = [doc_id for doc_id in source_ids if doc_id not in done]
+        resumed = len(done)
+        total = len(source_ids)
+
+        self.progress(total - len(todo), total)
+        for copied in self._copy(source, shadow, todo):
+            self.progress(total - len(todo) + copied, total)
+
+        retired_name = None
+        with db._writing():
+            # 移行中に追加・削除された分を反映してから入れ替える
+            source = db.client.get_collection(self.collection_name)
+            source_ids = source.get(include=[])["ids"] or []
+            shadow_ids = set(shadow.get(include=[])["ids"] or [])
+            missing = [doc_id for doc_id in source_ids if doc_id not in shadow_ids]
+            removed = [*(shadow_ids - set(source_ids))]
+            for _ in self._copy(source, shadow, missing, lock=False):
+                pass
+            if removed:
+                shadow.delete(ids=removed)
+
+            retired_name = f"{RETIRED_PREFIX}{self.collection_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            metadata = _settable(shadow.metadata or {})
+            metadata.pop(_TARGET_KEY, None)
+            metadata.pop(_STARTED_KEY, None)
+            source.modify(name=retired_name)
+            shadow.modify(name=self.collection_name, metadata=metadata)
+            if not keep_old:
+                db.client.delete_collection(retired_name)
+                retired_name = None
+
+            db.exact_index.invalidate(self.collection_name)
+            db.exact_index.invalidate(self.shadow_name)
+
+        return {
+            "project": self.project_name,
+            "from": source_model,
+            "to": self.embedder.signature,
+            "entries": len(source_ids),
+            "resumed": resumed,
+            "caught_up": len(missing),
+            "removed": len(removed),
+            "seconds": round(time.perf_counter() - started, 2),
+            "retired_collection": retired_name,
+        }
@@ -0,0 +1,90 @@
+"""
+Retention policies and pruning of stale knowledge
+
+プロジェクトごとの保持ポリシー（最大経過日数・最大件数・最低ヒット数）を
+コレクションのメタデータに保存し、`prune` またはサーバーのバックグラウンド
+タスクで適用する。エントリの「最終利用」は更新日時とアクセス統計の最終
+アクセス時刻の新しい方。
+"""
+import sys
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from .models import RetentionPolicy
+
+
+# コレクションのメタデータでのキー
+_METADATA_PREFIX = "retention_"
+_POLICY_FIELDS = ("max_age_days", "max_entries", "min_hits", "grace_days")
+
+REASON_MAX_AGE = "max_age"
+REASON_MIN_HITS = "min_hits"
+REASON_MAX_ENTRIES = "max_entries"
+
+_DAY = 86400.0
+
+
+def policy_from_metadata(metadata: Dict[str, Any]) -> RetentionPolicy:
+    return RetentionPolicy(**{
+        field: metadata[_METADATA_PREFIX + field]
+        for field in _POLICY_FIELDS
+        if metadata.get(_METADATA_PREFIX + field) is not None
+    })
+
+
+def policy_to_metadata(metadata: Dict[str, Any], policy: RetentionPolicy) -> Dict[str, Any]:
+    """``metadata`` with its retention keys replaced by ``policy``"""
+    updated = {k: v for k, v in metadata.items() if not k.startswith(_METADATA_PREFIX)}
+    if not policy.is_empty():
+        for field in _POLICY_FIELDS:
+            value = getattr(policy, field)
+            if value is not None:
+                updated[_METADATA_PREFIX + field] = value
+    return updated
+
+
+def select_prunable(rows: List[Dict[str, Any]], policy: RetentionPolicy, now: float) -> List[Tuple[str, str]]:
+    """(entry ID, reason) for every entry the policy removes
+
+    ``rows`` carry ``id``, ``created_at`` and ``last_active`` (unix times) and
+    ``hits``. Age and hit limits are applied first; ``max_entries`` then
+    evicts the least recently used of the survivors.
+    """
+    removed: List[Tuple[str, str]] = []
+    survivors: List[Dict[str, Any]] = []
+    for row in rows:
+        if policy.max_age_days is not None and row["last_active"] < now - policy.max_age_days * _DAY:
+            removed.append((row["id"], REASON_MAX_AGE))
+        elif (policy.min_hits is not None and row["hits"] < policy.min_hits
+              and row["created_at"] < now - policy.grace_days * _DAY):
+            removed.append((row["id"], REASON_MIN_HITS))
+        else:
+            survivors.append(row)
+
+    if policy.max_entries is not None and len(survivors) > policy.max_entries:
+        survivors.sort(key=lambda row: (row["last_active"], row["hits"], row["created_at"]))
+        excess = len(survivors) - policy.max_entries
+        removed.extend((row["id"], REASON_MAX_ENTRIES) for row in survivors[:excess])
+    return removed
+
+
+class RetentionWorker(threading.Thread):
+    """Background thread that applies every project's retention policy periodically"""
+
+    def __init__(self, prune: Callable[[], List[Dict[str, Any]]], interval: float):
+        super().__init__(name="chroma-memo-retention", daemon=True)
+        self.prune = prune
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                for result in self.prune():
+                    if result["removed"]:
+                        print(f"🧹 Pruned {len(result['removed'])} entries from '{result['project']}'", file=sys.stderr)
+            except Exception as e:
+                print(f"⚠️  Retention worker error: {e}", file=sys.stderr)
@@ -0,0 +1,126 @@
+"""
+Time- and size-partitioned shards for very large projects
+
+シャーディングを有効にしたプロジェクトでは、`project_<name>` コレクションは
+設定（埋め込みモデル・検索エンジン・保持ポリシーなど）とシャードの一覧だけを
+持ち、エントリは `shard_<コレクション名>_<キー>` に分けて保存する。
+
+- month: 作成月ごと (キーは YYYYMM)。日付で絞った検索・一覧は範囲外の月を読まない
+- size:  件数の上限ごと (キーは 0001, 0002, ...)。満杯になったシャードには
+         作成日時の範囲を記録し、日付で絞るときに使う
+
+検索は各シャードを並列に問い合わせ、距離で top-k をマージする。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+SHARD_BY_MONTH = "month"
+SHARD_BY_SIZE = "size"
+SHARD_MODES = (SHARD_BY_MONTH, SHARD_BY_SIZE)
+
+DEFAULT_SHARD_SIZE = 50000
+
+SHARD_PREFIX = "shard_"
+COMPACT_PREFIX = "compact_"
+
+# プロジェクト（ルート）コレクションのメタデータ
+SHARD_BY_KEY = "shard_by"
+SHARD_SIZE_KEY = "shard_size"
+SHARDS_KEY = "shards"
+# シャードのメタデータ
+SHARD_OF_KEY = "shard_of"
+SHARD_KEY_KEY = "shard_key"
+ARCHIVED_KEY = "archived"
+CREATED_FROM_KEY = "created_from"
+CREATED_TO_KEY = "created_to"
+
+# ルートからシャードに引き継ぐメタデータ
+INHERITED_KEYS = ("project_name", "embedding_model", "hnsw:space")
+
+# 日付で絞るとき、範囲の境界にかかるシャードから多めに取得する倍率
+FILTER_OVERFETCH = 4
+
+
+def shard_collection_name(collection_name: str, key: str) -> str:
+    # "project_" で始まらないので projects の一覧には出ない
+    return f"{SHARD_PREFIX}{collection_name}_{key}"
+
+
+def shard_keys(metadata: Dict[str, Any]) -> List[str]:
+    """Shard keys recorded in a project collection's metadata, oldest first"""
+    value = metadata.get(SHARDS_KEY) or ""
+    return sorted(key for key in value.split(",") if key)
+
+
+def with_shard_key(metadata: Dict[str, Any], key: str) -> Dict[str, Any]:
+    updated = dict(metadata)
+    updated[SHARDS_KEY] = ",".join(sorted(set(shard_keys(metadata)) | {key}))
+    return updated
+
+
+def month_key(created_at: str) -> str:
+    """YYYYMM of an ISO timestamp"""
+    return created_at[:4] + created_at[5:7]
+
+
+def size_key(index: int) -> str:
+    return f"{index:04d}"
+
+
+def month_range(key: str) -> Tuple[str, str]:
+    """[start, end) of a month shard as ISO timestamps"""
+    year, month = int(key[:4]), int(key[4:6])
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def shard_range(mode: str, key: str, metadata: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """Creation-time range of a shard (None where unknown, e.g. the open size shard)"""
+    if mode == SHARD_BY_MONTH:
+        return month_range(key)
+    return metadata.get(CREATED_FROM_KEY), metadata.get(CREATED_TO_KEY)
+
+
+def overlaps(mode: str, key: str, metadata: Dict[str, Any],
+             since: Optional[str], until: Optional[str]) -> bool:
+    """Whether a shard may hold entries created in [since, until)"""
+    start, end = shard_range(mode, key, metadata)
+    if since is not None and end is not None:
+        # month の end は排他的、size の created_to は最後のエントリそのもの
+        if end < since or (mode == SHARD_BY_MONTH and end == since):
+            return False
+    if until is not None and start is not None and start >= until:
+        return False
+    return True
+
+
+def in_range(created_at: str, since: Optional[str], until: Optional[str]) -> bool:
+    return (since is None or created_at >= since) and (until is None or created_at < until)
+
+
+def merge_query_results(results: Sequence[Dict[str, Any]], n_results: int,
+                        since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+    """Merge Chroma-shaped query results from several shards into the overall top ``n_results``
+
+    Rows outside [since, until) are dropped before ranking.
+    """
+    merged: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+    rows = len(results[0]["ids"]) if results else 0
+    for row in range(rows):
+        candidates = []
+        for result in results:
+            ids = result["ids"][row] if result["ids"] else []
+            for i, doc_id in enumerate(ids):
+                metadata = result["metadatas"][row][i] or {}
+                if (since or until) and not in_range(metadata.get("created_at", ""), since, until):
+                    continue
+                candidates.append((result["distances"][row][i], doc_id, result["documents"][row][i], metadata))
+        candidates.sort(key=lambda candidate: candidate[0])
+        top = candidates[:n_results]
+        merged["ids"].append([doc_id for _, doc_id, _, _ in top])
+        merged["documents"].append([document for _, _, document, _ in top])
+        merged["metadatas"].append([metadata for _, _, _, metadata in top])
+        merged["distances"].append([distance for distance, _, _, _ in top])
+    return merged
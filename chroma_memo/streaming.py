@@ -0,0 +1,146 @@
+"""
+Machine-readable row output for the CLI (list / search / projects)
+
+`--format jsonl|tsv|json` では rich の表やパネルを組み立てず、1行ずつ標準出力に
+書き出す。行は取得したページごとに出力してフラッシュするので、件数が多くても
+最初の行がすぐに届き、メモリに全件を溜め込まない。メッセージやエラーは
+標準エラーに出すので、標準出力はそのままパイプで処理できる。
+"""
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, TextIO
+
+
+FORMAT_TABLE = "table"
+FORMAT_JSONL = "jsonl"
+FORMAT_TSV = "tsv"
+FORMAT_JSON = "json"
+FORMATS = (FORMAT_TABLE, FORMAT_JSONL, FORMAT_TSV, FORMAT_JSON)
+
+
+def _entry(row: Any) -> Any:
+    # 検索結果 (SearchHit) はエントリを包んでいる
+    return getattr(row, "entry", row)
+
+
+def _content_length(row: Any) -> int:
+    entry = _entry(row)
+    length = getattr(entry, "content_length", None)
+    return length if length is not None else len(entry.content)
+
+
+# フィールド名 -> 行 (エントリ / 検索結果) から値を取り出す関数
+ENTRY_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "id": lambda row: _entry(row).id,
+    "content": lambda row: _entry(row).content,
+    "content_length": _content_length,
+    "tags": lambda row: _entry(row).tags,
+    "created_at": lambda row: _entry(row).created_at,
+    "updated_at": lambda row: _entry(row).updated_at,
+    "source": lambda row: _entry(row).source.value,
+    "project": lambda row: _entry(row).project,
+}
+SEARCH_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "rank": lambda hit: hit.rank,
+    "score": lambda hit: round(hit.similarity_score, 6),
+    **ENTRY_FIELDS,
+}
+PROJECT_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "name": lambda project: project.name,
+    "entries": lambda project: project.total_entries,
+    "created_at": lambda project: project.created_at,
+    "last_updated": lambda project: project.last_updated,
+    "embedding_model": lambda project: project.embedding_model,
+    "shard_by": lambda project: project.shard_by,
+    "shards": lambda project: project.shards,
+}
+
+DEFAULT_LIST_FIELDS = ("id", "created_at", "tags", "content")
+DEFAULT_SEARCH_FIELDS = ("rank", "score", "id", "created_at", "tags", "content")
+# search --queries-file はクエリ数が多いので、既定では本文を出さない
+DEFAULT_BATCH_SEARCH_FIELDS = ("rank", "score", "id")
+DEFAULT_PROJECT_FIELDS = ("name", "entries", "created_at", "last_updated")
+
+
+def parse_fields(value: Optional[str], available: Dict[str, Callable[[Any], Any]],
+                 default: Sequence[str]) -> List[str]:
+    """Comma-separated ``--fields`` value -> field names (``default`` if empty)"""
+    if not value:
+        return [*default]
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        raise ValueError(f"Unknown field(s) {', '.join(unknown) or '(none)'}. Choose from: {', '.join(available)}")
+    return fields
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def to_record(row: Any, fields: Sequence[str], extractors: Dict[str, Callable[[Any], Any]]) -> Dict[str, Any]:
+    """JSON-ready dict of ``fields`` of one row"""
+    return {field: _json_value(extractors[field](row)) for field in fields}
+
+
+def _tsv_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(item) for item in value)
+    # 1行1レコードを保つため、区切り文字と改行はエスケープする
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class RowWriter:
+    """Write rows as JSON Lines, TSV (with a header) or one JSON array, page by page
+
+    Use as a context manager so that the JSON array is closed even when
+    the rows run out early.
+    """
+
+    def __init__(self, stream: TextIO, output_format: str, fields: Sequence[str],
+                 extractors: Dict[str, Callable[[Any], Any]]):
+        if output_format not in FORMATS or output_format == FORMAT_TABLE:
+            raise ValueError(f"Unknown row format '{output_format}'")
+        self.stream = stream
+        self.output_format = output_format
+        self.fields = [*fields]
+        self._extractors_by_field = extractors
+        self._extractors = [extractors[field] for field in self.fields]
+        self.count = 0
+
+    def __enter__(self) -> "RowWriter":
+        if self.output_format == FORMAT_TSV:
+            self.stream.write("\t".join(self.fields) + "\n")
+        elif self.output_format == FORMAT_JSON:
+            self.stream.write("[")
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self.output_format == FORMAT_JSON:
+            self.stream.write("\n]\n" if self.count else "]\n")
+        self.stream.flush()
+
+    def write_page(self, rows: Iterable[Any]) -> None:
+        """Write ``rows`` and flush, so the consumer sees each page as soon as it is fetched"""
+        lines = []
+        for row in rows:
+            if self.output_format == FORMAT_TSV:
+                values = [extract(row) for extract in self._extractors]
+                lines.append("\t".join(_tsv_value(value) for value in values) + "\n")
+            else:
+                record = json.dumps(to_record(row, self.fields, self._extractors_by_field), ensure_ascii=False)
+                if self.output_format == FORMAT_JSON:
+                    record = ("\n  " if self.count == 0 and not lines else ",\n  ") + record
+                else:
+                    record += "\n"
+                lines.append(record)
+        self.count += len(lines)
+        self.stream.write("".join(lines))
+        self.stream.flush()
@@ -0,0 +1,137 @@
+"""
+Bounded worker pool for MCP tool calls
+
+MCP ツールは埋め込みAPI（ネットワーク）と Chroma（ディスク）でブロックするため、
+イベントループから切り離してスレッドプールで実行する。プロジェクトごとの
+読み書きロックで、検索同士は並行に、書き込みは排他的に実行される。
+"""
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class ToolTimeoutError(RuntimeError):
+    """Raised when a tool call did not finish within its timeout"""
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ToolExecutor:
+    """Runs blocking tool bodies on a bounded thread pool from async code
+
+    ``run`` waits at most ``timeout`` seconds. A call that times out or is
+    cancelled while still queued never starts; one that is already running
+    cannot be interrupted and finishes in the background.
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: Optional[float] = 60.0):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chroma-memo-tool")
+        self._locks: Dict[str, ReadWriteLock] = {}
+        self._locks_guard = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+
+    def project_lock(self, project: str) -> ReadWriteLock:
+        with self._locks_guard:
+            lock = self._locks.get(project)
+            if lock is None:
+                lock = self._locks[project] = ReadWriteLock()
+            return lock
+
+    def _log(self, message: str) -> None:
+        print(f"{message} (queued: {self.queued}, running: {self.running}/{self.max_workers})", file=sys.stderr)
+
+    async def run(self, name: str, func: Callable[[], Any], project: Optional[str] = None,
+                  write: bool = False, timeout: Optional[float] = None) -> Any:
+        """Run ``func`` in the pool under the project's read or write lock"""
+        timeout = timeout if timeout is not None else self.timeout
+
+        def job() -> Any:
+            with self._counter_lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                if project is None:
+                    return func()
+                lock = self.project_lock(project)
+                with (lock.write() if write else lock.read()):
+                    return func()
+            finally:
+                with self._counter_lock:
+                    self.running -= 1
+
+        def dequeue_if_cancelled(done) -> None:
+            if done.cancelled():
+                with self._counter_lock:
+                    self.queued -= 1
+
+        with self._counter_lock:
+            self.queued += 1
+            busy = self.running >= self.max_workers
+        if busy:
+            self._log(f"⏳ {name} is waiting for a worker")
+
+        future = self._pool.submit(job)
+        future.add_done_callback(dequeue_if_cancelled)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            started = not future.cancel()
+            self._log(f"⌛ {name} timed out after {timeout}s")
+            if started:
+                raise ToolTimeoutError(
+                    f"{name} timed out after {timeout}s; it is still running and may complete in the background"
+                ) from None
+            raise ToolTimeoutError(f"{name} timed out after {timeout}s waiting for a worker") from None
+        except asyncio.CancelledError:
+            future.cancel()
+            self._log(f"🚫 {name} was cancelled")
+            raise
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,101 @@
+"""
+Micro-batching of single-entry writes in the long-running server
+
+エージェントは memo_add を数ミリ秒おきに連続して呼ぶことが多い。短い時間窓の
+あいだに届いた追加をプロジェクトごとにまとめ、1回の埋め込みリクエストと
+1回の Chroma 書き込みで処理し、各呼び出し元にはそれぞれのIDを返す。
+"""
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# (project, items) -> one {"id", "error"} dict per item, as returned by add_knowledge_batch
+FlushFunc = Callable[[str, List[Dict[str, Any]]], List[Dict[str, Any]]]
+
+
+class WriteCoalescer:
+    """Collects adds that arrive within ``window`` seconds and writes them together
+
+    A batch is flushed when the window since its first entry has passed or
+    when a project has ``max_batch`` entries waiting, whichever comes first.
+    """
+
+    def __init__(self, flush: FlushFunc, window: float = 0.02, max_batch: int = 64):
+        self.flush = flush
+        self.window = max(window, 0.0)
+        self.max_batch = max(1, max_batch)
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], Future]]] = {}
+        self._first_arrival: Optional[float] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chroma-memo-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, project: str, content: str, tags: Optional[List[str]] = None) -> "Future[str]":
+        """Queue one entry; the future resolves to its ID once the batch is written"""
+        future: "Future[str]" = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write coalescer is closed")
+            self._pending.setdefault(project, []).append(({"content": content, "tags": tags or []}, future))
+            if self._first_arrival is None:
+                self._first_arrival = time.monotonic()
+            self._cond.notify()
+        return future
+
+    def close(self) -> None:
+        """Flush whatever is waiting and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _batch_full(self) -> bool:
+        return any(len(requests) >= self.max_batch for requests in self._pending.values())
+
+    def _take(self) -> Optional[Dict[str, List[Tuple[Dict[str, Any], Future]]]]:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            while not self._closed and not self._batch_full():
+                remaining = self._first_arrival + self.window - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batches, self._pending = self._pending, {}
+            self._first_arrival = None
+            return batches
+
+    def _run(self) -> None:
+        while True:
+            batches = self._take()
+            if batches is None:
+                return
+            for project, requests in batches.items():
+                # タイムアウト等でキャンセルされた呼び出しは書き込まない
+                requests = [(item, future) for item, future in requests if future.set_running_or_notify_cancel()]
+                for start in range(0, len(requests), self.max_batch):
+                    self._write(project, requests[start:start + self.max_batch])
+
+    def _write(self, project: str, requests: List[Tuple[Dict[str, Any], Future]]) -> None:
+        if not requests:
+            return
+        try:
+            results = self.flush(project, [item for item, _ in requests])
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+
+        if len(requests) > 1:
+            print(f"📦 Coalesced {len(requests)} adds to '{project}' into one write", file=sys.stderr)
+        for (_, future), result in zip(requests, results):
+            if result.get("error"):
+                future.set_exception(RuntimeError(result["error"]))
+            else:
+                future.set_result(result["id"])
@@ -57,6 +57,10 @@ setup(
     ],
     python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={
+        "zstd": ["zstandard>=0.21"],
+        "dev": ["pyflakes>=3.0"],
+    },
     entry_points={
         "console_scripts": [
             "chroma-memo=chroma_memo.cli:main",
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Backend conformance check: the sqlite backend must behave like Chroma
+
+同じ追加・更新・削除・検索・取得の手順を chroma と sqlite の両方のバックエンドで
+実行し、結果（ID の順番・本文・メタデータ・距離・ベクトル）を比べる。
+一時ディレクトリだけを使い、利用者のデータベースには触れない。
+
+    python3 test_backends.py
+"""
+import random
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from chroma_memo.backends import BACKEND_CHROMA, BACKEND_SQLITE, open_store
+
+
+DIM = 8
+TOLERANCE = 1e-4
+
+
+def _vectors(rng: random.Random, count: int) -> List[List[float]]:
+    # 同点が出ないよう乱数のベクトルを使う（同点の並びはバックエンドで決まらない）
+    return [[rng.uniform(-1.0, 1.0) for _ in range(DIM)] for _ in range(count)]
+
+
+def scenario(store: Any) -> List[Tuple[str, Any]]:
+    """Run the same sequence of operations; returns (step name, result) pairs"""
+    rng = random.Random(0)
+    steps: List[Tuple[str, Any]] = []
+
+    def record(name: str, action: Callable[[], Any]) -> None:
+        try:
+            steps.append((name, action()))
+        except Exception as e:
+            steps.append((name, f"error: {type(e).__name__}"))
+
+    for space in ("l2", "cosine", "ip"):
+        collection = store.create_collection(f"conformance-{space}", metadata={"hnsw:space": space})
+        ids = [f"id{i:03d}" for i in range(120)]
+        collection.add(
+            ids=ids,
+            embeddings=_vectors(rng, len(ids)),
+            documents=[f"document {i} {'even' if i % 2 == 0 else 'odd'}" for i in range(len(ids))],
+            metadatas=[{"group": i % 3, "tag": f"t{i % 5}", "score": i / 10} for i in range(len(ids))],
+        )
+        # 既にある ID の add は無視される
+        collection.add(ids=["id000"], embeddings=_vectors(rng, 1), documents=["ignored"], metadatas=[{"group": 9}])
+        record(f"{space}: count", collection.count)
+
+        queries = _vectors(rng, 3)
+        record(f"{space}: query", lambda: collection.query(query_embeddings=queries, n_results=7))
+        record(f"{space}: query where", lambda: collection.query(
+            query_embeddings=queries, n_results=5, where={"$and": [{"group": 1}, {"score": {"$gte": 3}}]}))
+        record(f"{space}: query where_document", lambda: collection.query(
+            query_embeddings=queries, n_results=5, where_document={"$contains": "odd"}))
+
+        # 本文・メタデータ（既存のキーに上書き）・ベクトルの更新
+        collection.update(ids=ids[::2], embeddings=_vectors(rng, len(ids[::2])))
+        # 本文だけの更新は Chroma が既定の埋め込み関数で埋め込み直すので、アプリと同じくベクトルも渡す
+        collection.update(ids=ids[1:40:3], embeddings=_vectors(rng, len(ids[1:40:3])),
+                          documents=[f"updated {i}" for i in range(len(ids[1:40:3]))])
+        collection.update(ids=ids[5:30:4], metadatas=[{"tag": "changed", "extra": i} for i in range(len(ids[5:30:4]))])
+        # 存在しない ID の更新は無視される
+        collection.update(ids=["missing"], embeddings=_vectors(rng, 1), documents=["nothing"])
+        collection.upsert(
+            ids=["id003", "id200", "id201"],
+            embeddings=_vectors(rng, 3),
+            documents=["upserted 3", "upserted 200", "upserted 201"],
+            metadatas=[{"group": 2}, {"group": 2}, {"group": 0}],
+        )
+        collection.delete(ids=ids[7::9])
+        collection.delete(where={"tag": "t4"})
+        # 削除した ID を追加し直すと末尾に並ぶ
+        collection.add(ids=[ids[7]], embeddings=_vectors(rng, 1), documents=["re-added"], metadatas=[{"group": 1}])
+
+        record(f"{space}: count after writes", collection.count)
+        record(f"{space}: get all", lambda: collection.get(include=["documents", "metadatas", "embeddings"]))
+        record(f"{space}: get page", lambda: collection.get(limit=10, offset=25))
+        record(f"{space}: get where page", lambda: collection.get(where={"group": 2}, limit=5, offset=3))
+        record(f"{space}: get $in", lambda: collection.get(where={"tag": {"$in": ["t1", "changed"]}}))
+        record(f"{space}: get $ne/$or", lambda: collection.get(
+            where={"$or": [{"group": {"$ne": 0}}, {"score": {"$lt": 1}}]}))
+        record(f"{space}: get where_document", lambda: collection.get(where_document={"$not_contains": "even"}))
+        record(f"{space}: get ids", lambda: collection.get(ids=["id050", "id007", "missing", "id200"]))
+        record(f"{space}: query after writes", lambda: collection.query(
+            query_embeddings=queries, n_results=10, include=["documents", "metadatas", "distances", "embeddings"]))
+        record(f"{space}: query more than stored", lambda: collection.query(
+            query_embeddings=queries[:1], n_results=500, where={"group": 0}))
+
+        collection.modify(metadata={"note": "modified"})
+        record(f"{space}: modified metadata", lambda: store.get_collection(f"conformance-{space}").metadata)
+
+    record("collections", lambda: sorted(collection.name for collection in store.list_collections()))
+    store.delete_collection("conformance-ip")
+    record("collections after delete", lambda: sorted(collection.name for collection in store.list_collections()))
+    return steps
+
+
+# get / query の結果で比べるキー（uris・data など Chroma だけが返すものは比べない）
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+
+def _normalize(value: Any) -> Any:
+    """Plain lists/dicts/floats, so that numpy arrays and lists compare alike"""
+    if hasattr(value, "tolist"):
+        value = value.tolist()
+    if isinstance(value, dict):
+        if "ids" in value:
+            value = {key: value.get(key) for key in RESULT_KEYS}
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def differences(expected: Any, actual: Any, path: str = "") -> List[str]:
+    """Human-readable differences between two normalized results (floats within TOLERANCE)"""
+    if isinstance(expected, float) or isinstance(actual, float):
+        if isinstance(expected, (int, float)) and isinstance(actual, (int, float)) and abs(expected - actual) <= TOLERANCE:
+            return []
+        return [f"{path}: {expected!r} != {actual!r}"]
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        found = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if key not in expected or key not in actual:
+                found.append(f"{path}.{key}: only in {'sqlite' if key in actual else 'chroma'}")
+            else:
+                found.extend(differences(expected[key], actual[key], f"{path}.{key}"))
+        return found
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: {len(expected)} items != {len(actual)} items"]
+        found = []
+        for index, (left, right) in enumerate(zip(expected, actual)):
+            found.extend(differences(left, right, f"{path}[{index}]"))
+        return found
+    return [] if expected == actual else [f"{path}: {expected!r} != {actual!r}"]
+
+
+def main() -> int:
+    root = Path(tempfile.mkdtemp(prefix="chroma-memo-conformance-"))
+    try:
+        results: Dict[str, List[Tuple[str, Any]]] = {}
+        for backend in (BACKEND_CHROMA, BACKEND_SQLITE):
+            store = open_store(backend, root / backend)
+            try:
+                results[backend] = scenario(store)
+            finally:
+                store.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    failures = 0
+    for (name, expected), (_, actual) in zip(results[BACKEND_CHROMA], results[BACKEND_SQLITE]):
+        found = differences(_normalize(expected), _normalize(actual))
+        if found:
+            failures += 1
+            print(f"✗ {name}")
+            for line in found[:5]:
+                print(f"    {line}")
+            if len(found) > 5:
+                print(f"    ... {len(found) - 5} more")
+        else:
+            print(f"✓ {name}")
+
+    total = len(results[BACKEND_CHROMA])
+    if failures:
+        print(f"\n{failures}/{total} steps differ between the chroma and sqlite backends")
+        return 1
+    print(f"\nAll {total} steps match between the chroma and sqlite backends")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
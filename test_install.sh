@@ -56,6 +56,16 @@ test_command() {
         return 1
     fi
     
+    # 起動時間の予算チェック（chromadb / openai を読み込まないコマンド）
+    if ! test_startup_budget "$test_name"; then
+        return 1
+    fi
+    
+    # chroma / sqlite バックエンドの動作が一致するかの確認
+    if ! test_backend_conformance "$test_name"; then
+        return 1
+    fi
+    
     # データベースディレクトリの作成を確実にする
     mkdir -p ~/.chroma-memo
     chmod 755 ~/.chroma-memo
@@ -98,6 +108,63 @@ test_command() {
     fi
 }
 
+# 起動時間の予算（ミリ秒）。重い依存を遅延importしているかの確認に使う
+STARTUP_BUDGET_MS=${STARTUP_BUDGET_MS:-1000}
+
+# 軽いコマンドが予算内で終わるかを計測
+test_startup_budget() {
+    local test_name=$1
+    local cmd
+    
+    for cmd in "--help" "config --show-env-path"; do
+        local start end elapsed
+        start=$(date +%s%N)
+        chroma-memo $cmd &>/dev/null
+        end=$(date +%s%N)
+        elapsed=$(( (end - start) / 1000000 ))
+        
+        if [ "$elapsed" -le "$STARTUP_BUDGET_MS" ]; then
+            print_success "chroma-memo $cmd took ${elapsed}ms (budget: ${STARTUP_BUDGET_MS}ms)"
+        else
+            print_error "chroma-memo $cmd took ${elapsed}ms (budget: ${STARTUP_BUDGET_MS}ms)"
+            RESULTS+=("FAIL: $test_name - startup budget ($cmd)")
+            return 1
+        fi
+    done
+    
+    # Pythonから直接importできる環境では、重いモジュールが読み込まれないことも確認
+    if python3 -c "import chroma_memo.cli" &>/dev/null; then
+        if python3 -c "import sys, chroma_memo.cli; sys.exit(any(m in sys.modules for m in ('chromadb', 'openai', 'numpy')))"; then
+            print_success "chroma_memo.cli imports without chromadb/openai/numpy"
+        else
+            print_error "chroma_memo.cli imports heavy modules at import time"
+            RESULTS+=("FAIL: $test_name - lazy imports")
+            return 1
+        fi
+    fi
+    return 0
+}
+
+# 同じ操作を chroma / sqlite の両バックエンドで実行し、結果を比べる
+test_backend_conformance() {
+    local test_name=$1
+    
+    # pipx のように依存がpython3から見えない環境では実行できない
+    if ! python3 -c "import chromadb, numpy" &>/dev/null; then
+        print_info "chromadb/numpy not importable from python3, skipping backend conformance"
+        return 0
+    fi
+    
+    if python3 test_backends.py; then
+        print_success "chroma and sqlite backends behave the same"
+    else
+        print_error "chroma and sqlite backends differ"
+        RESULTS+=("FAIL: $test_name - backend conformance")
+        return 1
+    fi
+    return 0
+}
+
 # クリーンアップ
 cleanup() {
     print_info "Cleaning up..."